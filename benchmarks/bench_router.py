@@ -0,0 +1,112 @@
+# benchmarks/bench_router.py
+#
+# Load spreading, failover and hedging of OllamaRouter against local fake servers.
+#
+#   python benchmarks/bench_router.py
+#   python benchmarks/bench_router.py --clients 16 --requests 20 --hedge-after 0.15
+#
+# Starts three FakeOllamaServers that each generate `--parallel` replies at a time:
+#   - a fast box
+#   - a box with a slow first token
+#   - a box that returns 503 for part of the run, like a restarting Ollama
+# The same concurrent streaming workload runs three times:
+#   - single: a plain OllamaBackend on the fast box
+#   - router: OllamaRouter over all three
+#   - hedged: the router with hedging
+# Reports TTFT percentiles, errors and how the requests were spread.
+
+import os
+import sys
+import time
+import argparse
+import threading
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(REPO_ROOT, "phase1_llm_core"))
+from fake_ollama import FakeOllamaServer
+from run_bench import percentiles
+from ollama_client import OllamaBackend, OllamaRouter, GenerationStats
+
+
+def flap(server, stop, period):
+    """Toggle `server` between 503 and healthy every `period` seconds."""
+    while not stop.wait(period):
+        server.fail_status = None if server.fail_status else 503
+
+
+def run_load(backend, clients, requests_per_client):
+    ttft, errors, lock = [], [0], threading.Lock()
+
+    def client(i):
+        for j in range(requests_per_client):
+            stats = GenerationStats()
+            try:
+                for _ in backend.stream(f"client {i} question {j}", stats=stats):
+                    pass
+            except Exception:
+                with lock:
+                    errors[0] += 1
+                continue
+            with lock:
+                ttft.append(stats.time_to_first_token)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return {"seconds": round(time.perf_counter() - t0, 3), "errors": errors[0], "ttft": percentiles(ttft)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark OllamaRouter against fake Ollama servers")
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=15, help="Requests per client")
+    parser.add_argument("--hedge-after", type=float, default=0.2, help="Seconds without a token before hedging")
+    parser.add_argument("--parallel", type=int, default=2, help="Concurrent generations per fake server")
+    parser.add_argument("--flap-period", type=float, default=0.5, help="Seconds between flaky box up/down")
+    args = parser.parse_args()
+
+    servers = {
+        "fast": FakeOllamaServer(first_token_delay=0.05, token_delay=0.002, parallel=args.parallel).start(),
+        "slow": FakeOllamaServer(first_token_delay=0.4, token_delay=0.002, parallel=args.parallel).start(),
+        "flaky": FakeOllamaServer(first_token_delay=0.05, token_delay=0.002, parallel=args.parallel).start(),
+    }
+    urls = [server.url for server in servers.values()]
+    configs = [
+        ("single", lambda: OllamaBackend(servers["fast"].url, retries=0)),
+        ("router", lambda: OllamaRouter(urls, probe_interval=0.25)),
+        ("hedged", lambda: OllamaRouter(urls, probe_interval=0.25, hedge_after=args.hedge_after)),
+    ]
+    print(f"[i] clients={args.clients} requests/client={args.requests} hedge_after={args.hedge_after}s\n")
+    print(f"{'config':<8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}  spread (fast/slow/flaky)")
+    try:
+        for name, make in configs:
+            for server in servers.values():
+                server.requests = 0
+            servers["flaky"].fail_status = None
+            stop = threading.Event()
+            flapper = threading.Thread(target=flap, args=(servers["flaky"], stop, args.flap_period), daemon=True)
+            flapper.start()
+            backend = make()
+            try:
+                result = run_load(backend, args.clients, args.requests)
+            finally:
+                stop.set()
+                backend.close()
+            ttft = result["ttft"] or {"p50_ms": 0, "p95_ms": 0, "p99_ms": 0}
+            spread = "/".join(str(server.requests) for server in servers.values())
+            extra = ""
+            if isinstance(backend, OllamaRouter):
+                stats = backend.stats()
+                extra = f"  hedges={stats['hedges']} won={stats['hedge_wins']}"
+            print(f"{name:<8}{ttft['p50_ms']:>10.1f}{ttft['p95_ms']:>10.1f}{ttft['p99_ms']:>10.1f}"
+                  f"{result['errors']:>8}  {spread}{extra}")
+    finally:
+        for server in servers.values():
+            server.stop()
+
+
+if __name__ == "__main__":
+    main()
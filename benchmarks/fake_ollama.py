@@ -0,0 +1,175 @@
+# benchmarks/fake_ollama.py
+#
+# Local stand-in for the Ollama HTTP API, for benchmarks and offline tests.
+#
+#   python benchmarks/fake_ollama.py --port 11500 --first-token-delay 0.2 --token-delay 0.02
+#   OLLAMA_URL=http://localhost:11500 python phase1_llm_core/chat_cli.py
+#
+# Serves /api/generate (streamed NDJSON or a single JSON reply), /api/tags and
+# /api/version. Every reply is the same canned answer, and the delays simulate
+# prompt evaluation (first token) and per-token decoding, so client-side
+# overhead can be measured without a real model.
+
+import sys
+import json
+import time
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CANNED_RESPONSE = (
+    "To reset a customer's password, open the account page, choose Reset Password "
+    "and confirm the identity check before sending the reset link."
+)
+
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real server
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        server = self.server
+        if self.path == "/api/tags":
+            self._send_json(200, {"models": [{"name": f"{server.model}:latest", "model": server.model}]})
+        elif self.path == "/api/version":
+            self._send_json(200, {"version": "0.0.0-fake"})
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        server = self.server
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        if self.path != "/api/generate":
+            self._send_json(404, {"error": "not found"})
+            return
+        with server.lock:
+            server.requests += 1
+            server.in_flight += 1
+        try:
+            if server.fail_status:
+                self._send_json(server.fail_status, {"error": "fake failure"})
+                return
+            if server.slots is None:
+                self._generate(payload)
+            else:
+                with server.slots:  # queue like a real server at OLLAMA_NUM_PARALLEL
+                    self._generate(payload)
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+    def _generate(self, payload):
+        server = self.server
+        words = server.response.split(" ")
+        num_predict = (payload.get("options") or {}).get("num_predict")
+        if num_predict and num_predict > 0:
+            words = words[:num_predict]
+        tokens = [w if i == 0 else " " + w for i, w in enumerate(words)]
+        prompt_tokens = len(payload.get("prompt", "").split())
+        context = list(payload.get("context") or []) + list(range(prompt_tokens + len(tokens)))
+        done = {
+            "model": payload.get("model", server.model),
+            "done": True,
+            "context": context,
+            "prompt_eval_count": prompt_tokens,
+            "eval_count": len(tokens),
+            "eval_duration": int(server.token_delay * len(tokens) * 1e9),
+        }
+        time.sleep(server.first_token_delay)
+
+        if not payload.get("stream", True):
+            time.sleep(server.token_delay * max(len(tokens) - 1, 0))
+            self._send_json(200, {**done, "response": "".join(tokens)})
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for i, token in enumerate(tokens):
+            if i:
+                time.sleep(server.token_delay)
+            self._write_chunk({"model": done["model"], "response": token, "done": False})
+        self._write_chunk({**done, "response": ""})
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _write_chunk(self, obj):
+        data = json.dumps(obj).encode() + b"\n"
+        self.wfile.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+
+class FakeOllamaServer(ThreadingHTTPServer):
+    """
+    Threaded fake Ollama server. Use as a context manager, or start()/stop().
+    port=0 picks a free port; the address is available as .url once created.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, host="127.0.0.1", port=0, model="tinyllama", response=CANNED_RESPONSE,
+                 first_token_delay=0.05, token_delay=0.01, fail_status=None, parallel=None):
+        super().__init__((host, port), FakeOllamaHandler)
+        self.model = model
+        self.response = response
+        self.first_token_delay = first_token_delay
+        self.token_delay = token_delay
+        self.fail_status = fail_status  # e.g. 503 to simulate an unhealthy endpoint
+        self.slots = threading.Semaphore(parallel) if parallel else None  # None = unlimited concurrency
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.in_flight = 0
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def handle_error(self, request, client_address):
+        # Clients dropping a stream early (cancelled or hedged requests) is expected here
+        if isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError)):
+            return
+        super().handle_error(request, client_address)
+
+    def start(self):
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake Ollama server with canned replies")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11500)
+    parser.add_argument("--first-token-delay", type=float, default=0.05, help="Seconds before the first token")
+    parser.add_argument("--token-delay", type=float, default=0.01, help="Seconds between tokens")
+    args = parser.parse_args()
+    server = FakeOllamaServer(args.host, args.port, first_token_delay=args.first_token_delay,
+                              token_delay=args.token_delay)
+    print(f"[+] Fake Ollama listening on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
@@ -0,0 +1,305 @@
+# benchmarks/run_bench.py
+#
+# End-to-end latency benchmark for the RAG stack.
+#
+#   python benchmarks/run_bench.py                          # fake Ollama, synthetic corpus
+#   python benchmarks/run_bench.py --store numpy --queries 100 --rounds 3
+#   python benchmarks/run_bench.py --compare benchmarks/results/<previous>.json
+#   python benchmarks/run_bench.py --ollama-url http://localhost:11434   # real server
+#
+# Everything runs inside a temporary working directory (vector store, manifest,
+# embedding cache), so the real ./chroma_store is never touched. The LLM is a
+# FakeOllamaServer with configurable delays unless --ollama-url is given.
+#
+# Measured:
+#   ingest        ingest.ingest_directory() over the corpus (chunks/s)
+#   embedding     raw SentenceTransformer encode throughput (texts/s)
+#   retrieval     rag_chain.search_similar_docs and RetrievalEngine.retrieve (what
+#                 LiteMind's retrieve_docs calls); cold = first lookup of a query,
+#                 warm = repeated (embedding cache hit)
+#   prompt_build  PromptBuilder.build with retrieved chunks and chat history
+#   llm_*         time to first token / total for streamed and non-streamed calls
+#   turn_*        retrieve + build + stream, as one rag_chain turn
+# and saved as JSON, with p50/p95/p99 for every latency metric.
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(REPO_ROOT, "benchmarks", "results")
+sys.path.append(os.path.join(REPO_ROOT, "phase1_llm_core"))
+sys.path.append(os.path.join(REPO_ROOT, "phase3_agent_assist"))
+sys.path.append(os.path.join(REPO_ROOT, "phase4_litemind_chat"))
+from fake_ollama import FakeOllamaServer, CANNED_RESPONSE
+
+TOPICS = ["password reset", "refund request", "billing dispute", "account lockout", "plan upgrade",
+          "call transfer", "escalation", "shipping delay", "two-factor setup", "address change"]
+VERBS = ["verify", "confirm", "document", "escalate", "review", "update", "explain", "record"]
+OBJECTS = ["the customer's identity", "the order number", "the last payment", "the ticket history",
+           "the callback number", "the account status", "the service level", "the refund policy"]
+
+
+def percentiles(samples):
+    if not samples:
+        return None
+    ms = np.asarray(samples) * 1000
+    return {
+        "n": len(samples),
+        "mean_ms": round(float(ms.mean()), 3),
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p95_ms": round(float(np.percentile(ms, 95)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+# ── synthetic corpus ──
+def make_corpus(root, docs=40, paragraphs=12, seed=0):
+    """Write contact-center style .txt/.md files; return a list of questions about them."""
+    rng = random.Random(seed)
+    os.makedirs(root, exist_ok=True)
+    for d in range(docs):
+        topic = TOPICS[d % len(TOPICS)]
+        lines = [f"# {topic.title()} procedure {d}"]
+        for p in range(paragraphs):
+            steps = [f"Step {s + 1}: {rng.choice(VERBS)} {rng.choice(OBJECTS)} for the {topic} case."
+                     for s in range(rng.randint(3, 6))]
+            lines.append(" ".join(steps))
+        ext = ".md" if d % 2 else ".txt"
+        with open(os.path.join(root, f"{topic.replace(' ', '_')}_{d}{ext}"), "w", encoding="utf-8") as f:
+            f.write("\n".join(lines))
+    return [f"How do I {rng.choice(VERBS)} {rng.choice(OBJECTS)} during a {rng.choice(TOPICS)}?"
+            for _ in range(200)]
+
+
+# ── stages ──
+def bench_ingest(corpus_dir):
+    import ingest
+    t0 = time.perf_counter()
+    stats = ingest.ingest_directory(corpus_dir, full=True)
+    seconds = time.perf_counter() - t0
+    chunks = ingest.get_store().count()
+    return {"files": stats["updated"], "chunks": chunks, "seconds": round(seconds, 3),
+            "chunks_per_s": round(chunks / seconds, 1) if seconds else None}
+
+
+def bench_embedding(corpus_dir, batch_size=256):
+    import ingest
+    from embedding_cache import CachedEmbedder
+    texts = [chunk for path in sorted(os.listdir(corpus_dir))
+             for chunk, _ in ingest.iter_chunks(os.path.join(corpus_dir, path))]
+    model = CachedEmbedder(ingest.EMBED_MODEL_NAME)._get_model()
+    model.encode(["warm up"])
+    t0 = time.perf_counter()
+    for start in range(0, len(texts), batch_size):
+        model.encode(texts[start:start + batch_size], batch_size=batch_size)
+    seconds = time.perf_counter() - t0
+    return {"texts": len(texts), "seconds": round(seconds, 3),
+            "texts_per_s": round(len(texts) / seconds, 1) if seconds else None}
+
+
+def bench_retrieval(queries, rounds, top_k):
+    import rag_chain
+    from retrieval_engine import RetrievalEngine
+    engine = RetrievalEngine()
+    engine.warm_up()
+    rag_chain.search_similar_docs("warm up", top_k)
+    timings = {"search_similar_docs_cold": [], "search_similar_docs_warm": [],
+               "retrieve_docs_cold": [], "retrieve_docs_warm": []}
+    for r in range(rounds):
+        phase = "cold" if r == 0 else "warm"
+        for q in queries:
+            t0 = time.perf_counter()
+            rag_chain.search_similar_docs(q, top_k)
+            timings[f"search_similar_docs_{phase}"].append(time.perf_counter() - t0)
+        for q in queries:
+            # retrieve_docs in LiteMind delegates to the engine; the app module itself needs Streamlit
+            t0 = time.perf_counter()
+            engine.retrieve(q, top_k)
+            timings[f"retrieve_docs_{phase}"].append(time.perf_counter() - t0)
+    return {name: percentiles(samples) for name, samples in timings.items()}
+
+
+def bench_prompt_build(queries, top_k, history_turns=8):
+    import rag_chain
+    history = []
+    for i in range(history_turns):
+        history += [f"User: {queries[i % len(queries)]}", f"Assistant: {CANNED_RESPONSE}"]
+    samples, sizes = [], []
+    for q in queries:
+        docs = rag_chain.search_similar_docs(q, top_k)
+        t0 = time.perf_counter()
+        rag_chain.build_prompt(docs, history, q)
+        samples.append(time.perf_counter() - t0)
+        sizes.append(rag_chain.prompt_builder.last_report["prompt_tokens"])
+    return {**percentiles(samples), "mean_prompt_tokens": round(float(np.mean(sizes)), 1)}
+
+
+def bench_llm(prompts):
+    import rag_chain
+    from ollama_client import GenerationStats
+    llm = rag_chain.llm
+    ttft, total, generate = [], [], []
+    for prompt in prompts:
+        stats = GenerationStats()
+        for _ in llm.stream(prompt, stats=stats):
+            pass
+        ttft.append(stats.time_to_first_token)
+        total.append(stats.total_time)
+    for prompt in prompts:
+        t0 = time.perf_counter()
+        llm.generate(prompt)
+        generate.append(time.perf_counter() - t0)
+    return {"llm_stream_ttft": percentiles(ttft), "llm_stream_total": percentiles(total),
+            "llm_generate_total": percentiles(generate)}
+
+
+def bench_turns(queries, top_k):
+    import rag_chain
+    ttft, total = [], []
+    history = []
+    for q in queries:
+        t0 = time.perf_counter()
+        docs = rag_chain.search_similar_docs(q, top_k)
+        prompt = rag_chain.build_prompt(docs, history, q)
+        first = None
+        pieces = []
+        for piece in rag_chain.llm.stream(prompt):
+            if first is None:
+                first = time.perf_counter()
+            pieces.append(piece)
+        end = time.perf_counter()
+        ttft.append((first or end) - t0)
+        total.append(end - t0)
+        history = (history + [f"User: {q}", f"Assistant: {''.join(pieces)}"])[-8:]
+    return {"turn_ttft": percentiles(ttft), "turn_total": percentiles(total)}
+
+
+# ── reporting ──
+def flatten(results, prefix=""):
+    """{"a": {"b": {"p50_ms": ..}}} -> {"a.b": {...}} for every percentile block."""
+    out = {}
+    for key, value in results.items():
+        if isinstance(value, dict) and "p50_ms" in value:
+            out[prefix + key] = value
+        elif isinstance(value, dict):
+            out.update(flatten(value, f"{prefix}{key}."))
+    return out
+
+
+def print_report(results, baseline=None):
+    current = flatten(results)
+    previous = flatten(baseline["results"]) if baseline else {}
+    print(f"\n{'metric':<42}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}" + ("   p50 vs baseline" if baseline else ""))
+    for name, block in current.items():
+        line = f"{name:<42}{block['p50_ms']:>10.2f}{block['p95_ms']:>10.2f}{block['p99_ms']:>10.2f}"
+        old = previous.get(name)
+        if old and old["p50_ms"]:
+            change = (block["p50_ms"] - old["p50_ms"]) / old["p50_ms"] * 100
+            line += f"   {change:+.1f}%"
+        print(line)
+    for name in ("ingest", "embedding"):
+        if name in results:
+            print(f"{name}: {results[name]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end latency benchmark against a fake Ollama")
+    parser.add_argument("--store", choices=["chroma", "numpy"], default=os.getenv("VECTOR_STORE", "chroma"))
+    parser.add_argument("--docs", type=int, default=40, help="Synthetic documents to ingest")
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=2, help="Retrieval rounds (first is cold)")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--first-token-delay", type=float, default=0.05)
+    parser.add_argument("--token-delay", type=float, default=0.005)
+    parser.add_argument("--ollama-url", help="Benchmark a real Ollama server instead of the fake one")
+    parser.add_argument("--skip", default="", help="Comma-separated stages to skip: "
+                        "embedding,retrieval,prompt,llm,turn (ingest always runs)")
+    parser.add_argument("--out", help="Result JSON path (default: benchmarks/results/<commit>_<time>.json)")
+    parser.add_argument("--compare", help="Earlier result JSON to compare against")
+    args = parser.parse_args()
+    skip = set(filter(None, args.skip.split(",")))
+
+    commit = git_commit()
+    out_path = os.path.abspath(args.out or os.path.join(
+        RESULTS_DIR, f"{commit}_{time.strftime('%Y%m%d-%H%M%S')}.json"))
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    server = None
+    if not args.ollama_url:
+        server = FakeOllamaServer(first_token_delay=args.first_token_delay, token_delay=args.token_delay).start()
+    # Module-level settings in the repo read these at import time, so set them before importing
+    os.environ["OLLAMA_URL"] = args.ollama_url or server.url
+    os.environ.pop("OLLAMA_URLS", None)  # a router would bypass the server under test
+    os.environ["VECTOR_STORE"] = args.store
+    workdir = tempfile.mkdtemp(prefix="llm_cti_bench_")
+    os.environ["EMBED_CACHE_PATH"] = os.path.join(workdir, "embedding_cache")
+    cwd = os.getcwd()
+    os.chdir(workdir)  # ./chroma_store, ./numpy_index and manifests land here
+
+    results = {}
+    try:
+        corpus_dir = os.path.join(workdir, "corpus")
+        queries = make_corpus(corpus_dir, docs=args.docs)[:args.queries]
+        print(f"[i] commit={commit} store={args.store} docs={args.docs} queries={len(queries)} "
+              f"llm={os.environ['OLLAMA_URL']}")
+
+        results["ingest"] = bench_ingest(corpus_dir)  # the other stages need the index
+        if "embedding" not in skip:
+            results["embedding"] = bench_embedding(corpus_dir)
+        if "retrieval" not in skip:
+            results["retrieval"] = bench_retrieval(queries, args.rounds, args.top_k)
+        if "prompt" not in skip:
+            results["prompt_build"] = bench_prompt_build(queries, args.top_k)
+        if "llm" not in skip:
+            import rag_chain
+            prompts = [rag_chain.build_prompt(rag_chain.search_similar_docs(q, args.top_k), [], q) for q in queries]
+            results["llm"] = bench_llm(prompts)
+        if "turn" not in skip:
+            results["turn"] = bench_turns(queries, args.top_k)
+    finally:
+        os.chdir(cwd)
+        if server is not None:
+            server.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "commit": commit,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "config": {k: v for k, v in vars(args).items() if k not in ("out", "compare")},
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(out_path), exist_ok=True)
+    with open(out_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print_report(results, baseline)
+    print(f"\n[✓] Results saved to {out_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+
+import aiohttp
+
+from ollama_client import OLLAMA_URL
+
+
+class AsyncOllamaClient:
+    """
+    Async sibling of ollama_client.query_ollama for offline batch work.
+
+    One pooled aiohttp session is shared by all requests; a semaphore caps how
+    many generations are in flight, and every request can carry its own deadline.
+
+        async with AsyncOllamaClient(max_concurrency=8) as client:
+            summaries = await client.map(prompts)
+    """
+
+    def __init__(self, base_url=None, model=None, max_concurrency=4, timeout=120,
+                 options=None, keep_alive="10m"):
+        self.base_url = (base_url or OLLAMA_URL).rstrip("/")
+        self.model = model or os.getenv("OLLAMA_DEFAULT_MODEL", "tinyllama")
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.options = dict(options or {})
+        self.keep_alive = keep_alive
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.session = None
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def open(self):
+        if self.session is None:
+            connector = aiohttp.TCPConnector(limit=self.max_concurrency, keepalive_timeout=60)
+            self.session = aiohttp.ClientSession(connector=connector)
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def _post(self, prompt, model, options):
+        payload = {
+            "model": model or self.model,
+            "prompt": prompt,
+            "stream": False,
+            "options": {**self.options, **(options or {})},
+        }
+        if self.keep_alive is not None:
+            payload["keep_alive"] = self.keep_alive
+        async with self.session.post(f"{self.base_url}/api/generate", json=payload) as response:
+            response.raise_for_status()
+            data = await response.json(content_type=None)
+            return data.get("response", "")
+
+    async def query(self, prompt, model=None, options=None, deadline=None):
+        """
+        Generate a completion for `prompt`.
+
+        `deadline` (seconds, default: the client timeout) covers both the wait for
+        a concurrency slot and the generation itself; asyncio.TimeoutError is
+        raised when it passes. Cancelling the awaiting task aborts the request.
+        """
+        await self.open()
+        async with asyncio.timeout(deadline if deadline is not None else self.timeout):
+            async with self.semaphore:
+                return await self._post(prompt, model, options)
+
+    async def map(self, prompts, model=None, options=None, deadline=None, return_exceptions=True):
+        """
+        Run many prompts concurrently and return results in input order.
+
+        With return_exceptions=True a failed prompt yields its exception in place
+        of a string; otherwise the first failure cancels the remaining requests
+        and is re-raised.
+        """
+        await self.open()
+        tasks = [
+            asyncio.ensure_future(self.query(p, model=model, options=options, deadline=deadline))
+            for p in prompts
+        ]
+        try:
+            return await asyncio.gather(*tasks, return_exceptions=return_exceptions)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+
+
+async def query_ollama_async(prompt, model=None):
+    """One-off async equivalent of query_ollama."""
+    async with AsyncOllamaClient(model=model, max_concurrency=1) as client:
+        return await client.query(prompt)
+
+
+def run_batch(prompts, model=None, max_concurrency=4, deadline=None):
+    """Blocking helper: run `prompts` concurrently and return results in order."""
+    async def _run():
+        async with AsyncOllamaClient(model=model, max_concurrency=max_concurrency) as client:
+            return await client.map(prompts, deadline=deadline)
+    return asyncio.run(_run())
+
+
+def _read_prompts(path):
+    # Accepts JSONL with {"id": ..., "prompt": ...} per line, or plain text (one prompt per line)
+    records = []
+    with open(path, "r", encoding="utf-8") as f:
+        for n, line in enumerate(f):
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith("{"):
+                item = json.loads(line)
+                records.append((item.get("id", n), item["prompt"]))
+            else:
+                records.append((n, line))
+    return records
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a file of prompts through Ollama concurrently")
+    parser.add_argument("prompts", help="JSONL ({'id', 'prompt'}) or text file, one prompt per line")
+    parser.add_argument("--model", default=None)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--deadline", type=float, default=None, help="Per-request deadline in seconds")
+    parser.add_argument("--out", default="-", help="Output JSONL path (default: stdout)")
+    args = parser.parse_args()
+
+    records = _read_prompts(args.prompts)
+    started = time.perf_counter()
+    results = run_batch([p for _, p in records], model=args.model,
+                        max_concurrency=args.concurrency, deadline=args.deadline)
+    elapsed = time.perf_counter() - started
+
+    out = sys.stdout if args.out == "-" else open(args.out, "w", encoding="utf-8")
+    failed = 0
+    for (rid, _), result in zip(records, results):
+        if isinstance(result, BaseException):
+            failed += 1
+            row = {"id": rid, "error": repr(result)}
+        else:
+            row = {"id": rid, "response": result}
+        out.write(json.dumps(row) + "\n")
+    if out is not sys.stdout:
+        out.close()
+    print(f"[✓] {len(records)} prompts in {elapsed:.1f}s "
+          f"({len(records) / max(elapsed, 1e-9):.2f}/s), {failed} failed", file=sys.stderr)
@@ -1,4 +1,6 @@
-from ollama_client import query_ollama
+import sys
+
+from ollama_client import stream_ollama, GenerationStats
 
 def chat():
     print("🤖 TinyLLaMA CLI Chat - Type 'exit' to quit\n")
@@ -8,10 +10,14 @@ def chat():
             print("Goodbye!")
             break
         try:
-            response = query_ollama(user_input)
-            print(f"LLM: {response}\n")
+            stats = GenerationStats()
+            print("LLM: ", end="", flush=True)
+            for piece in stream_ollama(user_input, stats=stats):
+                sys.stdout.write(piece)
+                sys.stdout.flush()
+            print(f"\n   ⏱️ {stats.summary()}\n")
         except Exception as e:
-            print(f"⚠️ Error: {e}\n")
+            print(f"\n⚠️ Error: {e}\n")
 
 if __name__ == "__main__":
     chat()
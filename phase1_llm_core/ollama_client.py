@@ -1,7 +1,23 @@
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import json
+import time
+import queue
+import threading
+from concurrent.futures import Future, FIRST_COMPLETED, wait
 
 import os
 
+import tracing
+
+OLLAMA_URL = os.getenv("OLLAMA_URL", "http://localhost:11434")
+# Comma-separated list of Ollama servers; with more than one, make_backend() returns an OllamaRouter
+OLLAMA_URLS = [url.strip() for url in os.getenv("OLLAMA_URLS", "").split(",") if url.strip()]
+OLLAMA_HEDGE_AFTER = float(os.getenv("OLLAMA_HEDGE_AFTER", "0")) or None  # seconds; 0 = no hedging
+# Span attributes that add up across requests and are exported as counters
+LLM_COUNTERS = ("prompt_tokens", "tokens", "prompt_eval_s", "eval_s")
+
 def query_ollama(prompt, model=None):
     """
     Query the Ollama API.
@@ -28,12 +44,628 @@ def query_ollama(prompt, model=None):
     Raises:
         requests.HTTPError: If the HTTP request returned an unsuccessful status code.
     """
-    url = "http://localhost:11434/api/generate"
+    url = f"{OLLAMA_URL}/api/generate"
     payload = {
         "model": model,
         "prompt": prompt,
         "stream": False
     }
-    response = requests.post(url, json=payload)
+    with tracing.span("ollama.query", counters=LLM_COUNTERS, model=model) as span:
+        response = requests.post(url, json=payload)
+        response.raise_for_status()
+        data = response.json()
+        record_reply(span, data)
+    return data.get("response", "")
+
+
+def record_reply(span, data):
+    """Copy Ollama's token counts and server-side timings (ns) onto a tracing span."""
+    if span is tracing.NULL_SPAN:
+        return
+    server_s = (data.get("total_duration") or 0) / 1e9
+    span.set(
+        prompt_tokens=data.get("prompt_eval_count") or 0,
+        tokens=data.get("eval_count") or 0,
+        load_s=(data.get("load_duration") or 0) / 1e9,
+        prompt_eval_s=(data.get("prompt_eval_duration") or 0) / 1e9,
+        eval_s=(data.get("eval_duration") or 0) / 1e9,
+        # Wall time Ollama did not account for: queueing behind other requests plus HTTP
+        overhead_s=max(time.perf_counter() - span.start - server_s, 0.0) if server_s else 0.0,
+    )
+
+
+def record_stats(span, stats):
+    """Copy a finished stream's GenerationStats onto a tracing span."""
+    if span is tracing.NULL_SPAN:
+        return
+    span.set(
+        prompt_tokens=stats.prompt_eval_count or 0,
+        tokens=stats.tokens,
+        ttft_s=stats.time_to_first_token or 0.0,
+        eval_s=(stats.eval_duration or 0) / 1e9,
+    )
+
+
+class GenerationStats:
+    """Timing for one streamed generation, filled in while the stream is consumed."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.first_token_at = None
+        self.finished_at = None
+        self.chunks = 0
+        self.eval_count = None
+        self.eval_duration = None
+        self.prompt_eval_count = None
+        self.context = None  # token array Ollama returns for continuing the conversation
+
+    @property
+    def time_to_first_token(self):
+        if self.first_token_at is None:
+            return None
+        return self.first_token_at - self.started
+
+    @property
+    def total_time(self):
+        end = self.finished_at or time.perf_counter()
+        return end - self.started
+
+    @property
+    def tokens(self):
+        return self.eval_count if self.eval_count is not None else self.chunks
+
+    @property
+    def tokens_per_sec(self):
+        # Prefer Ollama's own counters; fall back to wall-clock after the first token
+        if self.eval_count and self.eval_duration:
+            return self.eval_count / (self.eval_duration / 1e9)
+        if self.first_token_at is None:
+            return 0.0
+        elapsed = (self.finished_at or time.perf_counter()) - self.first_token_at
+        return self.chunks / elapsed if elapsed > 0 else 0.0
+
+    def summary(self):
+        ttft = self.time_to_first_token
+        ttft_text = f"{ttft:.2f}s" if ttft is not None else "n/a"
+        return (
+            f"first token {ttft_text} · {self.tokens} tokens · "
+            f"{self.tokens_per_sec:.1f} tok/s · total {self.total_time:.2f}s"
+        )
+
+
+def stream_ollama(prompt, model=None, stats=None, timeout=60):
+    """
+    Stream a completion from the Ollama API, yielding text pieces as they arrive.
+
+    Args:
+        prompt (str): The prompt to send.
+        model (str, optional): Model name; defaults like query_ollama.
+        stats (GenerationStats, optional): Filled with time-to-first-token and
+            tokens/sec while the generator is consumed.
+        timeout (float): Connect/read timeout in seconds between chunks.
+
+    Yields:
+        str: Response fragments in generation order.
+
+    Raises:
+        requests.HTTPError: If the HTTP request returned an unsuccessful status code.
+        RuntimeError: If Ollama reports an error mid-stream.
+    """
+    if model is None:
+        model = os.getenv("OLLAMA_DEFAULT_MODEL", "tinyllama")
+    if stats is None:
+        stats = GenerationStats()
+
+    url = f"{OLLAMA_URL}/api/generate"
+    payload = {
+        "model": model,
+        "prompt": prompt,
+        "stream": True
+    }
+    with tracing.span("ollama.stream", counters=LLM_COUNTERS, model=model) as span:
+        with requests.post(url, json=payload, stream=True, timeout=timeout) as response:
+            yield from iter_ndjson(response, stats)
+        record_stats(span, stats)
+
+
+def iter_ndjson(response, stats):
+    """Yield response fragments from a streaming /api/generate reply, updating `stats`."""
     response.raise_for_status()
-    return response.json().get("response", "")
+    # Ollama sends one JSON object per line (NDJSON)
+    for line in response.iter_lines(chunk_size=None):
+        if not line:
+            continue
+        chunk = json.loads(line)
+        if "error" in chunk:
+            raise RuntimeError(f"Ollama error: {chunk['error']}")
+        piece = chunk.get("response", "")
+        if piece:
+            if stats.first_token_at is None:
+                stats.first_token_at = time.perf_counter()
+            stats.chunks += 1
+            yield piece
+        if chunk.get("done"):
+            stats.eval_count = chunk.get("eval_count")
+            stats.eval_duration = chunk.get("eval_duration")
+            stats.prompt_eval_count = chunk.get("prompt_eval_count")
+            stats.context = chunk.get("context")
+            break
+    stats.finished_at = time.perf_counter()
+
+
+class OllamaBackend:
+    """
+    Long-lived Ollama client on a pooled requests.Session.
+
+    Connections are kept alive between calls, connection failures and 502/503/504
+    responses are retried with backoff, and generation options (num_predict,
+    num_ctx, ...) plus keep_alive are sent with every request so the model stays
+    loaded between questions.
+    """
+
+    def __init__(self, base_url=None, model=None, options=None, keep_alive="10m",
+                 connect_timeout=5, read_timeout=120, retries=2, backoff=0.5, pool_size=4):
+        self.base_url = (base_url or OLLAMA_URL).rstrip("/")
+        self.model = model or os.getenv("OLLAMA_DEFAULT_MODEL", "tinyllama")
+        self.options = dict(options or {})
+        self.keep_alive = keep_alive
+        self.timeout = (connect_timeout, read_timeout)
+
+        retry = Retry(
+            total=retries,
+            connect=retries,
+            read=0,
+            status=retries,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=frozenset({"GET", "POST"}),
+            backoff_factor=backoff,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _payload(self, prompt, model, options, stream, context=None):
+        payload = {
+            "model": model or self.model,
+            "prompt": prompt,
+            "stream": stream,
+            "options": {**self.options, **(options or {})},
+        }
+        if self.keep_alive is not None:
+            payload["keep_alive"] = self.keep_alive
+        if context:
+            payload["context"] = context
+        return payload
+
+    def request(self, prompt, model=None, options=None, context=None):
+        """Non-streaming /api/generate call returning Ollama's full JSON reply."""
+        with tracing.span("ollama.generate", counters=LLM_COUNTERS, model=model or self.model, kv_reuse=bool(context)) as span:
+            response = self.session.post(
+                f"{self.base_url}/api/generate",
+                json=self._payload(prompt, model, options, stream=False, context=context),
+                timeout=self.timeout,
+            )
+            response.raise_for_status()
+            data = response.json()
+            record_reply(span, data)
+        return data
+
+    def generate(self, prompt, model=None, options=None):
+        """Return the full completion for `prompt`."""
+        return self.request(prompt, model, options).get("response", "")
+
+    def stream(self, prompt, model=None, options=None, stats=None, context=None):
+        """Like stream_ollama, but over the pooled session."""
+        if stats is None:
+            stats = GenerationStats()
+        with tracing.span("ollama.stream", counters=LLM_COUNTERS, model=model or self.model, kv_reuse=bool(context)) as span:
+            with self.session.post(
+                f"{self.base_url}/api/generate",
+                json=self._payload(prompt, model, options, stream=True, context=context),
+                stream=True,
+                timeout=self.timeout,
+            ) as response:
+                yield from iter_ndjson(response, stats)
+            record_stats(span, stats)
+
+    def close(self):
+        self.session.close()
+
+
+class Endpoint:
+    """One Ollama server as seen by OllamaRouter: its load, recent latency and health."""
+
+    def __init__(self, backend, max_failures=2, latency_alpha=0.3):
+        self.backend = backend
+        self.url = backend.base_url
+        self.max_failures = max_failures
+        self.alpha = latency_alpha
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.latency = None  # EWMA seconds to first token (streams) or to the full reply
+        self.healthy = True
+        self.failures = 0  # consecutive
+        self.requests = 0
+        self.errors = 0
+        self.last_error = None
+
+    def begin(self):
+        with self.lock:
+            self.in_flight += 1
+            self.requests += 1
+
+    def end(self, latency=None, error=None):
+        with self.lock:
+            self.in_flight -= 1
+            if error is not None:
+                self._fail(error)
+                return
+            self.failures = 0
+            self.healthy = True
+            if latency is not None:
+                self.latency = latency if self.latency is None else self.alpha * latency + (1 - self.alpha) * self.latency
+
+    def mark(self, healthy, error=None):
+        with self.lock:
+            if healthy:
+                self.failures = 0
+                self.healthy = True
+            else:
+                self._fail(error)
+
+    def _fail(self, error):
+        self.errors += 1
+        self.failures += 1
+        self.last_error = str(error)
+        if self.failures >= self.max_failures:
+            self.healthy = False
+
+    def to_dict(self):
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "in_flight": self.in_flight,
+            "latency_s": round(self.latency, 4) if self.latency is not None else None,
+            "requests": self.requests,
+            "errors": self.errors,
+            "last_error": self.last_error,
+        }
+
+
+class OllamaRouter:
+    """
+    Drop-in for OllamaBackend that spreads requests over several Ollama servers.
+
+    Each request goes to the healthy endpoint with the lowest expected wait,
+    (in-flight requests + 1) x recent latency. Connection errors and HTTP errors
+    fail over to the next endpoint, as long as no token has been passed on yet.
+    An endpoint is marked down after `max_failures` consecutive errors. A
+    background probe of /api/version every `probe_interval` seconds brings it
+    back. With `hedge_after` set, a request that has produced no token (or no
+    reply) within that many seconds is also sent to a second endpoint. Whichever
+    answers first wins, and the other stream is closed. A losing non-streamed
+    request cannot be aborted; it finishes in the background.
+
+    Ollama's `context` is a list of token ids, so ChatSession keeps working
+    across endpoints that serve the same model. Only the server-side KV cache
+    reuse is lost when a turn lands on a different box.
+    """
+
+    def __init__(self, urls=None, model=None, options=None, keep_alive="10m", hedge_after=None,
+                 probe_interval=10, probe_timeout=2, max_failures=2,
+                 connect_timeout=5, read_timeout=120, pool_size=4):
+        self.model = model or os.getenv("OLLAMA_DEFAULT_MODEL", "tinyllama")
+        self.options = dict(options or {})
+        self.keep_alive = keep_alive
+        self.hedge_after = hedge_after
+        self.probe_interval = probe_interval
+        self.probe_timeout = probe_timeout
+        # retries=0: a failing endpoint should hand over to the next one, not back off in place
+        self.endpoints = [
+            Endpoint(OllamaBackend(url, self.model, self.options, keep_alive, connect_timeout, read_timeout,
+                                   retries=0, pool_size=pool_size), max_failures)
+            for url in (urls or OLLAMA_URLS or [OLLAMA_URL])
+        ]
+        self.base_url = self.endpoints[0].url
+        self.lock = threading.Lock()
+        self.hedges = 0
+        self.hedge_wins = 0
+        self._stop = threading.Event()
+        self._prober = None
+        if probe_interval:
+            self.start_probes()
+
+    _payload = OllamaBackend._payload
+
+    def _acquire(self, exclude=()):
+        """Pick the least-loaded endpoint not in `exclude` and count the request against it."""
+        with self.lock:
+            candidates = [e for e in self.endpoints if e not in exclude]
+            # When everything is marked down, try anyway rather than fail without a request
+            pool = [e for e in candidates if e.healthy] or candidates
+            if not pool:
+                return None
+            known = [e.latency for e in pool if e.latency is not None]
+            default = sum(known) / len(known) if known else 1.0
+            endpoint = min(pool, key=lambda e: ((e.in_flight + 1) * (e.latency if e.latency is not None else default),
+                                                e.in_flight))
+            endpoint.begin()
+        return endpoint
+
+    def _count_hedge(self, won=False):
+        with self.lock:
+            if won:
+                self.hedge_wins += 1
+            else:
+                self.hedges += 1
+
+    # ── non-streaming ──
+    def _call(self, endpoint, payload, future):
+        t0 = time.perf_counter()
+        try:
+            response = endpoint.backend.session.post(f"{endpoint.url}/api/generate", json=payload,
+                                                     timeout=endpoint.backend.timeout)
+            response.raise_for_status()
+            data = response.json()
+        except (requests.RequestException, ValueError) as e:
+            endpoint.end(error=e)
+            future.set_exception(e)
+            return
+        endpoint.end(latency=time.perf_counter() - t0)
+        future.set_result(data)
+
+    def _start_call(self, endpoint, payload, pending):
+        future = Future()
+        pending[future] = endpoint
+        threading.Thread(target=self._call, args=(endpoint, payload, future), daemon=True).start()
+
+    def request(self, prompt, model=None, options=None, context=None):
+        """Non-streaming /api/generate call with failover and optional hedging."""
+        payload = self._payload(prompt, model, options, stream=False, context=context)
+        with tracing.span("ollama.generate", counters=LLM_COUNTERS, model=payload["model"], kv_reuse=bool(context)) as span:
+            tried, pending, error, hedged = [], {}, None, False
+            while True:
+                if not pending:
+                    endpoint = self._acquire(tried)
+                    if endpoint is None:
+                        raise error or RuntimeError("No Ollama endpoint available")
+                    tried.append(endpoint)
+                    self._start_call(endpoint, payload, pending)
+                can_hedge = self.hedge_after is not None and not hedged and len(tried) < len(self.endpoints)
+                done, _ = wait(pending, timeout=self.hedge_after if can_hedge else None, return_when=FIRST_COMPLETED)
+                if not done:
+                    hedged = True
+                    self._count_hedge()
+                    endpoint = self._acquire(tried)
+                    tried.append(endpoint)
+                    self._start_call(endpoint, payload, pending)
+                    continue
+                for future in done:
+                    endpoint = pending.pop(future)
+                    if future.exception() is not None:
+                        error = future.exception()
+                        continue
+                    if hedged and endpoint is not tried[0]:
+                        self._count_hedge(won=True)
+                    span.set(endpoint=endpoint.url, attempts=len(tried), hedged=hedged)
+                    record_reply(span, future.result())
+                    return future.result()
+
+    def generate(self, prompt, model=None, options=None):
+        """Return the full completion for `prompt`."""
+        return self.request(prompt, model, options).get("response", "")
+
+    # ── streaming ──
+    def _stream_attempt(self, endpoint, payload, events, cancel):
+        stats = GenerationStats()
+        try:
+            with endpoint.backend.session.post(f"{endpoint.url}/api/generate", json=payload, stream=True,
+                                               timeout=endpoint.backend.timeout) as response:
+                for piece in iter_ndjson(response, stats):
+                    if cancel.is_set():
+                        break
+                    events.put((endpoint, "token", piece))
+        except (requests.RequestException, RuntimeError, ValueError) as e:
+            endpoint.end(error=e)
+            events.put((endpoint, "error", e))
+            return
+        endpoint.end(latency=stats.time_to_first_token)
+        events.put((endpoint, "done", stats))
+
+    def stream(self, prompt, model=None, options=None, stats=None, context=None):
+        """Like OllamaBackend.stream, with failover before the first token and optional hedging."""
+        if stats is None:
+            stats = GenerationStats()
+        payload = self._payload(prompt, model, options, stream=True, context=context)
+        events, cancel, tried = queue.Queue(), {}, []
+        started = time.perf_counter()
+
+        def launch():
+            endpoint = self._acquire(tried)
+            if endpoint is None:
+                return False
+            tried.append(endpoint)
+            cancel[endpoint] = threading.Event()
+            threading.Thread(target=self._stream_attempt, args=(endpoint, payload, events, cancel[endpoint]),
+                             daemon=True).start()
+            return True
+
+        with tracing.span("ollama.stream", counters=LLM_COUNTERS, model=payload["model"], kv_reuse=bool(context)) as span:
+            if not launch():
+                raise RuntimeError("No Ollama endpoint available")
+            running, winner, error, hedged = 1, None, None, False
+            try:
+                while True:
+                    timeout = None
+                    if (winner is None and not hedged and self.hedge_after is not None
+                            and len(tried) < len(self.endpoints)):
+                        timeout = max(self.hedge_after - (time.perf_counter() - started), 0)
+                    try:
+                        endpoint, kind, value = events.get(timeout=timeout)
+                    except queue.Empty:
+                        hedged = True
+                        self._count_hedge()
+                        running += launch()
+                        continue
+
+                    if winner is None and kind != "error":
+                        winner = endpoint
+                        if hedged and winner is not tried[0]:
+                            self._count_hedge(won=True)
+                        for other, flag in cancel.items():
+                            if other is not winner:
+                                flag.set()
+                    if endpoint is not winner:
+                        if kind == "error":
+                            running -= 1
+                            error = value
+                            if winner is None and running == 0:
+                                if not launch():
+                                    raise error
+                                running += 1
+                        continue
+
+                    if kind == "token":
+                        if stats.first_token_at is None:
+                            stats.first_token_at = time.perf_counter()
+                        stats.chunks += 1
+                        yield value
+                    elif kind == "done":
+                        stats.eval_count = value.eval_count
+                        stats.eval_duration = value.eval_duration
+                        stats.prompt_eval_count = value.prompt_eval_count
+                        stats.context = value.context
+                        stats.finished_at = time.perf_counter()
+                        break
+                    else:
+                        # Part of the answer has already been yielded; retrying elsewhere would repeat it
+                        raise value
+            finally:
+                for flag in cancel.values():
+                    flag.set()
+            span.set(endpoint=winner.url, attempts=len(tried), hedged=hedged)
+            record_stats(span, stats)
+
+    # ── health ──
+    def probe(self):
+        """Check every endpoint once; a reachable server is marked healthy again."""
+        for endpoint in self.endpoints:
+            try:
+                response = endpoint.backend.session.get(f"{endpoint.url}/api/version", timeout=self.probe_timeout)
+                response.raise_for_status()
+            except requests.RequestException as e:
+                endpoint.mark(False, e)
+            else:
+                endpoint.mark(True)
+
+    def _probe_loop(self):
+        while not self._stop.wait(self.probe_interval):
+            self.probe()
+
+    def start_probes(self):
+        if self._prober is None:
+            self._prober = threading.Thread(target=self._probe_loop, daemon=True)
+            self._prober.start()
+        return self._prober
+
+    def stats(self):
+        return {
+            "endpoints": [endpoint.to_dict() for endpoint in self.endpoints],
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+        }
+
+    def close(self):
+        self._stop.set()
+        for endpoint in self.endpoints:
+            endpoint.backend.close()
+
+
+def make_backend(urls=None, **kwargs):
+    """
+    OllamaRouter over `urls` (default: OLLAMA_URLS) when there is more than one,
+    otherwise a plain OllamaBackend.
+    """
+    urls = urls or OLLAMA_URLS
+    if len(urls) > 1:
+        kwargs.pop("base_url", None)
+        for name in ("retries", "backoff"):
+            kwargs.pop(name, None)  # the router fails over instead of retrying in place
+        kwargs.setdefault("hedge_after", OLLAMA_HEDGE_AFTER)
+        return OllamaRouter(urls, **kwargs)
+    if urls and "base_url" not in kwargs:
+        kwargs["base_url"] = urls[0]
+    return OllamaBackend(**kwargs)
+
+
+class ChatSession:
+    """
+    Multi-turn conversation that reuses Ollama's KV context between turns.
+
+    /api/generate returns a `context` token array describing everything the model
+    has processed. Sending it back with the next request lets Ollama skip
+    re-prefilling earlier turns, so each call carries only the new turn. When
+    there is no context yet, the model changed, or the context would outgrow
+    `max_context_tokens`, the session falls back to `full_prompt` (the whole
+    conversation as text) and starts a fresh context from there. Callers should
+    size the new turn to `remaining_tokens()`; a turn_prompt of None forces the
+    fallback.
+    """
+
+    def __init__(self, backend=None, model=None, max_context_tokens=None, token_counter=None):
+        self.backend = backend or OllamaBackend()
+        self.model = model or self.backend.model
+        num_ctx = self.backend.options.get("num_ctx", 2048)
+        num_predict = self.backend.options.get("num_predict", 256)
+        self.max_context_tokens = max_context_tokens or num_ctx - num_predict
+        # Rough chars-per-token for English text unless the caller counts the way its prompt builder does
+        self.count = token_counter or (lambda text: len(text) // 3)
+        self.context = None
+        self.context_model = None
+        self.turns = 0
+        self.full_prompts = 0
+
+    def reset(self):
+        self.context = None
+        self.context_model = None
+
+    def remaining_tokens(self, model=None):
+        """Tokens a new turn may use while still reusing the current context."""
+        if self.context is None or self.context_model != (model or self.model):
+            return self.max_context_tokens
+        return max(self.max_context_tokens - len(self.context), 0)
+
+    def _prepare(self, turn_prompt, full_prompt, model):
+        model = model or self.model
+        reuse = (
+            turn_prompt is not None
+            and self.context is not None
+            and self.context_model == model
+            and len(self.context) + self.count(turn_prompt) < self.max_context_tokens
+        )
+        self.turns += 1
+        if reuse:
+            return turn_prompt, self.context, model
+        self.full_prompts += 1
+        return full_prompt or turn_prompt, None, model
+
+    def _remember(self, context, model):
+        self.context = context or None
+        self.context_model = model if context else None
+
+    def generate(self, turn_prompt, full_prompt=None, model=None, options=None):
+        prompt, context, model = self._prepare(turn_prompt, full_prompt, model)
+        data = self.backend.request(prompt, model=model, options=options, context=context)
+        self._remember(data.get("context"), model)
+        return data.get("response", "")
+
+    def stream(self, turn_prompt, full_prompt=None, model=None, options=None, stats=None):
+        if stats is None:
+            stats = GenerationStats()
+        prompt, context, model = self._prepare(turn_prompt, full_prompt, model)
+        # Drop the old context first: an interrupted stream must not leave it half-updated
+        self.reset()
+        yield from self.backend.stream(prompt, model=model, options=options, stats=stats, context=context)
+        self._remember(stats.context, model)
@@ -0,0 +1,354 @@
+# phase1_llm_core/tracing.py
+#
+# Lightweight spans and metrics for the RAG and speech paths.
+#
+#   TRACING=1                  turn tracing on (or call tracing.enable())
+#   TRACE_FILE=traces.jsonl    append every finished trace as one JSON line
+#   METRICS_PORT=9464          serve Prometheus text on http://localhost:9464/metrics
+#
+# Usage:
+#
+#   with tracing.span("rag.search", top_k=5) as s:
+#       ...
+#       s.set(chunks=len(docs), cache_hit=False)
+#
+#   @tracing.traced("whisper.transcribe")
+#   def transcribe_audio(path): ...
+#
+# Spans nest per thread. A span with no parent is a trace: when it finishes it
+# is kept in recent_traces() and written to TRACE_FILE. Every span also feeds
+# the in-process registry:
+#   - a duration histogram per span name
+#   - a counter per attribute named in span(..., counters=(...)), for additive
+#     quantities such as tokens or cache hits; other numeric attributes (budget,
+#     top_k, ...) stay on the trace only
+#   - a counter per true boolean attribute (cache_hit, ...)
+# While tracing is disabled, span() returns a shared no-op object and traced()
+# adds one flag check per call.
+
+import os
+import json
+import time
+import bisect
+import functools
+import threading
+from collections import deque
+
+_enabled = os.getenv("TRACING", "0").lower() in ("1", "true", "yes", "on")
+TRACE_FILE = os.getenv("TRACE_FILE")
+MAX_CHILDREN = 200  # per span; long ingests would otherwise build huge traces
+
+_local = threading.local()
+_file_lock = threading.Lock()
+_recent = deque(maxlen=50)
+
+# Seconds; covers a cached embedding lookup (~1 ms) up to a slow CPU generation
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def enable(trace_file=None):
+    global _enabled, TRACE_FILE
+    _enabled = True
+    if trace_file:
+        TRACE_FILE = trace_file
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def is_enabled():
+    return _enabled
+
+
+# ── metrics ──
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        with self.lock:
+            self.counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.count += 1
+            self.sum += value
+
+    def percentile(self, p):
+        """Upper bucket bound containing the p-th percentile (None when empty)."""
+        if not self.count:
+            return None
+        rank, seen = p / 100 * self.count, 0
+        for bound, n in zip(self.buckets + (float("inf"),), self.counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.histograms = {}
+        self.counters = {}
+        self.lock = threading.Lock()
+
+    def histogram(self, name, labels=()):
+        key = (name, tuple(labels))
+        hist = self.histograms.get(key)
+        if hist is None:
+            with self.lock:
+                hist = self.histograms.setdefault(key, Histogram())
+        return hist
+
+    def inc(self, name, labels=(), value=1):
+        key = (name, tuple(labels))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe_span(self, span):
+        labels = (("span", span.name),)
+        self.histogram("span_duration_seconds", labels).observe(span.duration)
+        if span.error:
+            self.inc("span_errors_total", labels)
+        for key, value in span.attrs.items():
+            if isinstance(value, bool):
+                if value:
+                    self.inc(f"span_{key}_total", labels)
+            elif isinstance(value, (int, float)) and key in span.counters:
+                self.inc(f"span_{key}_total", labels, value)
+
+    def snapshot(self):
+        """{name{labels}: {"count", "sum", "p50", "p95", "p99"} or counter value}."""
+        out = {}
+        for (name, labels), hist in sorted(self.histograms.items()):
+            out[_series(name, labels)] = {
+                "count": hist.count, "sum": round(hist.sum, 6),
+                "p50": hist.percentile(50), "p95": hist.percentile(95), "p99": hist.percentile(99),
+            }
+        for (name, labels), value in sorted(self.counters.items()):
+            out[_series(name, labels)] = value
+        return out
+
+    def to_prometheus(self):
+        lines, typed = [], set()
+        for (name, labels), hist in sorted(self.histograms.items()):
+            if name not in typed:
+                lines.append(f"# TYPE {name} histogram")
+                typed.add(name)
+            cumulative = 0
+            for bound, n in zip(hist.buckets + (float("inf"),), hist.counts):
+                cumulative += n
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{_series(name + '_bucket', labels + (('le', le),))} {cumulative}")
+            lines.append(f"{_series(name + '_sum', labels)} {hist.sum}")
+            lines.append(f"{_series(name + '_count', labels)} {hist.count}")
+        for (name, labels), value in sorted(self.counters.items()):
+            if name not in typed:
+                lines.append(f"# TYPE {name} counter")
+                typed.add(name)
+            lines.append(f"{_series(name, labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self.lock:
+            self.histograms.clear()
+            self.counters.clear()
+
+
+def _series(name, labels):
+    if not labels:
+        return name
+    return name + "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+
+
+registry = MetricsRegistry()
+
+
+# ── spans ──
+class Span:
+    __slots__ = ("name", "attrs", "counters", "start", "duration", "children", "dropped", "parent", "error",
+                 "wall_start")
+
+    def __init__(self, name, attrs, counters=()):
+        self.name = name
+        self.attrs = attrs
+        self.counters = frozenset(counters)
+        self.children = []
+        self.dropped = 0
+        self.parent = None
+        self.error = None
+        self.duration = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+        return self
+
+    def __enter__(self):
+        stack = _stack()
+        if stack:
+            self.parent = stack[-1]
+        stack.append(self)
+        self.wall_start = time.time()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration = time.perf_counter() - self.start
+        if exc_type is not None:
+            self.error = f"{exc_type.__name__}: {exc}"
+        stack = _stack()
+        if stack and stack[-1] is self:
+            stack.pop()
+        elif self in stack:
+            stack.remove(self)  # a generator span closed out of order
+        registry.observe_span(self)
+        if self.parent is not None:
+            if len(self.parent.children) < MAX_CHILDREN:
+                self.parent.children.append(self)
+            else:
+                self.parent.dropped += 1
+        else:
+            _finish_trace(self)
+        return False
+
+    def to_dict(self):
+        out = {"name": self.name, "start": self.wall_start,
+               "duration_ms": round(self.duration * 1000, 3) if self.duration is not None else None}
+        if self.attrs:
+            out["attrs"] = self.attrs
+        if self.error:
+            out["error"] = self.error
+        if self.children:
+            out["children"] = [child.to_dict() for child in self.children]
+        if self.dropped:
+            out["dropped_children"] = self.dropped
+        return out
+
+    def flatten(self, depth=0):
+        """[(depth, span)] in start order, for tabular display."""
+        rows = [(depth, self)]
+        for child in self.children:
+            rows.extend(child.flatten(depth + 1))
+        return rows
+
+
+class _NullSpan:
+    """Stand-in returned while tracing is disabled."""
+
+    __slots__ = ()
+    name = None
+    attrs = {}
+    duration = None
+    children = ()
+
+    def set(self, **attrs):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def to_dict(self):
+        return {}
+
+    def flatten(self, depth=0):
+        return []
+
+
+NULL_SPAN = _NullSpan()
+
+
+def _stack():
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+
+def _finish_trace(root):
+    _recent.append(root)
+    if TRACE_FILE:
+        line = json.dumps(root.to_dict(), default=str)
+        with _file_lock:
+            with open(TRACE_FILE, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+
+def span(name, counters=(), **attrs):
+    """
+    Open a span. `counters` names the numeric attributes that are additive
+    (tokens, cache hits, ...) and should be summed into span_<attr>_total.
+    """
+    if not _enabled:
+        return NULL_SPAN
+    return Span(name, attrs, counters)
+
+
+def current_span():
+    """The innermost open span on this thread (NULL_SPAN if none)."""
+    if not _enabled:
+        return NULL_SPAN
+    stack = _stack()
+    return stack[-1] if stack else NULL_SPAN
+
+
+def traced(name=None):
+    """Decorator: run the function inside a span named `name` (default: module.function)."""
+    def decorate(fn):
+        span_name = name or f"{fn.__module__}.{fn.__qualname__}"
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            with Span(span_name, {}):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def recent_traces():
+    """Finished root spans, oldest first."""
+    return list(_recent)
+
+
+def last_trace():
+    return _recent[-1] if _recent else None
+
+
+# ── export ──
+def write_prometheus(path):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(registry.to_prometheus())
+    os.replace(tmp_path, path)
+
+
+def start_metrics_server(port=None, host="127.0.0.1"):
+    """Serve registry.to_prometheus() at /metrics from a daemon thread."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            body = registry.to_prometheus().encode()
+            self.send_response(200 if self.path.startswith("/metrics") else 404)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer((host, int(port or os.getenv("METRICS_PORT", "9464"))), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if os.getenv("METRICS_PORT") and _enabled:
+    start_metrics_server()
@@ -1,39 +1,52 @@
+import os
+import sys
 import streamlit as st
-import requests
 
-OLLAMA_API_URL = "http://localhost:11434/api/generate"
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "phase1_llm_core"))
+from ollama_client import make_backend, ChatSession, GenerationStats
+
 MODEL_NAME = "tinyllama"
 
 st.set_page_config(page_title="LLM Chat UI", layout="centered")
 
 st.title("💬 TinyLLaMA - Local Chat")
 
+@st.cache_resource
+def get_backend():
+    # One pooled connection per server process; keep_alive stops Ollama unloading the model between messages
+    return make_backend(model=MODEL_NAME, keep_alive="30m")
+
 if "chat_history" not in st.session_state:
     st.session_state.chat_history = []
+if "llm_session" not in st.session_state:
+    # Per-browser-session KV context, so each message only sends the new turn
+    st.session_state.llm_session = ChatSession(get_backend())
 
 prompt = st.chat_input("Type your message here...")
 
-def get_ollama_response(prompt):
-    payload = {
-        "model": MODEL_NAME,
-        "prompt": prompt,
-        "stream": False
-    }
-    response = requests.post(OLLAMA_API_URL, json=payload)
-    response.raise_for_status()
-    return response.json()["response"]
+# Display chat history
+for sender, message in st.session_state.chat_history:
+    if sender == "user":
+        st.chat_message("user").write(message)
+    else:
+        st.chat_message("assistant").write(message)
 
 if prompt:
     st.session_state.chat_history.append(("user", prompt))
+    st.chat_message("user").write(prompt)
     try:
-        reply = get_ollama_response(prompt)
+        stats = GenerationStats()
+        with st.chat_message("assistant"):
+            # Used only when the session has to rebuild its context from text
+            full_prompt = "\n".join(
+                f"{'User' if sender == 'user' else 'Assistant'}: {message}"
+                for sender, message in st.session_state.chat_history
+            ) + "\nAssistant:"
+            # Same User:/Assistant: framing whether the turn extends the KV context or starts a new one
+            turn_prompt = f"User: {prompt}\nAssistant:"
+            # Render tokens as they arrive instead of waiting for the full reply
+            reply = st.write_stream(st.session_state.llm_session.stream(turn_prompt, full_prompt=full_prompt, stats=stats))
+            st.caption(f"⏱️ {stats.summary()}")
         st.session_state.chat_history.append(("llm", reply))
     except Exception as e:
         st.error(f"Error: {e}")
-
-# Display chat history
-for sender, message in st.session_state.chat_history:
-    if sender == "user":
-        st.chat_message("user").write(message)
-    else:
-        st.chat_message("assistant").write(message)
@@ -0,0 +1,149 @@
+# phase3_agent_assist/answer_cache.py
+#
+# Two-tier answer cache in front of the LLM:
+#   1. exact    — same model + same prompt text
+#   2. semantic — a previous query whose embedding is within `similarity_threshold`
+#                 (cosine) of the new one AND retrieved exactly the same chunks
+#
+# Entries expire after `ttl` seconds, the least recently used entry is evicted
+# once `max_entries` is reached, and everything is dropped when the underlying
+# vector store changes (see collection_fingerprint).
+
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from vector_store import MANIFEST_PATH
+
+
+def prompt_key(model, prompt):
+    return hashlib.sha256(f"{model}\x00{prompt}".encode("utf-8")).hexdigest()
+
+
+def collection_fingerprint(collection, manifest_path=MANIFEST_PATH):
+    """Cheap value that changes whenever the collection (any VectorStore) is re-ingested."""
+    try:
+        manifest_mtime = os.path.getmtime(manifest_path)
+    except OSError:
+        manifest_mtime = None
+    return (collection.count(), manifest_mtime)
+
+
+class _Entry:
+    __slots__ = ("model", "answer", "query_vec", "chunk_ids", "created")
+
+    def __init__(self, model, answer, query_vec, chunk_ids):
+        self.model = model
+        self.answer = answer
+        self.query_vec = query_vec
+        self.chunk_ids = tuple(chunk_ids)
+        self.created = time.monotonic()
+
+
+class AnswerCache:
+    def __init__(self, ttl=3600, max_entries=1000, similarity_threshold=0.95):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.similarity_threshold = similarity_threshold
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # prompt key -> _Entry, least recently used first
+        self.version = None
+        self._matrix = None  # stacked unit query vectors for the semantic tier
+        self._matrix_keys = []
+        self.counters = {"exact_hits": 0, "semantic_hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+    # ── housekeeping ──
+    def sync_version(self, version):
+        """Clear the cache if the collection fingerprint changed since the last call."""
+        with self.lock:
+            if version != self.version:
+                if self.entries:
+                    self.counters["invalidations"] += 1
+                self.entries.clear()
+                self._matrix = None
+                self.version = version
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self._matrix = None
+
+    def _expired(self, entry, now):
+        return self.ttl is not None and now - entry.created > self.ttl
+
+    def _drop(self, key):
+        self.entries.pop(key, None)
+        self._matrix = None
+
+    def _semantic_index(self):
+        if self._matrix is None:
+            keys = [k for k, e in self.entries.items() if e.query_vec is not None]
+            self._matrix_keys = keys
+            self._matrix = np.stack([self.entries[k].query_vec for k in keys]) if keys else None
+        return self._matrix, self._matrix_keys
+
+    # ── public API ──
+    def lookup(self, model, prompt, query_embedding=None, chunk_ids=None):
+        """Return a cached answer or None. Exact prompt matches win over semantic ones."""
+        now = time.monotonic()
+        key = prompt_key(model, prompt)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and self._expired(entry, now):
+                self._drop(key)
+                entry = None
+            if entry is not None:
+                self.entries.move_to_end(key)
+                self.counters["exact_hits"] += 1
+                return entry.answer
+
+            if query_embedding is not None and chunk_ids is not None:
+                matrix, keys = self._semantic_index()
+                if matrix is not None:
+                    query_vec = _unit(query_embedding)
+                    scores = matrix @ query_vec
+                    wanted = tuple(chunk_ids)
+                    for i in np.argsort(-scores):
+                        if scores[i] < self.similarity_threshold:
+                            break
+                        candidate = self.entries.get(keys[i])
+                        if candidate is None or self._expired(candidate, now):
+                            continue
+                        if candidate.model == model and candidate.chunk_ids == wanted:
+                            self.entries.move_to_end(keys[i])
+                            self.counters["semantic_hits"] += 1
+                            return candidate.answer
+
+            self.counters["misses"] += 1
+            return None
+
+    def store(self, model, prompt, answer, query_embedding=None, chunk_ids=()):
+        key = prompt_key(model, prompt)
+        query_vec = _unit(query_embedding) if query_embedding is not None else None
+        with self.lock:
+            self.entries[key] = _Entry(model, answer, query_vec, chunk_ids)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.counters["evictions"] += 1
+            self._matrix = None
+
+    def stats(self):
+        with self.lock:
+            lookups = self.counters["exact_hits"] + self.counters["semantic_hits"] + self.counters["misses"]
+            hits = lookups - self.counters["misses"]
+            return {
+                **self.counters,
+                "entries": len(self.entries),
+                "hit_rate": hits / lookups if lookups else 0.0,
+            }
+
+
+def _unit(vector):
+    vector = np.asarray(vector, dtype=np.float32).ravel()
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
@@ -0,0 +1,62 @@
+# phase3_agent_assist/batch_retrieval.py
+#
+# Retrieval for many queries at once.
+#
+# Queries are encoded `batch_size` at a time in one model call. Each batch is
+# then searched with one multi-embedding store.query(). Both backends return
+# one result row per query embedding (Chroma natively; NumpyStore with a single
+# matmul). For thousands of queries this replaces thousands of encode + query
+# round trips with a few dozen.
+#
+# Used by rag_chain.search_similar_batch, RetrievalEngine.retrieve_batch and
+# eval_retrieval.py.
+
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "phase1_llm_core"))
+import tracing
+
+DEFAULT_BATCH_SIZE = 256
+DEFAULT_INCLUDE = ("documents", "metadatas", "distances")
+
+
+def iter_search_batches(store, embedder, queries, top_k=5, batch_size=DEFAULT_BATCH_SIZE, where=None,
+                        include=DEFAULT_INCLUDE, encode_batch_size=64):
+    """
+    Yield one dict per batch of queries:
+        {"start": index of the first query, "results": Chroma-shaped query result,
+         "embeddings": float32 (n, dim), "embed_s": ..., "query_s": ...}
+    """
+    queries = list(queries)
+    for start in range(0, len(queries), batch_size):
+        batch = queries[start:start + batch_size]
+        with tracing.span("retrieval.batch", queries=len(batch), top_k=top_k) as span:
+            t0 = time.perf_counter()
+            embeddings = np.asarray(embedder.encode(batch, batch_size=encode_batch_size), dtype=np.float32)
+            t1 = time.perf_counter()
+            results = store.query(embeddings, n_results=top_k, where=where, include=list(include))
+            t2 = time.perf_counter()
+            span.set(embed_s=t1 - t0, query_s=t2 - t1)
+        yield {"start": start, "results": results, "embeddings": embeddings, "embed_s": t1 - t0, "query_s": t2 - t1}
+
+
+def search_batch(store, embedder, queries, top_k=5, batch_size=DEFAULT_BATCH_SIZE, where=None,
+                 include=DEFAULT_INCLUDE):
+    """Chroma-shaped results for all `queries` (one row per query), plus "embeddings" (n, dim)."""
+    merged = {"ids": [], **{key: [] for key in include}}
+    embeddings = []
+    for batch in iter_search_batches(store, embedder, queries, top_k, batch_size, where, include):
+        for key in merged:
+            merged[key].extend(batch["results"][key])
+        embeddings.append(batch["embeddings"])
+    merged["embeddings"] = np.concatenate(embeddings) if embeddings else np.zeros((0, 0), dtype=np.float32)
+    return merged
+
+
+def as_triples(merged):
+    """[(documents, chunk ids, query embedding)] per query, the shape search_similar returns."""
+    return list(zip(merged["documents"], merged["ids"], merged["embeddings"]))
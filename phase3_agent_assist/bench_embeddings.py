@@ -0,0 +1,123 @@
+# phase3_agent_assist/bench_embeddings.py
+#
+# Throughput and accuracy of the embedding backends against the torch fp32 baseline.
+#
+#   python bench_embeddings.py                          # chunks from ./data
+#   python bench_embeddings.py --backends torch onnx-int8 --batch-sizes 1 32
+#   python bench_embeddings.py --synthetic 2000 --json results.json
+#
+# For every backend it reports sentences/sec at each batch size, the cosine
+# similarity of its vectors to the baseline, and top-k overlap: how many of the
+# baseline's nearest chunks it still returns for the same queries. The embedding
+# cache is bypassed so every number is a real forward pass.
+
+import os
+import json
+import time
+import argparse
+
+import numpy as np
+
+from embedding_backends import BACKENDS, load_embedder
+
+EMBED_MODEL_NAME = "all-MiniLM-L6-v2"
+DATA_DIR = "./data"
+
+_WORDS = ("customer reports login failure after password reset on the mobile app "
+          "billing dispute refund escalated to tier two agent policy outage router "
+          "firmware update invoice overdue account locked verification code delayed").split()
+
+
+def data_corpus(directory, limit):
+    from ingest import iter_chunks
+
+    texts = []
+    for fname in sorted(os.listdir(directory)):
+        path = os.path.join(directory, fname)
+        if ':' in fname or not os.path.isfile(path):
+            continue
+        try:
+            texts.extend(chunk for chunk, _ in iter_chunks(path))
+        except ValueError:
+            continue
+        if len(texts) >= limit:
+            break
+    return texts[:limit]
+
+
+def synthetic_corpus(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return [" ".join(rng.choice(_WORDS, size=rng.integers(8, 80))) for _ in range(n)]
+
+
+def throughput(model, texts, batch_size):
+    model.encode(texts[:batch_size], batch_size=batch_size)  # warm-up: session init, allocator
+    t0 = time.perf_counter()
+    model.encode(texts, batch_size=batch_size)
+    return len(texts) / (time.perf_counter() - t0)
+
+
+def top_k(corpus, queries, k):
+    return np.argsort(-(queries @ corpus.T), axis=1)[:, :k]
+
+
+def parity(baseline, vectors, queries, k):
+    """Cosine agreement with the baseline vectors and mean top-k overlap of corpus search."""
+    base_unit = baseline / np.linalg.norm(baseline, axis=1, keepdims=True)
+    unit = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    cosine = (base_unit * unit).sum(axis=1)
+    expected = top_k(base_unit, base_unit[queries], k)
+    got = top_k(unit, unit[queries], k)
+    overlap = np.mean([len(set(a) & set(b)) / k for a, b in zip(expected, got)])
+    return {"cosine_mean": float(cosine.mean()), "cosine_min": float(cosine.min()),
+            f"top{k}_overlap": float(overlap)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare embedding backends")
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=list(BACKENDS))
+    parser.add_argument("--batch-sizes", nargs="+", type=int, default=[1, 8, 32, 128])
+    parser.add_argument("--data", default=DATA_DIR, help="Directory of documents to chunk")
+    parser.add_argument("--limit", type=int, default=1000, help="Max chunks to embed")
+    parser.add_argument("--synthetic", type=int, default=0, help="Use N synthetic sentences instead")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--json", help="Write the results to this file")
+    args = parser.parse_args()
+
+    if args.synthetic or not os.path.isdir(args.data):
+        texts = synthetic_corpus(args.synthetic or args.limit)
+    else:
+        texts = data_corpus(args.data, args.limit) or synthetic_corpus(args.limit)
+    queries = np.random.default_rng(1).choice(len(texts), size=min(args.queries, len(texts)), replace=False)
+    print(f"[i] {len(texts)} texts  queries={len(queries)}  k={args.k}\n")
+
+    results, baseline = {}, None
+    for backend in ["torch"] + [b for b in args.backends if b != "torch"]:
+        t0 = time.perf_counter()
+        model = load_embedder(EMBED_MODEL_NAME, backend)
+        load_s = time.perf_counter() - t0
+        vectors = np.asarray(model.encode(texts, batch_size=32), dtype=np.float32)
+        row = {"load_s": round(load_s, 2)}
+        if baseline is None:
+            baseline = vectors
+        else:
+            row.update(parity(baseline, vectors, queries, args.k))
+        if backend in args.backends:
+            row["sentences_per_s"] = {bs: round(throughput(model, texts, bs), 1) for bs in args.batch_sizes}
+            results[backend] = row
+        del model
+
+        rates = "  ".join(f"bs{bs}={rate:.0f}/s" for bs, rate in row.get("sentences_per_s", {}).items())
+        accuracy = (f"  cos={row['cosine_mean']:.4f} (min {row['cosine_min']:.4f})  "
+                    f"top{args.k}={row[f'top{args.k}_overlap']:.3f}") if "cosine_mean" in row else "  (baseline)"
+        print(f"{backend:<10} load={load_s:.1f}s  {rates}{accuracy}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"model": EMBED_MODEL_NAME, "texts": len(texts), "k": args.k, "backends": results}, f, indent=2)
+        print(f"\n[✓] Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+# phase3_agent_assist/bench_hnsw.py
+#
+# Sweep Chroma HNSW settings: build time, disk size, latency and recall@k.
+#
+#   python bench_hnsw.py                                  # synthetic 20k x 384 corpus
+#   python bench_hnsw.py --from-chroma --k 5 --target-recall 0.95
+#   python bench_hnsw.py --m 8 16 32 --construction-ef 100 200 --search-ef 10 50 100 200
+#
+# For every (space, M, construction_ef) a fresh collection is built in a temp
+# directory. Each search_ef is then applied in turn and the same queries are
+# timed against it. Recall is measured against exact brute-force top-k in
+# the same space. The fastest setting meeting --target-recall is printed last;
+# put it in CHROMA_HNSW_* for ingest and the chat apps.
+
+import os
+import json
+import time
+import shutil
+import argparse
+import itertools
+import tempfile
+
+import numpy as np
+
+from vector_store import ChromaStore, HNSW_SPACES
+from bench_vector_store import synthetic_corpus, chroma_corpus, build, percentile_ms
+
+
+def exact_top_k(vectors, queries, k, space):
+    """Brute-force neighbours of each query, ranked the way Chroma ranks `space`."""
+    if space == "cosine":
+        unit = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+        scores = queries @ unit.T
+    elif space == "ip":
+        scores = queries @ vectors.T
+    else:
+        # -||q - v||^2 up to a per-query constant
+        scores = 2 * queries @ vectors.T - (vectors ** 2).sum(axis=1)[None, :]
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    return [set(row) for row in top]
+
+
+def disk_size(path):
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, files in os.walk(path) for name in files)
+
+
+def measure(store, queries, truth, ids, k):
+    id_row = {chunk_id: i for i, chunk_id in enumerate(ids)}
+    store.query(queries[:1], n_results=k, include=["distances"])  # load the index before timing
+    latencies, recalls = [], []
+    for q, expected in zip(queries, truth):
+        t0 = time.perf_counter()
+        result = store.query(q[None, :], n_results=k, include=["distances"])
+        latencies.append(time.perf_counter() - t0)
+        recalls.append(len({id_row[i] for i in result["ids"][0]} & expected) / k)
+    return {"recall": round(float(np.mean(recalls)), 4), "p50_ms": round(percentile_ms(latencies, 50), 3),
+            "p95_ms": round(percentile_ms(latencies, 95), 3), "p99_ms": round(percentile_ms(latencies, 99), 3)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep Chroma HNSW parameters")
+    parser.add_argument("--n", type=int, default=20000, help="Synthetic corpus size")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--from-chroma", action="store_true", help="Use embeddings from ./chroma_store")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--space", nargs="+", choices=HNSW_SPACES, default=["cosine"])
+    parser.add_argument("--m", nargs="+", type=int, default=[8, 16, 32])
+    parser.add_argument("--construction-ef", nargs="+", type=int, default=[100, 200])
+    parser.add_argument("--search-ef", nargs="+", type=int, default=[10, 25, 50, 100, 200])
+    parser.add_argument("--target-recall", type=float, default=0.95)
+    parser.add_argument("--json", help="Write all rows to this file")
+    args = parser.parse_args()
+
+    vectors, sources = chroma_corpus() if args.from_chroma else synthetic_corpus(args.n, args.dim)
+    rng = np.random.default_rng(1)
+    picks = rng.integers(0, len(vectors), size=args.queries)
+    queries = vectors[picks] + 0.05 * rng.normal(size=(args.queries, vectors.shape[1])).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    ids = [f"chunk_{i}" for i in range(len(vectors))]
+    print(f"[i] corpus={len(vectors)} x {vectors.shape[1]}  queries={args.queries}  k={args.k}\n")
+    print(f"{'space':<7}{'M':>4}{'c_ef':>6}{'s_ef':>6}{'build s':>9}{'disk MB':>9}"
+          f"{'recall':>8}{'p50 ms':>8}{'p95 ms':>8}{'p99 ms':>8}")
+
+    rows = []
+    tmp_root = tempfile.mkdtemp(prefix="bench_hnsw_")
+    try:
+        for space in args.space:
+            truth = exact_top_k(vectors, queries, args.k, space)
+            for m, construction_ef in itertools.product(args.m, args.construction_ef):
+                path = os.path.join(tmp_root, f"{space}_m{m}_c{construction_ef}")
+                store = ChromaStore(path=path, name="bench", create=True,
+                                    hnsw={"space": space, "max_neighbors": m, "ef_construction": construction_ef})
+                build_s = build(store, ids, vectors, sources)
+                size_mb = disk_size(path) / 1e6
+                for search_ef in args.search_ef:
+                    store.set_search_ef(search_ef)
+                    result = measure(store, queries, truth, ids, args.k)
+                    row = {"space": space, "m": m, "construction_ef": construction_ef, "search_ef": search_ef,
+                           "build_s": round(build_s, 2), "disk_mb": round(size_mb, 2), **result}
+                    rows.append(row)
+                    print(f"{space:<7}{m:>4}{construction_ef:>6}{search_ef:>6}{build_s:>9.1f}{size_mb:>9.1f}"
+                          f"{result['recall']:>8.4f}{result['p50_ms']:>8.2f}{result['p95_ms']:>8.2f}"
+                          f"{result['p99_ms']:>8.2f}")
+                del store
+                shutil.rmtree(path, ignore_errors=True)
+    finally:
+        shutil.rmtree(tmp_root, ignore_errors=True)
+
+    passing = [row for row in rows if row["recall"] >= args.target_recall]
+    if passing:
+        best = min(passing, key=lambda row: row["p95_ms"])
+        print(f"\n[✓] Fastest p95 with recall@{args.k} >= {args.target_recall}: "
+              f"CHROMA_HNSW_SPACE={best['space']} CHROMA_HNSW_M={best['m']} "
+              f"CHROMA_HNSW_CONSTRUCTION_EF={best['construction_ef']} CHROMA_HNSW_SEARCH_EF={best['search_ef']}")
+    else:
+        print(f"\n[!] No setting reached recall@{args.k} >= {args.target_recall}; widen --search-ef or --m")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"corpus": len(vectors), "k": args.k, "rows": rows}, f, indent=2)
+        print(f"[✓] Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+# phase3_agent_assist/bench_vector_store.py
+#
+# Recall and latency of the vector store backends against exact float32 search.
+#
+#   python bench_vector_store.py                   # synthetic 20k x 384 corpus
+#   python bench_vector_store.py --n 50000 --k 5
+#   python bench_vector_store.py --from-chroma     # embeddings from ./chroma_store
+#
+# Each backend is built in a temp directory, so the real stores are never touched.
+
+import time
+import shutil
+import argparse
+import tempfile
+
+import numpy as np
+
+from vector_store import NumpyStore, ChromaStore
+
+
+def synthetic_corpus(n, dim, clusters=200, seed=0):
+    # Clustered unit vectors look more like MiniLM chunk embeddings than pure noise
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, clusters, size=n)
+    vectors = centers[labels] + 0.6 * rng.normal(size=(n, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    sources = [f"doc_{label % 50}.pdf" for label in labels]
+    return vectors, sources
+
+
+def chroma_corpus():
+    store = ChromaStore()
+    data = store.collection.get(include=["embeddings", "metadatas"])
+    vectors = np.asarray(data["embeddings"], dtype=np.float32)
+    return vectors, [m.get("source") for m in data["metadatas"]]
+
+
+def exact_top_k(vectors, queries, k):
+    unit = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    scores = queries @ unit.T
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    return [set(row) for row in top]
+
+
+def percentile_ms(samples, p):
+    return float(np.percentile(samples, p) * 1000)
+
+
+def bench(name, store, queries, truth, ids, k):
+    id_row = {chunk_id: i for i, chunk_id in enumerate(ids)}
+    latencies, recalls = [], []
+    for q, expected in zip(queries, truth):
+        t0 = time.perf_counter()
+        result = store.query(q[None, :], n_results=k, include=["distances"])
+        latencies.append(time.perf_counter() - t0)
+        got = {id_row[i] for i in result["ids"][0]}
+        recalls.append(len(got & expected) / k)
+    print(f"{name:<16} recall@{k}={np.mean(recalls):.4f}  "
+          f"p50={percentile_ms(latencies, 50):.2f}ms  p95={percentile_ms(latencies, 95):.2f}ms  "
+          f"p99={percentile_ms(latencies, 99):.2f}ms")
+
+
+def build(store, ids, vectors, sources, batch=5000):
+    t0 = time.perf_counter()
+    for start in range(0, len(ids), batch):
+        end = start + batch
+        store.upsert(ids[start:end], vectors[start:end], [""] * len(ids[start:end]),
+                     [{"source": s} for s in sources[start:end]])
+    store.flush()
+    return time.perf_counter() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare vector store backends")
+    parser.add_argument("--n", type=int, default=20000, help="Synthetic corpus size")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--from-chroma", action="store_true", help="Use embeddings from ./chroma_store")
+    parser.add_argument("--skip-chroma", action="store_true", help="Only benchmark the numpy backends")
+    args = parser.parse_args()
+
+    vectors, sources = chroma_corpus() if args.from_chroma else synthetic_corpus(args.n, args.dim)
+    rng = np.random.default_rng(1)
+    picks = rng.integers(0, len(vectors), size=args.queries)
+    queries = vectors[picks] + 0.05 * rng.normal(size=(args.queries, vectors.shape[1])).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    truth = exact_top_k(vectors, queries, args.k)
+    ids = [f"chunk_{i}" for i in range(len(vectors))]
+    print(f"[i] corpus={len(vectors)} x {vectors.shape[1]}  queries={args.queries}  k={args.k}\n")
+
+    tmp_root = tempfile.mkdtemp(prefix="bench_vs_")
+    try:
+        for dtype in ("float16", "int8"):
+            store = NumpyStore(path=f"{tmp_root}/numpy_{dtype}", dtype=dtype, create=True)
+            seconds = build(store, ids, vectors, sources)
+            print(f"[+] numpy/{dtype} built in {seconds:.1f}s")
+            bench(f"numpy/{dtype}", store, queries, truth, ids, args.k)
+
+        if not args.skip_chroma:
+            store = ChromaStore(path=f"{tmp_root}/chroma", name="bench", create=True)
+            seconds = build(store, ids, vectors, sources)
+            print(f"[+] chroma built in {seconds:.1f}s")
+            bench("chroma", store, queries, truth, ids, args.k)
+    finally:
+        shutil.rmtree(tmp_root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+# phase3_agent_assist/embedding_backends.py
+#
+# Selectable CPU inference backend for the sentence embedding model.
+#
+#   EMBED_BACKEND=torch       SentenceTransformer in PyTorch (default, the fp32 baseline)
+#   EMBED_BACKEND=onnx        the same network exported to ONNX, run by ONNX Runtime
+#   EMBED_BACKEND=onnx-int8   the ONNX graph with dynamically quantized int8 weights
+#
+# The ONNX artifacts are built once from the SentenceTransformer checkpoint into
+# ONNX_CACHE_PATH/<model>/:
+#   - model.onnx
+#   - model.int8.onnx
+#   - the tokenizer
+#   - config.json with the pooling settings
+# Later runs load them with only onnxruntime + the tokenizer, without torch. Every
+# backend returns float32 arrays shaped like SentenceTransformer.encode. Embeddings
+# from different backends are close but not identical, so the embedding cache and
+# the ingest manifest key them by model_id(); switching backends re-embeds documents.
+
+import os
+import json
+import threading
+
+import numpy as np
+
+EMBED_BACKEND = os.getenv("EMBED_BACKEND", "torch")
+ONNX_CACHE_PATH = os.getenv("ONNX_CACHE_PATH", "./onnx_models")
+EMBED_THREADS = int(os.getenv("EMBED_THREADS", "0"))  # 0 = let ONNX Runtime decide
+BACKENDS = ("torch", "onnx", "onnx-int8")
+
+_export_lock = threading.Lock()
+
+
+def model_id(model_name, backend=None):
+    """Cache/manifest key: the bare model name for torch, name@backend otherwise."""
+    backend = backend or EMBED_BACKEND
+    return model_name if backend == "torch" else f"{model_name}@{backend}"
+
+
+def artifact_dir(model_name, cache_path=None):
+    return os.path.join(cache_path or ONNX_CACHE_PATH, model_name.replace("/", "__"))
+
+
+def export_onnx(model_name, cache_path=None, quantize=True):
+    """Export (and quantize) `model_name` into its artifact dir unless already there; return the dir."""
+    out_dir = artifact_dir(model_name, cache_path)
+    fp32_path = os.path.join(out_dir, "model.onnx")
+    int8_path = os.path.join(out_dir, "model.int8.onnx")
+    with _export_lock:
+        if not os.path.exists(os.path.join(out_dir, "config.json")):
+            import torch
+            from sentence_transformers import SentenceTransformer
+
+            st_model = SentenceTransformer(model_name, device="cpu")
+            transformer = st_model[0].auto_model.eval()
+            tokenizer = st_model.tokenizer
+            pooling = st_model[1]
+            dummy = tokenizer(["export the embedding model"], return_tensors="pt")
+            input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in dummy]
+            os.makedirs(out_dir, exist_ok=True)
+            with torch.no_grad():
+                torch.onnx.export(
+                    transformer,
+                    tuple(dummy[name] for name in input_names),
+                    fp32_path,
+                    input_names=input_names,
+                    output_names=["last_hidden_state"],
+                    dynamic_axes={name: {0: "batch", 1: "seq"} for name in input_names + ["last_hidden_state"]},
+                    opset_version=14,
+                )
+            tokenizer.save_pretrained(out_dir)
+            config = {
+                "model_name": model_name,
+                "inputs": input_names,
+                "max_seq_length": st_model.max_seq_length,
+                "pooling": "cls" if getattr(pooling, "pooling_mode_cls_token", False) else "mean",
+                "normalize": any(type(m).__name__ == "Normalize" for m in st_model),
+            }
+            tmp_path = os.path.join(out_dir, "config.json.tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(config, f, indent=2)
+            os.replace(tmp_path, os.path.join(out_dir, "config.json"))
+        if quantize and not os.path.exists(int8_path):
+            from onnxruntime.quantization import quantize_dynamic, QuantType
+            quantize_dynamic(fp32_path, int8_path + ".tmp", weight_type=QuantType.QInt8)
+            os.replace(int8_path + ".tmp", int8_path)
+    return out_dir
+
+
+class OnnxEmbedder:
+    """SentenceTransformer-compatible encode() on an ONNX Runtime session."""
+
+    def __init__(self, model_name, quantized=False, cache_path=None, threads=None):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        out_dir = export_onnx(model_name, cache_path, quantize=quantized)
+        with open(os.path.join(out_dir, "config.json"), "r", encoding="utf-8") as f:
+            self.config = json.load(f)
+        self.tokenizer = AutoTokenizer.from_pretrained(out_dir)
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        threads = EMBED_THREADS if threads is None else threads
+        if threads:
+            options.intra_op_num_threads = threads
+        model_file = "model.int8.onnx" if quantized else "model.onnx"
+        self.session = ort.InferenceSession(os.path.join(out_dir, model_file), options,
+                                            providers=["CPUExecutionProvider"])
+        self.inputs = self.config["inputs"]
+        self.max_seq_length = self.config["max_seq_length"]
+
+    def _embed_batch(self, texts):
+        encoded = self.tokenizer(texts, padding=True, truncation=True,
+                                 max_length=self.max_seq_length, return_tensors="np")
+        feed = {name: encoded[name].astype(np.int64) for name in self.inputs}
+        hidden = self.session.run(None, feed)[0]
+        if self.config["pooling"] == "cls":
+            pooled = hidden[:, 0]
+        else:
+            mask = feed["attention_mask"][..., None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        if self.config["normalize"]:
+            pooled = pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+        return pooled.astype(np.float32)
+
+    def encode(self, sentences, batch_size=32, **kwargs):
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        # Batch texts of similar length together so padding stays small
+        order = np.argsort([-len(t) for t in texts], kind="stable")
+        out = [None] * len(texts)
+        for start in range(0, len(texts), batch_size):
+            idx = order[start:start + batch_size]
+            for i, vec in zip(idx, self._embed_batch([texts[i] for i in idx])):
+                out[i] = vec
+        result = np.stack(out)
+        return result[0] if single else result
+
+
+def load_embedder(model_name, backend=None):
+    """Return an object with SentenceTransformer's encode() for the chosen backend."""
+    backend = backend or EMBED_BACKEND
+    if backend == "torch":
+        from sentence_transformers import SentenceTransformer
+        return SentenceTransformer(model_name)
+    if backend == "onnx":
+        return OnnxEmbedder(model_name)
+    if backend == "onnx-int8":
+        return OnnxEmbedder(model_name, quantized=True)
+    raise ValueError(f"Unknown embedding backend: {backend} (expected one of {', '.join(BACKENDS)})")
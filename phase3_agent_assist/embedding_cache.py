@@ -0,0 +1,289 @@
+# phase3_agent_assist/embedding_cache.py
+#
+# On-disk embedding store shared by ingestion and retrieval.
+#
+# Vectors live in a memory-mapped float32 matrix (one row per cached text) and a
+# small JSON index maps hash(normalized text) -> row. Each embedding model gets
+# its own set of files, so switching models never returns stale vectors.
+# When the cache is full the least recently used row is overwritten.
+#
+# Several processes (Streamlit, the rag_chain CLI, retrieval_service, ingest)
+# share these files. A parallel <model>.keys file stores the hash owning each
+# row. It is authoritative: reads check it, so an index entry pointing at a row
+# another process has since reused is a miss instead of a wrong vector. Rows
+# are assigned and the index is rewritten only under <model>.lock, after
+# merging the index other processes wrote.
+
+import os
+import re
+import sys
+import json
+import atexit
+import hashlib
+import threading
+from contextlib import contextmanager
+from collections import OrderedDict
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+import numpy as np
+
+from embedding_backends import EMBED_BACKEND, load_embedder, model_id
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "phase1_llm_core"))
+import tracing
+
+EMBED_CACHE_PATH = os.getenv("EMBED_CACHE_PATH", "./embedding_cache")
+DEFAULT_CAPACITY = int(os.getenv("EMBED_CACHE_CAPACITY", "50000"))
+
+
+def normalize_text(text):
+    return " ".join(text.split())
+
+
+def text_key(text):
+    return hashlib.blake2b(normalize_text(text).encode("utf-8"), digest_size=16).hexdigest()
+
+
+KEY_BYTES = 16
+
+
+@contextmanager
+def file_lock(path):
+    """Exclusive advisory lock on `path`, held across processes."""
+    with open(path, "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class EmbeddingCache:
+    def __init__(self, model_name, path=EMBED_CACHE_PATH, capacity=DEFAULT_CAPACITY, flush_every=64):
+        safe_name = re.sub(r"[^A-Za-z0-9_.-]", "_", model_name)
+        self.model_name = model_name
+        self.capacity = capacity
+        self.flush_every = flush_every
+        self.vectors_path = os.path.join(path, f"{safe_name}.f32")
+        self.keys_path = os.path.join(path, f"{safe_name}.keys")
+        self.index_path = os.path.join(path, f"{safe_name}.index.json")
+        self.lock_path = os.path.join(path, f"{safe_name}.lock")
+        self.lock = threading.Lock()
+        self.slots = OrderedDict()  # key -> row, least recently used first
+        self.dim = None
+        self.vectors = None
+        self.keys = None  # (capacity, 16) uint8: hash of the text stored in each row
+        self.index_mtime = None
+        self.next_victim = 0
+        self.dirty = 0
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(path, exist_ok=True)
+        self._load()
+        atexit.register(self.flush)
+
+    # ── persistence ──
+    def _read_index(self):
+        """The on-disk index if it matches this cache's layout, else None."""
+        try:
+            mtime = os.stat(self.index_path).st_mtime_ns
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                index = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            print(f"[!] Ignoring unreadable embedding cache index: {self.index_path} | Error: {e}")
+            return None
+        if index.get("model") != self.model_name or index.get("capacity") != self.capacity:
+            return None  # incompatible layout; start over
+        index["mtime"] = mtime
+        return index
+
+    def _load(self):
+        if not (os.path.exists(self.vectors_path) and os.path.exists(self.keys_path)):
+            return
+        index = self._read_index()
+        if index is None:
+            return
+        self.dim = index["dim"]
+        self.vectors = np.memmap(self.vectors_path, dtype=np.float32, mode="r+", shape=(self.capacity, self.dim))
+        self.keys = np.memmap(self.keys_path, dtype=np.uint8, mode="r+", shape=(self.capacity, KEY_BYTES))
+        self.slots = OrderedDict((key, row) for key, row in index["entries"])
+        self.index_mtime = index["mtime"]
+
+    def _allocate(self, dim):
+        # Called with the file lock held, so no other process is creating the files at the same time
+        self._load()
+        if self.vectors is not None and self.dim == dim:
+            return
+        self.dim = dim
+        self.vectors = np.memmap(self.vectors_path, dtype=np.float32, mode="w+", shape=(self.capacity, dim))
+        self.keys = np.memmap(self.keys_path, dtype=np.uint8, mode="w+", shape=(self.capacity, KEY_BYTES))
+        self.slots.clear()
+        self.dirty += 1
+        self._write_index()
+
+    def _merge_index(self):
+        """Pick up entries other processes have written since we last read the index."""
+        index = self._read_index()
+        if index is None or index["mtime"] == self.index_mtime or index["dim"] != self.dim:
+            return
+        merged = OrderedDict((key, row) for key, row in index["entries"] if key not in self.slots)
+        merged.update(self.slots)  # our own recency order wins
+        self.slots = merged
+        self.index_mtime = index["mtime"]
+
+    def _owns(self, key, row):
+        return self.keys[row].tobytes() == bytes.fromhex(key)
+
+    def _write_index(self):
+        """Merge, drop entries whose row now holds another text, and rewrite the index (file lock held)."""
+        self._merge_index()
+        self.vectors.flush()
+        self.keys.flush()
+        self.slots = OrderedDict((key, row) for key, row in self.slots.items() if self._owns(key, row))
+        index = {
+            "model": self.model_name,
+            "dim": self.dim,
+            "capacity": self.capacity,
+            "entries": list(self.slots.items()),
+        }
+        tmp_path = f"{self.index_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(index, f)
+        os.replace(tmp_path, self.index_path)
+        self.index_mtime = os.stat(self.index_path).st_mtime_ns
+        self.dirty = 0
+
+    def flush(self):
+        with self.lock:
+            if not self.dirty or self.vectors is None:
+                return
+            with file_lock(self.lock_path):
+                self._write_index()
+
+    # ── lookups ──
+    def get_many(self, texts):
+        """Return a list with a cached vector (np.ndarray) or None per text."""
+        keys = [text_key(t) for t in texts]
+        out = []
+        with self.lock:
+            for key in keys:
+                row = self.slots.get(key)
+                vector = None
+                if row is not None:
+                    # Key checked before and after the copy, so a row rewritten meanwhile is not returned
+                    expected = bytes.fromhex(key)
+                    if self.keys[row].tobytes() == expected:
+                        vector = np.array(self.vectors[row])
+                        if self.keys[row].tobytes() != expected:
+                            vector = None
+                    if vector is None:
+                        del self.slots[key]
+                if vector is None:
+                    self.misses += 1
+                else:
+                    self.hits += 1
+                    self.slots.move_to_end(key)
+                out.append(vector)
+        return out
+
+    def _free_row(self, free):
+        """A row for a new entry: never-used rows first, then the least recently used."""
+        if free:
+            return int(free.pop())
+        while self.slots:
+            _, row = self.slots.popitem(last=False)
+            return row
+        # Every row belongs to entries we have not seen yet; overwrite round-robin
+        self.next_victim = (self.next_victim + 1) % self.capacity
+        return self.next_victim
+
+    def put_many(self, texts, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        with self.lock, file_lock(self.lock_path):
+            if self.vectors is None or self.dim != vectors.shape[1]:
+                self._allocate(vectors.shape[1])
+            self._merge_index()
+            # Rows with no owner in the keys file; popped from the end, so lowest rows fill first
+            free = list(np.flatnonzero(~self.keys.any(axis=1))[::-1])
+            for text, vector in zip(texts, vectors):
+                key = text_key(text)
+                row = self.slots.get(key)
+                if row is None or not self._owns(key, row):
+                    row = self._free_row(free)
+                    self.slots[key] = row
+                else:
+                    self.slots.move_to_end(key)
+                # Clear the owner first so readers never pair the new vector with the old key
+                self.keys[row] = 0
+                self.vectors[row] = vector
+                self.keys[row] = np.frombuffer(bytes.fromhex(key), dtype=np.uint8)
+                self.dirty += 1
+            if self.dirty >= self.flush_every:
+                self._write_index()
+
+    def stats(self):
+        return {"entries": len(self.slots), "capacity": self.capacity, "hits": self.hits, "misses": self.misses}
+
+
+class CachedEmbedder:
+    """
+    Drop-in for SentenceTransformer.encode that consults the EmbeddingCache
+    first. The model (torch or ONNX, see embedding_backends) is only loaded when
+    a text misses the cache. Only keyword arguments that cannot change the
+    vectors are accepted, since they are not part of the cache key.
+    """
+
+    PASSTHROUGH_KWARGS = ("batch_size", "show_progress_bar")
+
+    def __init__(self, model_name="all-MiniLM-L6-v2", cache=None, backend=None):
+        self.model_name = model_name
+        self.backend = backend or EMBED_BACKEND
+        # Backends disagree in the last decimals, so each gets its own cache file
+        self.cache = cache or EmbeddingCache(model_id(model_name, self.backend))
+        self.model = None
+        self.lock = threading.Lock()
+
+    def _get_model(self):
+        with self.lock:
+            if self.model is None:
+                self.model = load_embedder(self.model_name, self.backend)
+            return self.model
+
+    def encode(self, texts, **kwargs):
+        unsupported = sorted(set(kwargs) - set(self.PASSTHROUGH_KWARGS))
+        if unsupported:
+            raise TypeError(f"CachedEmbedder.encode() does not support {', '.join(unsupported)}: "
+                            f"cached vectors would not reflect them")
+        if isinstance(texts, str):
+            return self.encode([texts], **kwargs)[0]
+        with tracing.span("embed", counters=("texts", "cache_hits", "cache_misses"), texts=len(texts)) as span:
+            cached = self.cache.get_many(texts)
+            missing = [i for i, vec in enumerate(cached) if vec is None]
+            span.set(cache_hits=len(texts) - len(missing), cache_misses=len(missing))
+            if missing:
+                miss_texts = [texts[i] for i in missing]
+                fresh = np.asarray(self._get_model().encode(miss_texts, **kwargs), dtype=np.float32)
+                self.cache.put_many(miss_texts, fresh)
+                for i, vec in zip(missing, fresh):
+                    cached[i] = vec
+        if not cached:
+            return np.zeros((0, self.cache.dim or 0), dtype=np.float32)
+        return np.stack(cached)
+
+    def flush(self):
+        self.cache.flush()
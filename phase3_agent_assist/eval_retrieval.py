@@ -0,0 +1,212 @@
+# phase3_agent_assist/eval_retrieval.py
+#
+# Offline retrieval evaluation over a JSONL file of labelled questions.
+#
+#   python eval_retrieval.py eval.jsonl
+#   python eval_retrieval.py eval.jsonl --ks 1,3,5,10 --batch-size 512 --out report.json
+#   python eval_retrieval.py eval.jsonl --compare-single 200    # also time one-query-at-a-time
+#   python eval_retrieval.py eval.jsonl --service http://127.0.0.1:8765
+#
+# Each line holds a query and what should be retrieved for it:
+#   {"query": "How do I reset a password?", "source": "password_policy.pdf"}
+#   {"query": "...", "chunk_id": "refunds.docx_12"}
+#   {"query": "...", "sources": [...], "chunk_ids": [...]}
+# A retrieved chunk is relevant when its id is an expected chunk or its source
+# is an expected source.
+#
+# Reported:
+#   recall@k    with expected chunk ids: share of them found in the top k;
+#               with sources only: 1 if any chunk of an expected source is found
+#   mrr         mean reciprocal rank of the first relevant chunk within max k
+#   qps         queries per second over the whole run (encode + search)
+#   latency     per batch and amortized per query (p50/p95/p99)
+# Queries are encoded and searched in batches (batch_retrieval.py).
+
+import os
+import json
+import time
+import argparse
+
+import numpy as np
+
+from batch_retrieval import iter_search_batches
+
+EMBED_MODEL_NAME = "all-MiniLM-L6-v2"
+
+
+def load_eval_set(path, limit=None):
+    cases = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            row = json.loads(line)
+            if not row.get("query"):
+                raise ValueError(f"{path}:{line_no}: missing 'query'")
+            sources = set(row.get("sources") or []) | ({row["source"]} if row.get("source") else set())
+            chunks = set(row.get("chunk_ids") or []) | ({row["chunk_id"]} if row.get("chunk_id") else set())
+            if not sources and not chunks:
+                raise ValueError(f"{path}:{line_no}: needs 'source(s)' or 'chunk_id(s)'")
+            cases.append({"query": row["query"], "sources": sources, "chunks": chunks})
+            if limit and len(cases) >= limit:
+                break
+    return cases
+
+
+def source_of(chunk_id, metadata=None):
+    # Chunk ids are "<file name>_<n>" (ingest.chunk_ids), so the source survives without metadata
+    if metadata and metadata.get("source"):
+        return metadata["source"]
+    return chunk_id.rsplit("_", 1)[0]
+
+
+def score_case(case, ids, metadatas, ks):
+    """(recall at each k, reciprocal rank) for one query's ranked results."""
+    relevant = [chunk_id in case["chunks"] or source_of(chunk_id, meta) in case["sources"]
+                for chunk_id, meta in zip(ids, metadatas or [None] * len(ids))]
+    first = next((rank for rank, hit in enumerate(relevant, 1) if hit), None)
+    recalls = {}
+    for k in ks:
+        if case["chunks"] and not case["sources"]:
+            recalls[k] = len(case["chunks"] & set(ids[:k])) / len(case["chunks"])
+        else:
+            recalls[k] = 1.0 if first is not None and first <= k else 0.0
+    return recalls, (1.0 / first if first else 0.0)
+
+
+def percentiles_ms(samples):
+    if not samples:
+        return None
+    ms = np.asarray(samples) * 1000
+    return {"p50_ms": round(float(np.percentile(ms, 50)), 3), "p95_ms": round(float(np.percentile(ms, 95)), 3),
+            "p99_ms": round(float(np.percentile(ms, 99)), 3), "mean_ms": round(float(ms.mean()), 3)}
+
+
+class ServiceSearch:
+    """Adapts RetrievalClient to the iter_search_batches() batch shape."""
+
+    def __init__(self, url):
+        from retrieval_client import RetrievalClient
+        self.client = RetrievalClient(url)
+
+    def iter_batches(self, queries, top_k, batch_size):
+        for start in range(0, len(queries), batch_size):
+            t0 = time.perf_counter()
+            result = self.client.search(queries[start:start + batch_size], top_k)
+            yield {"start": start, "results": {"ids": result["ids"], "metadatas": None},
+                   "embed_s": 0.0, "query_s": time.perf_counter() - t0}
+
+
+def evaluate(cases, batches, ks):
+    """Consume search batches for `cases`; return the metrics and per-query records."""
+    max_k = max(ks)
+    recall_sums, rr_sum, records = {k: 0.0 for k in ks}, 0.0, []
+    batch_s, per_query_s, embed_s, query_s = [], [], 0.0, 0.0
+    t0 = time.perf_counter()
+    for batch in batches:
+        results = batch["results"]
+        n = len(results["ids"])
+        seconds = batch["embed_s"] + batch["query_s"]
+        batch_s.append(seconds)
+        per_query_s.extend([seconds / n] * n)
+        embed_s += batch["embed_s"]
+        query_s += batch["query_s"]
+        metadatas = results.get("metadatas") or [None] * n
+        for offset in range(n):
+            case = cases[batch["start"] + offset]
+            ids = results["ids"][offset][:max_k]
+            recalls, rr = score_case(case, ids, metadatas[offset], ks)
+            for k in ks:
+                recall_sums[k] += recalls[k]
+            rr_sum += rr
+            records.append({"query": case["query"], "ids": ids, "rr": rr, **{f"recall@{k}": recalls[k] for k in ks}})
+    wall_s = time.perf_counter() - t0
+    n = len(records) or 1
+    metrics = {
+        "queries": len(records),
+        **{f"recall@{k}": round(recall_sums[k] / n, 4) for k in ks},
+        "mrr": round(rr_sum / n, 4),
+        "wall_s": round(wall_s, 3),
+        "qps": round(len(records) / wall_s, 1) if wall_s else None,
+        "embed_s": round(embed_s, 3),
+        "query_s": round(query_s, 3),
+        "batch_latency": percentiles_ms(batch_s),
+        "query_latency_amortized": percentiles_ms(per_query_s),
+    }
+    return metrics, records
+
+
+def print_report(metrics, ks, label="batched"):
+    recalls = "  ".join(f"recall@{k}={metrics[f'recall@{k}']:.3f}" for k in ks)
+    print(f"\n[{label}] {metrics['queries']} queries  {recalls}  mrr={metrics['mrr']:.3f}")
+    print(f"  qps={metrics['qps']}  wall={metrics['wall_s']}s  (encode {metrics['embed_s']}s, search {metrics['query_s']}s)")
+    for name in ("batch_latency", "query_latency_amortized"):
+        p = metrics[name]
+        if p:
+            print(f"  {name:<24} p50={p['p50_ms']:.2f}ms  p95={p['p95_ms']:.2f}ms  p99={p['p99_ms']:.2f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate retrieval quality and speed on labelled queries")
+    parser.add_argument("eval_file", help="JSONL with query + source/chunk_id labels")
+    parser.add_argument("--ks", default="1,3,5,10", help="Comma-separated cut-offs for recall@k")
+    parser.add_argument("--batch-size", type=int, default=256, help="Queries per encode + store query")
+    parser.add_argument("--limit", type=int, help="Only evaluate the first N queries")
+    parser.add_argument("--backend", choices=["chroma", "numpy"], default=None,
+                        help="Vector store backend (default: VECTOR_STORE env var)")
+    parser.add_argument("--service", help="Evaluate a running retrieval_service.py at this URL instead")
+    parser.add_argument("--cache", action="store_true",
+                        help="Use the on-disk embedding cache (faster reruns, but timings then hide encode cost)")
+    parser.add_argument("--compare-single", type=int, default=0, metavar="N",
+                        help="Also run the first N queries one at a time, to compare throughput")
+    parser.add_argument("--out", help="Write metrics (and per-query records) to this JSON file")
+    args = parser.parse_args()
+
+    ks = sorted({int(k) for k in args.ks.split(",") if k.strip()})
+    cases = load_eval_set(args.eval_file, args.limit)
+    queries = [case["query"] for case in cases]
+    print(f"[i] {len(cases)} labelled queries from {args.eval_file}  ks={ks}  batch={args.batch_size}")
+
+    if args.service:
+        search = ServiceSearch(args.service)
+
+        def run(qs, batch_size):
+            return search.iter_batches(qs, max(ks), batch_size)
+    else:
+        from vector_store import open_store
+        store = open_store(args.backend)
+        if args.cache:
+            from embedding_cache import CachedEmbedder
+            embedder = CachedEmbedder(EMBED_MODEL_NAME)
+        else:
+            from embedding_backends import load_embedder
+            embedder = load_embedder(EMBED_MODEL_NAME)
+        embedder.encode(["warm up"])
+
+        def run(qs, batch_size):
+            return iter_search_batches(store, embedder, qs, max(ks), batch_size, include=("metadatas",))
+
+    metrics, records = evaluate(cases, run(queries, args.batch_size), ks)
+    print_report(metrics, ks)
+    report = {"eval_file": os.path.abspath(args.eval_file), "batch_size": args.batch_size, "ks": ks,
+              "metrics": metrics}
+
+    if args.compare_single:
+        subset = cases[:args.compare_single]
+        single, _ = evaluate(subset, run([case["query"] for case in subset], 1), ks)
+        print_report(single, ks, label=f"single x{len(subset)}")
+        if single["qps"] and metrics["qps"]:
+            print(f"\n[i] Batching is {metrics['qps'] / single['qps']:.1f}x the single-query throughput")
+        report["single"] = single
+
+    if args.out:
+        report["records"] = records
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n[✓] Report written to {args.out}")
+    if args.cache and not args.service:
+        embedder.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,41 +1,233 @@
 # phase3_agent_assist/explore_chroma.py
+#
+# Inspect, snapshot and restore the vector store without loading it whole.
+#
+#   python explore_chroma.py                                   # page through chunks, then search
+#   python explore_chroma.py list --limit 20 --offset 40 --source policy.pdf
+#   python explore_chroma.py stats --json stats.json           # per-source counts, lengths, norms
+#   python explore_chroma.py export snapshots/2024-06 --format npz --shard-size 5000
+#   python explore_chroma.py import snapshots/2024-06 --backend numpy
+#
+# Every command reads the store with limit/offset pages (VectorStore.iter_batches),
+# so memory stays bounded by one page however large the collection is. --backend
+# picks chroma or numpy (default: VECTOR_STORE).
+#
+# A snapshot directory holds:
+#   shard_00000.npz | .parquet   ids, documents, metadata (JSON) and float32 embeddings
+#   ingest_manifest.json         manifest entries of the exported files
+#   snapshot.json                written last; lists the shards
+# Importing upserts the stored vectors and merges the manifest, so the target
+# store is ready without re-embedding and the next ingest skips unchanged files.
 
-from chromadb import PersistentClient
-from sentence_transformers import SentenceTransformer
+import os
+import sys
+import json
+import time
+import argparse
 
-# Setup: same DB path used in ingestion
-CHROMA_PATH = "./chroma_store"
-COLLECTION_NAME = "agent_assist_docs"
+import numpy as np
 
-# 1. Connect to ChromaDB
-client = PersistentClient(path=CHROMA_PATH)
+from vector_store import open_store, manifest_path, VECTOR_STORE
 
-# 2. Get collection
-collection = client.get_collection(COLLECTION_NAME)
+FORMATS = ("npz", "parquet")
 
-# 3. Inspect stored documents
-def show_documents():
+
+def source_where(source):
+    return {"source": source} if source else None
+
+
+# 1. Inspect stored documents, one page at a time
+def print_page(page, offset, width=120):
+    for i, chunk_id in enumerate(page["ids"]):
+        print(f"#{offset + i + 1}  🆔 ID: {chunk_id}")
+        print(f"📄 Text: {(page['documents'][i] or '')[:width]}...")
+        print(f"📎 Metadata: {page['metadatas'][i]}")
+        print("-" * 60)
+
+
+def show_documents(store, limit=20, offset=0, source=None, all_pages=False, interactive=False):
     print("\n📄 Stored Documents:")
     print("----------------------")
-    docs = collection.get()
-    for i in range(len(docs["ids"])):
-        print(f"🆔 ID: {docs['ids'][i]}")
-        print(f"📄 Text: {docs['documents'][i][:120]}...")
-        print(f"📎 Metadata: {docs['metadatas'][i]}")
-        print("-" * 60)
+    total = store.count() if not source else None
+    while True:
+        page = store.get(limit=limit, offset=offset, where=source_where(source))
+        if not page["ids"]:
+            print("(no more chunks)")
+            return
+        print_page(page, offset)
+        offset += len(page["ids"])
+        print(f"[i] Shown up to #{offset}" + (f" of {total}" if total is not None else f" for source={source}"))
+        if len(page["ids"]) < limit:
+            return
+        if all_pages:
+            continue
+        if not interactive or input("↵ next page, q to stop: ").strip().lower() == "q":
+            return
+
+
+# 2. Per-source statistics in one streaming pass
+def new_stats():
+    return {"chunks": 0, "chars": 0, "min_chars": None, "max_chars": 0,
+            "norm_sum": 0.0, "min_norm": None, "max_norm": 0.0}
+
+
+def add_stats(stats, chars, norm):
+    stats["chunks"] += 1
+    stats["chars"] += chars
+    stats["min_chars"] = chars if stats["min_chars"] is None else min(stats["min_chars"], chars)
+    stats["max_chars"] = max(stats["max_chars"], chars)
+    stats["norm_sum"] += norm
+    stats["min_norm"] = norm if stats["min_norm"] is None else min(stats["min_norm"], norm)
+    stats["max_norm"] = max(stats["max_norm"], norm)
+
+
+def finish_stats(stats):
+    chunks = stats["chunks"] or 1
+    return {
+        "chunks": stats["chunks"],
+        "chars": stats["chars"],
+        "mean_chars": round(stats["chars"] / chunks, 1),
+        "min_chars": stats["min_chars"],
+        "max_chars": stats["max_chars"],
+        "mean_norm": round(stats["norm_sum"] / chunks, 4),
+        "min_norm": round(stats["min_norm"], 4) if stats["min_norm"] is not None else None,
+        "max_norm": round(stats["max_norm"], 4),
+    }
+
+
+def collection_stats(store, source=None, batch_size=1000):
+    """{"total": {...}, "sources": {source: {...}}}, reading `batch_size` chunks at a time."""
+    total, per_source = new_stats(), {}
+    for page in store.iter_batches(batch_size, where=source_where(source),
+                                   include=("documents", "metadatas", "embeddings")):
+        norms = np.linalg.norm(np.asarray(page["embeddings"], dtype=np.float32), axis=1)
+        for document, metadata, norm in zip(page["documents"], page["metadatas"], norms.tolist()):
+            name = (metadata or {}).get("source", "<none>")
+            chars = len(document or "")
+            add_stats(per_source.setdefault(name, new_stats()), chars, norm)
+            add_stats(total, chars, norm)
+    return {"total": finish_stats(total),
+            "sources": {name: finish_stats(s) for name, s in sorted(per_source.items())}}
+
+
+def print_stats(result):
+    print(f"\n{'source':<40}{'chunks':>8}{'mean chars':>12}{'min':>6}{'max':>6}{'mean norm':>11}{'min':>8}{'max':>8}")
+    rows = sorted(result["sources"].items(), key=lambda item: -item[1]["chunks"]) + [("TOTAL", result["total"])]
+    for name, s in rows:
+        print(f"{name[:39]:<40}{s['chunks']:>8}{s['mean_chars']:>12}{s['min_chars'] or 0:>6}{s['max_chars']:>6}"
+              f"{s['mean_norm']:>11}{s['min_norm'] or 0:>8}{s['max_norm']:>8}")
+
+
+# 3. Bulk export / import
+def write_shard(path, page, fmt):
+    ids = list(page["ids"])
+    documents = [d or "" for d in page["documents"]]
+    metadatas = [json.dumps(m or {}) for m in page["metadatas"]]
+    embeddings = np.asarray(page["embeddings"], dtype=np.float32)
+    tmp_path = path + ".tmp"
+    if fmt == "npz":
+        with open(tmp_path, "wb") as f:
+            np.savez_compressed(f, ids=np.array(ids), documents=np.array(documents),
+                                metadatas=np.array(metadatas), embeddings=embeddings)
+    else:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        table = pa.table({
+            "id": ids,
+            "document": documents,
+            "metadata": metadatas,
+            "embedding": pa.FixedSizeListArray.from_arrays(pa.array(embeddings.reshape(-1)), embeddings.shape[1]),
+        })
+        pq.write_table(table, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def read_shard(path):
+    """(ids, documents, metadatas, embeddings) from one shard file."""
+    if path.endswith(".npz"):
+        with np.load(path, allow_pickle=False) as data:
+            return (data["ids"].tolist(), data["documents"].tolist(),
+                    [json.loads(m) for m in data["metadatas"].tolist()], data["embeddings"])
+    import pyarrow.parquet as pq
+    table = pq.read_table(path)
+    column = table.column("embedding").combine_chunks()
+    embeddings = np.asarray(column.flatten(), dtype=np.float32).reshape(len(table), column.type.list_size)
+    return (table.column("id").to_pylist(), table.column("document").to_pylist(),
+            [json.loads(m) for m in table.column("metadata").to_pylist()], embeddings)
+
+
+def export_store(store, out_dir, fmt="npz", shard_size=5000, source=None, backend=None):
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format: {fmt} (expected one of {', '.join(FORMATS)})")
+    os.makedirs(out_dir, exist_ok=True)
+    t0 = time.perf_counter()
+    shards, sources, count, dim = [], set(), 0, None
+    for page in store.iter_batches(shard_size, where=source_where(source),
+                                   include=("documents", "metadatas", "embeddings")):
+        name = f"shard_{len(shards):05d}.{fmt}"
+        write_shard(os.path.join(out_dir, name), page, fmt)
+        shards.append({"file": name, "count": len(page["ids"])})
+        sources.update((m or {}).get("source") for m in page["metadatas"])
+        count += len(page["ids"])
+        dim = dim or np.asarray(page["embeddings"]).shape[1]
+        print(f"[+] {name}: {len(page['ids'])} chunks ({count} total)")
+
+    # Carry over the ingest manifest for the exported files, so a restored store is not re-ingested
+    manifest_file = manifest_path(backend or VECTOR_STORE)
+    if os.path.exists(manifest_file):
+        with open(manifest_file, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        with open(os.path.join(out_dir, "ingest_manifest.json"), "w", encoding="utf-8") as f:
+            json.dump({k: v for k, v in manifest.items() if k in sources}, f, indent=2)
+
+    snapshot = {"format": fmt, "count": count, "dim": dim, "source": source, "shards": shards,
+                "created": time.strftime("%Y-%m-%dT%H:%M:%S")}
+    with open(os.path.join(out_dir, "snapshot.json"), "w", encoding="utf-8") as f:
+        json.dump(snapshot, f, indent=2)
+    print(f"[✓] Exported {count} chunks in {len(shards)} shards to {out_dir} ({time.perf_counter() - t0:.1f}s)")
+    return snapshot
+
+
+def import_store(store, in_dir, backend=None):
+    snapshot_file = os.path.join(in_dir, "snapshot.json")
+    if not os.path.exists(snapshot_file):
+        raise FileNotFoundError(f"No snapshot.json in {in_dir}; was the export interrupted?")
+    with open(snapshot_file, "r", encoding="utf-8") as f:
+        snapshot = json.load(f)
+    t0, count = time.perf_counter(), 0
+    for shard in snapshot["shards"]:
+        ids, documents, metadatas, embeddings = read_shard(os.path.join(in_dir, shard["file"]))
+        store.upsert(ids, embeddings, documents, metadatas)
+        count += len(ids)
+        print(f"[+] {shard['file']}: {len(ids)} chunks ({count}/{snapshot['count']})")
+    store.flush()
+
+    exported_manifest = os.path.join(in_dir, "ingest_manifest.json")
+    if os.path.exists(exported_manifest):
+        target = manifest_path(backend or VECTOR_STORE)
+        manifest = {}
+        if os.path.exists(target):
+            with open(target, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        with open(exported_manifest, "r", encoding="utf-8") as f:
+            manifest.update(json.load(f))
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+    print(f"[✓] Imported {count} chunks from {in_dir} ({time.perf_counter() - t0:.1f}s)")
+    return count
+
 
 # 4. Run a sample search query
-def run_query():
+def run_query(store):
     query = input("\n🔍 Enter a query to search: ")
     if not query.strip():
         print("⚠️ Empty query. Exiting.")
         return
 
-    results = collection.query(
-        query_texts=[query],
-        n_results=3,
-        include=["documents", "distances", "metadatas"]
-    )
+    from embedding_cache import CachedEmbedder
+    embedding = CachedEmbedder("all-MiniLM-L6-v2").encode([query])
+    results = store.query(embedding, n_results=3, include=["documents", "distances", "metadatas"])
 
     print("\n🔎 Top Matches:")
     print("----------------------")
@@ -46,12 +238,63 @@ def run_query():
         print(f"📐 Distance Score: {results['distances'][0][i]:.4f}")
         print("-" * 60)
 
-if __name__ == "__main__":
-    print("📂 ChromaDB Inspector")
-    print("=====================")
 
+def main():
+    parser = argparse.ArgumentParser(description="Vector store inspector")
+    parser.add_argument("--backend", choices=["chroma", "numpy"], default=VECTOR_STORE)
+    commands = parser.add_subparsers(dest="command")
+
+    browse = commands.add_parser("browse", help="Page through chunks interactively, then search (default)")
+    show = commands.add_parser("list", help="Print one page of chunks")
+    for sub in (browse, show):
+        sub.add_argument("--limit", type=int, default=20)
+        sub.add_argument("--offset", type=int, default=0)
+        sub.add_argument("--source", help="Only chunks whose metadata source equals this")
+    show.add_argument("--all", action="store_true", help="Keep printing pages until the end")
+
+    stats = commands.add_parser("stats", help="Per-source chunk counts, text lengths and embedding norms")
+    stats.add_argument("--source")
+    stats.add_argument("--batch-size", type=int, default=1000)
+    stats.add_argument("--json", help="Also write the statistics to this file")
+
+    export = commands.add_parser("export", help="Write the store to NPZ or Parquet shards")
+    export.add_argument("out_dir")
+    export.add_argument("--format", choices=FORMATS, default="npz")
+    export.add_argument("--shard-size", type=int, default=5000)
+    export.add_argument("--source")
+
+    load = commands.add_parser("import", help="Load shards written by export into the store")
+    load.add_argument("in_dir")
+
+    commands.add_parser("query", help="Run one search")
+    args = parser.parse_args()
+    command = args.command or "browse"
+
+    print("📂 Vector Store Inspector")
+    print("=========================")
     try:
-        show_documents()
-        run_query()
+        store = open_store(args.backend, create=command == "import")
+        if command == "browse":
+            show_documents(store, args.limit if args.command else 20, getattr(args, "offset", 0),
+                           getattr(args, "source", None), interactive=sys.stdin.isatty())
+            run_query(store)
+        elif command == "list":
+            show_documents(store, args.limit, args.offset, args.source, all_pages=args.all)
+        elif command == "stats":
+            result = collection_stats(store, args.source, args.batch_size)
+            print_stats(result)
+            if args.json:
+                with open(args.json, "w", encoding="utf-8") as f:
+                    json.dump(result, f, indent=2)
+        elif command == "export":
+            export_store(store, args.out_dir, args.format, args.shard_size, args.source, args.backend)
+        elif command == "import":
+            import_store(store, args.in_dir, args.backend)
+        else:
+            run_query(store)
     except Exception as e:
         print(f"❌ Error: {e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,85 +1,256 @@
 import os
-from sentence_transformers import SentenceTransformer
-import chromadb
-from chromadb.config import Settings
+import sys
+import json
+import hashlib
+import argparse
+from collections import deque
+from itertools import islice
 from PyPDF2 import PdfReader
 import docx
+import openpyxl
 import pandas as pd
+from embedding_cache import CachedEmbedder
+from embedding_backends import model_id
+from vector_store import open_store, STORE_PATH, MANIFEST_PATH
 
-# ─── Initialize ChromaDB ────────────────────────────────────────────────────────
-client = chromadb.PersistentClient(path="./chroma_store")
-collection = client.get_or_create_collection(name="agent_assist_docs")
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "phase1_llm_core"))
+import tracing
+
+# ─── Settings ───────────────────────────────────────────────────────────────────
+EMBED_MODEL_NAME = "all-MiniLM-L6-v2"
+EMBED_MODEL_ID = model_id(EMBED_MODEL_NAME)  # includes the backend, so switching it re-embeds
+EMBED_BATCH = 256  # chunks embedded and upserted at a time
+
+# ─── Initialize Vector Store ────────────────────────────────────────────────────
+# Backend chosen by VECTOR_STORE (chroma | numpy). Opened on first use so parser
+# worker processes never touch the store.
+_store = None
+
+def get_store():
+    global _store
+    if _store is None:
+        _store = open_store(create=True)
+    return _store
 
 # ─── Loaders for Each Format ─────────────────────────────────────────────────────
+# Every loader is a generator of (text, position) pieces — a page, a paragraph or
+# a block of rows — so a file is never held in memory as one string. `position`
+# is (unit, first, last), e.g. ("page", 3, 3) or ("row", 1000, 1499).
+# A failure that would cut a file short raises DocumentLoadError instead, so the
+# caller keeps the file's existing chunks and leaves it out of the manifest.
+ROW_BLOCK = 500      # CSV/Excel rows per piece
+LINE_BLOCK = 1000    # text lines per piece
+
+class DocumentLoadError(Exception):
+    """A file could not be read completely."""
+
 def load_pdf(path):
     try:
         reader = PdfReader(path)
-        return "\n".join(page.extract_text() or "" for page in reader.pages)
+        pages = reader.pages
     except Exception as e:
-        print(f"[!] Failed to load PDF: {path} | Error: {e}")
-        return ""
+        raise DocumentLoadError(f"Failed to load PDF: {path} | Error: {e}") from e
+    for page_no, page in enumerate(pages, start=1):
+        # One bad page should not lose the rest of the document
+        try:
+            text = page.extract_text() or ""
+        except Exception as e:
+            print(f"[!] Skipping unreadable page {page_no} of {path} | Error: {e}")
+            continue
+        yield text, ("page", page_no, page_no)
 
 def load_docx(path):
     try:
         doc = docx.Document(path)
-        return "\n".join(para.text for para in doc.paragraphs)
     except Exception as e:
-        print(f"[!] Failed to load DOCX: {path} | Error: {e}")
-        return ""
+        raise DocumentLoadError(f"Failed to load DOCX: {path} | Error: {e}") from e
+    for i, para in enumerate(doc.paragraphs):
+        yield para.text, ("paragraph", i, i)
 
 def load_txt_md(path):
     try:
         with open(path, "r", encoding="utf-8") as f:
-            return f.read()
+            lines, first = [], 1
+            for line_no, line in enumerate(f, start=1):
+                lines.append(line)
+                if len(lines) >= LINE_BLOCK:
+                    yield "".join(lines).removesuffix("\n"), ("line", first, line_no)
+                    lines, first = [], line_no + 1
+            if lines:
+                yield "".join(lines).removesuffix("\n"), ("line", first, first + len(lines) - 1)
     except Exception as e:
-        print(f"[!] Failed to load text file: {path} | Error: {e}")
-        return ""
+        raise DocumentLoadError(f"Failed to load text file: {path} | Error: {e}") from e
 
 def load_csv(path):
     try:
-        df = pd.read_csv(path)
-        return "\n".join(df.astype(str).agg(" ".join, axis=1).tolist())
+        for df in pd.read_csv(path, chunksize=ROW_BLOCK):
+            text = "\n".join(df.astype(str).agg(" ".join, axis=1).tolist())
+            yield text, ("row", int(df.index[0]), int(df.index[-1]))
     except Exception as e:
-        print(f"[!] Failed to load CSV: {path} | Error: {e}")
-        return ""
+        raise DocumentLoadError(f"Failed to load CSV: {path} | Error: {e}") from e
 
 def load_excel(path):
+    # Read-only openpyxl streams rows instead of building the whole sheet.
+    # Like pd.read_excel: first sheet only, first row is the header.
     try:
-        df = pd.read_excel(path, engine="openpyxl")
-        return "\n".join(df.astype(str).agg(" ".join, axis=1).tolist())
+        wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
+        try:
+            rows = wb.worksheets[0].iter_rows(values_only=True)
+            next(rows, None)
+            block, first = [], 0
+            for row_no, row in enumerate(rows):
+                block.append(" ".join("nan" if v is None else str(v) for v in row))
+                if len(block) >= ROW_BLOCK:
+                    yield "\n".join(block), ("row", first, row_no)
+                    block, first = [], row_no + 1
+            if block:
+                yield "\n".join(block), ("row", first, first + len(block) - 1)
+        finally:
+            wb.close()
     except Exception as e:
-        print(f"[!] Failed to load Excel: {path} | Error: {e}")
-        return ""
+        raise DocumentLoadError(f"Failed to load Excel: {path} | Error: {e}") from e
 
 # ─── Dispatcher ─────────────────────────────────────────────────────────────────
+LOADERS = {
+    "pdf": load_pdf,
+    "docx": load_docx,
+    "txt": load_txt_md,
+    "md": load_txt_md,
+    "csv": load_csv,
+    "xls": load_excel,
+    "xlsx": load_excel,
+}
+
+def file_type(path):
+    return os.path.splitext(path)[1].lower().replace('.', '')
+
+def is_supported(path):
+    return file_type(path) in LOADERS
+
 def load_document(path):
-    ext = os.path.splitext(path)[1].lower().replace('.', '')
-    if ext == "pdf":
-        return load_pdf(path)
-    if ext == "docx":
-        return load_docx(path)
-    if ext in ("txt", "md"):
-        return load_txt_md(path)
-    if ext == "csv":
-        return load_csv(path)
-    if ext in ("xls", "xlsx"):
-        return load_excel(path)
-    raise ValueError(f"Unsupported file type: {ext}")
+    ext = file_type(path)
+    if ext not in LOADERS:
+        raise ValueError(f"Unsupported file type: {ext}")
+    return LOADERS[ext](path)
 
 # ─── Text Splitter ───────────────────────────────────────────────────────────────
-def split_text(text, chunk_size=500, overlap=50):
-    chunks = []
-    start = 0
-    while start < len(text):
-        end = start + chunk_size
-        chunks.append(text[start:end])
-        start += chunk_size - overlap
-    return chunks
+def _span_metadata(spans, start, end):
+    """Merge the positions of the pieces overlapping [start, end) into metadata."""
+    meta = {}
+    for piece_start, piece_end, position in spans:
+        if position is None or piece_end <= start or piece_start >= end:
+            continue
+        unit, first, last = position
+        meta[f"{unit}_start"] = min(meta.get(f"{unit}_start", first), first)
+        meta[f"{unit}_end"] = max(meta.get(f"{unit}_end", last), last)
+    return meta
 
-# ─── Ingest Function ────────────────────────────────────────────────────────────
-def ingest_directory(directory):
-    model = SentenceTransformer("all-MiniLM-L6-v2")
-    for fname in os.listdir(directory):
+def split_text(pieces, chunk_size=500, overlap=50, sep="\n"):
+    """
+    Streaming chunker. Yields (chunk, metadata) for fixed-size, overlapping
+    windows over the pieces joined with `sep`, carrying the overlap across piece
+    boundaries. `pieces` is a string or an iterable of (text, position) pairs;
+    metadata holds the page/row/line range each chunk came from.
+    Whitespace-only chunks are dropped.
+    """
+    if isinstance(pieces, str):
+        pieces = [(pieces, None)]
+    step = chunk_size - overlap
+    buf, buf_start, offset = "", 0, 0
+    spans = deque()  # (start, end, position) of pieces still inside the buffer
+
+    def emit(i):
+        chunk = buf[i:i + chunk_size]
+        start = buf_start + i
+        return chunk, _span_metadata(spans, start, start + len(chunk))
+
+    for n, (text, position) in enumerate(pieces):
+        if n:
+            buf += sep
+            offset += len(sep)
+        spans.append((offset, offset + len(text), position))
+        buf += text
+        offset += len(text)
+
+        i = 0
+        while len(buf) - i >= chunk_size:
+            chunk, meta = emit(i)
+            if chunk.strip():
+                yield chunk, meta
+            i += step
+        buf, buf_start = buf[i:], buf_start + i
+        while spans and spans[0][1] <= buf_start and len(spans) > 1:
+            spans.popleft()
+
+    i = 0
+    while i < len(buf):
+        chunk, meta = emit(i)
+        if chunk.strip():
+            yield chunk, meta
+        i += step
+
+# ─── Ingest Manifest ────────────────────────────────────────────────────────────
+# Maps each ingested file name to what it looked like when it was last embedded,
+# so a re-run can skip unchanged files and clean up chunks of changed/removed ones.
+def load_manifest(path=MANIFEST_PATH):
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"[!] Ignoring unreadable manifest: {path} | Error: {e}")
+        return {}
+
+def save_manifest(manifest, path=MANIFEST_PATH):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+def file_hash(path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def is_unchanged(entry, stat, model_name):
+    return (
+        entry is not None
+        and entry.get("model") == model_name
+        and entry.get("size") == stat.st_size
+        and entry.get("mtime") == stat.st_mtime
+    )
+
+def manifest_entry(path, stat, content_hash, chunk_count):
+    return {
+        "path": path,
+        "size": stat.st_size,
+        "mtime": stat.st_mtime,
+        "sha256": content_hash,
+        "chunks": chunk_count,
+        "model": EMBED_MODEL_ID,
+    }
+
+def delete_stale_chunks(fname, keep_ids=()):
+    store = get_store()
+    existing = store.ids_for_source(fname)
+    stale = sorted(set(existing) - set(keep_ids))
+    if stale:
+        store.delete(stale)
+    return len(stale)
+
+def scan_directory(directory, manifest, full=False):
+    """
+    Work out which files in `directory` need (re-)embedding.
+
+    Returns (pending, seen, skipped) where `pending` is a list of
+    (fname, path, stat, sha256) tuples and `seen` is every candidate file name.
+    """
+    pending, seen, skipped = [], set(), 0
+    for fname in sorted(os.listdir(directory)):
         if ':' in fname:
             print(f"[-] Skipping system file: {fname}")
             continue
@@ -88,34 +259,136 @@ def ingest_directory(directory):
         if not os.path.isfile(path):
             continue
 
+        seen.add(fname)
+        stat = os.stat(path)
+        entry = None if full else manifest.get(fname)
+        if is_unchanged(entry, stat, EMBED_MODEL_ID):
+            skipped += 1
+            continue
+
+        content_hash = file_hash(path)
+        if entry and entry.get("model") == EMBED_MODEL_ID and entry.get("sha256") == content_hash:
+            # Touched but not modified: refresh size/mtime so the next run takes the fast path
+            entry.update(size=stat.st_size, mtime=stat.st_mtime)
+            skipped += 1
+            continue
+
+        pending.append((fname, path, stat, content_hash))
+    return pending, seen, skipped
+
+def remove_deleted_files(manifest, seen):
+    removed = 0
+    for fname in sorted(set(manifest) - seen):
+        print(f"[-] Removing chunks of deleted file: {fname}")
+        removed += delete_stale_chunks(fname)
+        del manifest[fname]
+    return removed
+
+def iter_chunks(path):
+    """
+    Stream (chunk, metadata) pairs for one file. Raises ValueError for unsupported
+    types and DocumentLoadError for files that cannot be read completely.
+    """
+    return split_text(load_document(path))
+
+def parse_file(path):
+    """Load and chunk one file into a list of (chunk, metadata) pairs."""
+    return list(iter_chunks(path))
+
+def chunk_ids(fname, count, start=0):
+    return [f"{fname}_{i}" for i in range(start, start + count)]
+
+def chunk_records(fname, chunks, start=0):
+    """Ids and metadatas for (chunk, metadata) pairs numbered from `start`."""
+    ids = chunk_ids(fname, len(chunks), start)
+    metadatas = [{"source": fname, **meta} for _, meta in chunks]
+    return ids, metadatas
+
+# ─── Ingest Function ────────────────────────────────────────────────────────────
+@tracing.traced("ingest.directory")
+def ingest_directory(directory, full=False):
+    """
+    Embed new and changed files in `directory` into the vector store.
+
+    Unchanged files (same size/mtime, or same content hash) are skipped, changed
+    files are upserted, and chunks left over from shrunk or deleted files are
+    removed. Files that fail to load keep their chunks and manifest entry and are
+    retried on the next run. Pass full=True to ignore the manifest and re-embed
+    everything.
+    """
+    manifest = load_manifest()
+    pending, seen, skipped = scan_directory(directory, manifest, full)
+    stats = {"skipped": skipped, "updated": 0, "failed": 0, "chunks": 0, "removed_chunks": 0}
+    store = get_store()
+    # Chunks seen before (same text, same model) come from the cache instead of the transformer
+    model = CachedEmbedder(EMBED_MODEL_NAME)
+
+    for fname, path, stat, content_hash in pending:
+        # Checked up front: a ValueError from the store mid-file must not pass for an unsupported type
+        if not is_supported(path):
+            print(f"[!] Skipped unsupported file: {fname} | Unsupported file type: {file_type(path)}")
+            continue
         print(f"[+] Processing: {fname}")
+        # Embed and upsert in bounded batches so peak memory does not grow with file size
+        count = 0
         try:
-            text = load_document(path)
-        except ValueError as ve:
-            print(f"[!] Skipped unsupported file: {fname} | {ve}")
+            chunk_iter = iter_chunks(path)
+            while batch := list(islice(chunk_iter, EMBED_BATCH)):
+                embeddings = model.encode([chunk for chunk, _ in batch])
+                ids, metadatas = chunk_records(fname, batch, start=count)
+                store.upsert(
+                    documents=[chunk for chunk, _ in batch],
+                    embeddings=embeddings,
+                    metadatas=metadatas,
+                    ids=ids
+                )
+                count += len(batch)
+        except DocumentLoadError as e:
+            print(f"[!] {e} (will retry next run)")
+            stats["failed"] += 1
             continue
 
-        if not text.strip():
+        if not count:
             print(f"[!] Empty or unreadable: {fname}")
+            stats["removed_chunks"] += delete_stale_chunks(fname)
+            manifest.pop(fname, None)
             continue
 
-        chunks = split_text(text)
-        embeddings = model.encode(chunks)
-        ids = [f"{fname}_{i}" for i in range(len(chunks))]
-        metadatas = [{"source": fname} for _ in chunks]
+        stats["removed_chunks"] += delete_stale_chunks(fname, keep_ids=chunk_ids(fname, count))
+        stats["updated"] += 1
+        stats["chunks"] += count
 
-        collection.add(
-            documents=chunks,
-            embeddings=embeddings.tolist(),
-            metadatas=metadatas,
-            ids=ids
-        )
+        manifest[fname] = manifest_entry(path, stat, content_hash, count)
+        save_manifest(manifest)
 
+    stats["removed_chunks"] += remove_deleted_files(manifest, seen)
+    store.flush()
+    save_manifest(manifest)
+    model.flush()
+    tracing.current_span().set(**stats)
 #    client.persist()
-    print("\n[✓] Ingestion complete. Embeddings stored in ./chroma_store")
+    print(
+        f"\n[✓] Ingestion complete. {stats['updated']} updated, {stats['skipped']} unchanged, "
+        f"{stats['failed']} failed, {stats['removed_chunks']} stale chunks removed. Embeddings stored in {STORE_PATH}"
+    )
+    return stats
 
 # ─── Main Entrypoint ────────────────────────────────────────────────────────────
 if __name__ == "__main__":
     base_dir = os.path.dirname(os.path.abspath(__file__))
-    data_path = os.path.join(base_dir, "data")
-    ingest_directory(data_path)
+    parser = argparse.ArgumentParser(description="Ingest documents into the agent assist vector store")
+    parser.add_argument("directory", nargs="?", default=os.path.join(base_dir, "data"))
+    parser.add_argument("--full", action="store_true", help="Ignore the manifest and re-embed every file")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Parser processes; more than 1 switches to the pipelined ingest")
+    parser.add_argument("--batch-size", type=int, default=256, help="Chunks per embedding batch (pipelined mode)")
+    parser.add_argument("--queue-depth", type=int, default=8, help="Max chunk blocks / batches in flight (pipelined mode)")
+    parser.add_argument("--block-size", type=int, default=64, help="Chunks per block handed from a parser (pipelined mode)")
+    args = parser.parse_args()
+    if args.workers > 1:
+        from ingest_pipeline import ingest_directory_pipelined
+        ingest_directory_pipelined(args.directory, full=args.full, workers=args.workers,
+                                   batch_size=args.batch_size, queue_depth=args.queue_depth,
+                                   block_size=args.block_size)
+    else:
+        ingest_directory(args.directory, full=args.full)
@@ -0,0 +1,314 @@
+# phase3_agent_assist/ingest_pipeline.py
+#
+# Pipelined variant of ingest.ingest_directory:
+#
+#   parser processes ──► parsed queue ──► embedder thread ──► write queue ──► writer thread
+#   (load + chunk)        (bounded)       (cross-file batches)  (bounded)      (store upsert)
+#
+# Parsing PDFs/DOCX is CPU-bound, so it runs in a process pool. Workers stream
+# each file's chunks to the parent in blocks of `block_size` through a bounded
+# queue, so no file is ever held whole in memory. A single embedder packs chunks
+# from many files into fixed-size batches, and a single writer owns the vector
+# store and the manifest.
+
+import os
+import sys
+import time
+import queue
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import ingest
+from embedding_cache import CachedEmbedder
+
+_DONE = object()
+
+
+class IngestProgress:
+    def __init__(self, total_files, interval=2.0):
+        self.total_files = total_files
+        self.interval = interval
+        self.started = time.perf_counter()
+        self.last_report = self.started
+        self.lock = threading.Lock()
+        self.files_parsed = 0
+        self.files_written = 0
+        self.chunks_embedded = 0
+        self.chunks_written = 0
+        self.batches = 0
+        self.embed_seconds = 0.0
+        self.write_seconds = 0.0
+
+    def add(self, **counts):
+        with self.lock:
+            for name, value in counts.items():
+                setattr(self, name, getattr(self, name) + value)
+            now = time.perf_counter()
+            if now - self.last_report >= self.interval:
+                self.last_report = now
+                self._print_line(now)
+
+    def _print_line(self, now):
+        elapsed = max(now - self.started, 1e-9)
+        sys.stdout.write(
+            f"\r[~] parsed {self.files_parsed}/{self.total_files} files | "
+            f"embedded {self.chunks_embedded} chunks ({self.chunks_embedded / elapsed:.1f}/s) | "
+            f"written {self.chunks_written} chunks"
+        )
+        sys.stdout.flush()
+
+    def report(self):
+        elapsed = max(time.perf_counter() - self.started, 1e-9)
+        print(
+            f"\n[✓] Pipeline finished in {elapsed:.1f}s: {self.files_written} files, "
+            f"{self.chunks_written} chunks in {self.batches} batches"
+        )
+        print(
+            f"    throughput: {self.files_written / elapsed:.2f} files/s, "
+            f"{self.chunks_written / elapsed:.1f} chunks/s | "
+            f"embed {self.embed_seconds:.1f}s, write {self.write_seconds:.1f}s"
+        )
+
+
+_blocks = None  # worker-side queue of parsed chunk blocks, set by _init_worker
+_block_size = None
+
+
+def _init_worker(blocks, block_size):
+    global _blocks, _block_size
+    _blocks, _block_size = blocks, block_size
+
+
+def _parse_worker(fname, path):
+    """
+    Runs in a worker process. Puts ("chunks", fname, [(chunk, metadata), ...])
+    blocks on the shared queue, then ("end", fname, chunk count, error message).
+    """
+    count, error, block = 0, None, []
+    try:
+        for item in ingest.iter_chunks(path):
+            block.append(item)
+            if len(block) >= _block_size:
+                _blocks.put(("chunks", fname, block))
+                count += len(block)
+                block = []
+        if block:
+            _blocks.put(("chunks", fname, block))
+            count += len(block)
+    except ingest.DocumentLoadError as e:
+        error = f"{e} (will retry next run)"
+    _blocks.put(("end", fname, count, error))
+
+
+def _put(q, item, errors):
+    """Blocking put that gives up once another stage has failed."""
+    while True:
+        try:
+            q.put(item, timeout=0.5)
+            return True
+        except queue.Full:
+            if errors:
+                return False
+
+
+def _run_stage(target, errors, *args):
+    try:
+        target(*args)
+    except BaseException as e:  # surface the failure to the main thread
+        errors.append(e)
+
+
+def _embed_stage(parsed_q, write_q, batch_size, progress, errors):
+    model = CachedEmbedder(ingest.EMBED_MODEL_NAME)
+    batch = []
+    offsets = {}  # fname -> number of its chunks seen so far
+
+    def flush():
+        if not batch:
+            return
+        t0 = time.perf_counter()
+        embeddings = model.encode([chunk for _, _, chunk, _ in batch], batch_size=batch_size)
+        progress.add(chunks_embedded=len(batch), embed_seconds=time.perf_counter() - t0)
+        if not _put(write_q, ("batch", list(batch), embeddings.tolist()), errors):
+            raise RuntimeError("writer stage stopped")
+        batch.clear()
+
+    while True:
+        item = parsed_q.get()
+        if item is _DONE:
+            flush()
+            model.flush()
+            _put(write_q, _DONE, errors)
+            return
+        if item[0] == "failed":
+            # Flush first so none of the file's chunks reach the writer after its failure record
+            offsets.pop(item[1], None)
+            flush()
+            if not _put(write_q, item, errors):
+                raise RuntimeError("writer stage stopped")
+            continue
+        if item[0] == "end":
+            # The writer finalizes the file once this record and all its chunks have arrived
+            offsets.pop(item[1], None)
+            if not _put(write_q, ("file", *item[1:]), errors):
+                raise RuntimeError("writer stage stopped")
+            continue
+        _, fname, chunks = item
+        start = offsets.get(fname, 0)
+        offsets[fname] = start + len(chunks)
+        ids, metadatas = ingest.chunk_records(fname, chunks, start=start)
+        for chunk_id, (chunk, _), metadata in zip(ids, chunks, metadatas):
+            batch.append((fname, chunk_id, chunk, metadata))
+            if len(batch) >= batch_size:
+                flush()
+
+
+def _write_stage(write_q, manifest, stats, progress):
+    store = ingest.get_store()
+    written, files = {}, {}
+
+    def finalize_if_complete(fname):
+        if fname not in files or written.get(fname, 0) < files[fname][3]:
+            return
+        path, stat, content_hash, count = files.pop(fname)
+        written.pop(fname, None)
+        ids = ingest.chunk_ids(fname, count)
+        stats["removed_chunks"] += ingest.delete_stale_chunks(fname, keep_ids=ids)
+        if ids:
+            manifest[fname] = ingest.manifest_entry(path, stat, content_hash, len(ids))
+            stats["updated"] += 1
+            stats["chunks"] += len(ids)
+        else:
+            manifest.pop(fname, None)
+        progress.add(files_written=1)
+
+    while True:
+        item = write_q.get()
+        if item is _DONE:
+            return
+        if item[0] == "file":
+            _, fname, count, path, stat, content_hash = item
+            files[fname] = (path, stat, content_hash, count)
+            finalize_if_complete(fname)
+            continue
+        if item[0] == "failed":
+            # Its chunks stay upserted, but the file is never finalized
+            written.pop(item[1], None)
+            stats["failed"] += 1
+            continue
+
+        _, batch, embeddings = item
+        t0 = time.perf_counter()
+        store.upsert(
+            documents=[chunk for _, _, chunk, _ in batch],
+            embeddings=embeddings,
+            metadatas=[metadata for _, _, _, metadata in batch],
+            ids=[chunk_id for _, chunk_id, _, _ in batch],
+        )
+        progress.add(chunks_written=len(batch), batches=1, write_seconds=time.perf_counter() - t0)
+        for fname, _, _, _ in batch:
+            written[fname] = written.get(fname, 0) + 1
+        for fname in {fname for fname, _, _, _ in batch}:
+            finalize_if_complete(fname)
+
+
+def ingest_directory_pipelined(directory, full=False, workers=None, batch_size=256, queue_depth=8, block_size=64):
+    """
+    Same contract as ingest.ingest_directory, but parses files in `workers`
+    processes and embeds chunks in cross-file batches of `batch_size`.
+    Workers hand over chunks `block_size` at a time; `queue_depth` bounds how
+    many blocks and embedded batches are held in memory between stages.
+    """
+    workers = workers or os.cpu_count() or 1
+    manifest = ingest.load_manifest()
+    pending, seen, skipped = ingest.scan_directory(directory, manifest, full)
+    stats = {"skipped": skipped, "updated": 0, "failed": 0, "chunks": 0, "removed_chunks": 0}
+    print(f"[+] {len(pending)} files to ingest, {skipped} unchanged | "
+          f"workers={workers} batch_size={batch_size} queue_depth={queue_depth}")
+
+    progress = IngestProgress(len(pending))
+    parsed_q = queue.Queue(maxsize=queue_depth)
+    write_q = queue.Queue(maxsize=queue_depth)
+    errors = []
+    embedder = threading.Thread(target=_run_stage, args=(_embed_stage, errors, parsed_q, write_q, batch_size, progress, errors))
+    writer = threading.Thread(target=_run_stage, args=(_write_stage, errors, write_q, manifest, stats, progress))
+    embedder.start()
+    writer.start()
+
+    # Bounded, so a worker blocks instead of piling up chunks while the embedder catches up
+    blocks = multiprocessing.Queue(maxsize=queue_depth)
+    pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(blocks, block_size))
+    futures = []
+    try:
+        todo = iter(pending)
+        in_flight = {}  # fname -> (path, stat, content_hash)
+        while not errors:
+            # Keep every worker busy with one file and one more queued behind it
+            while len(in_flight) < 2 * workers:
+                job = next(todo, None)
+                if job is None:
+                    break
+                fname, path, stat, content_hash = job
+                if not ingest.is_supported(path):
+                    print(f"\n[!] Skipped unsupported file: {fname} | Unsupported file type: {ingest.file_type(path)}")
+                    progress.add(files_parsed=1)
+                    continue
+                in_flight[fname] = (path, stat, content_hash)
+                futures.append(pool.submit(_parse_worker, fname, path))
+            if not in_flight:
+                break
+            try:
+                message = blocks.get(timeout=0.5)
+            except queue.Empty:
+                # A worker that died without its "end" message would stall the loop forever
+                for future in futures:
+                    if future.done() and future.exception() is not None:
+                        raise future.exception()
+                continue
+            if message[0] == "chunks":
+                if not _put(parsed_q, message, errors):
+                    break
+                continue
+            _, fname, count, error = message
+            path, stat, content_hash = in_flight.pop(fname)
+            progress.add(files_parsed=1)
+            if error is not None:
+                # Chunks already sent are upserted, but the file is not finalized or put in the manifest
+                print(f"\n[!] {error}")
+                if not _put(parsed_q, ("failed", fname), errors):
+                    break
+                continue
+            if not count:
+                print(f"\n[!] Empty or unreadable: {fname}")
+            if not _put(parsed_q, ("end", fname, count, path, stat, content_hash), errors):
+                break
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+        # Workers blocked on a full queue cannot finish until it is drained
+        while not all(future.done() for future in futures):
+            try:
+                blocks.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        pool.shutdown()
+        _put(parsed_q, _DONE, errors)
+        embedder.join()
+        if errors:
+            # Embedder may have died before forwarding the sentinel; unblock the writer
+            _put(write_q, _DONE, errors)
+        writer.join()
+
+    if errors:
+        raise errors[0]
+
+    stats["removed_chunks"] += ingest.remove_deleted_files(manifest, seen)
+    ingest.get_store().flush()
+    ingest.save_manifest(manifest)
+    progress.report()
+    print(
+        f"[✓] Ingestion complete. {stats['updated']} updated, {stats['skipped']} unchanged, "
+        f"{stats['failed']} failed, {stats['removed_chunks']} stale chunks removed. "
+        f"Embeddings stored in {ingest.STORE_PATH}"
+    )
+    return stats
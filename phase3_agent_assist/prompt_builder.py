@@ -0,0 +1,179 @@
+# phase3_agent_assist/prompt_builder.py
+#
+# Token-budgeted prompt assembly shared by rag_chain.py and LiteMind.
+#
+# Prefill time on CPU-only TinyLLaMA grows with prompt length, so the builder:
+#   - counts tokens against a context budget (num_ctx minus the answer budget)
+#   - trims the overlap between neighbouring chunks and drops near-duplicates
+#   - orders the remaining chunks by retrieval score and keeps what fits
+#   - keeps recent conversation turns verbatim and folds older ones into a short
+#     running summary instead of cutting them off
+# and logs the size of every section of the prompt it builds.
+
+import re
+import logging
+
+logger = logging.getLogger("prompt_builder")
+
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+
+
+def approx_tokens(text):
+    # Llama-style tokenizers split long words into pieces; ~1.3 tokens per word/punct is close enough
+    return int(len(_TOKEN_RE.findall(text)) * 1.3) + 1
+
+
+def _shingles(text, size=5):
+    words = text.lower().split()
+    return {" ".join(words[i:i + size]) for i in range(max(len(words) - size + 1, 1))}
+
+
+def _overlap_len(prev, text, min_overlap=20):
+    """Length of the longest suffix of `prev` that is a prefix of `text`."""
+    for n in range(min(len(prev), len(text)), min_overlap - 1, -1):
+        if text.startswith(prev[-n:]):
+            return n
+    return 0
+
+
+def _first_sentence(text, max_words=25):
+    sentence = re.split(r"(?<=[.!?])\s", text.strip(), maxsplit=1)[0]
+    words = sentence.split()
+    return " ".join(words[:max_words]) + (" ..." if len(words) > max_words else "")
+
+
+def summarize_turns(lines, max_words=25):
+    """Extractive summary of history lines ("User: ...", "Assistant: ...")."""
+    parts = []
+    for line in lines:
+        role, _, text = line.partition(": ")
+        if not text:
+            role, text = "", line
+        parts.append(f"{role.lower() or 'note'}: {_first_sentence(text, max_words)}")
+    return "; ".join(parts)
+
+
+class PromptBuilder:
+    def __init__(self, context_budget=1792, system="You are a helpful contact center assistant.",
+                 separator="\n---\n", history_budget=0.25, summary_budget=0.08,
+                 duplicate_threshold=0.8, token_counter=approx_tokens):
+        """
+        context_budget  — tokens the whole prompt may use (num_ctx - num_predict)
+        history_budget  — share of the budget for verbatim recent turns
+        summary_budget  — share of the budget for the summary of older turns
+        """
+        self.context_budget = context_budget
+        self.system = system
+        self.separator = separator
+        self.history_budget = history_budget
+        self.summary_budget = summary_budget
+        self.duplicate_threshold = duplicate_threshold
+        self.count = token_counter
+        self.last_report = {}
+
+    # ── context chunks ──
+    def select_chunks(self, chunks, scores=None, budget=None):
+        """
+        Return (kept chunks, dropped count). `scores` are similarities (higher is
+        better); without them the input order is taken as the ranking.
+        """
+        order = range(len(chunks))
+        if scores is not None:
+            order = sorted(order, key=lambda i: -scores[i])
+        kept, kept_shingles, used, dropped = [], [], 0, 0
+        for i in order:
+            text = chunks[i]
+            # Neighbouring 500/50 chunks share their edges; keep that text only once
+            for prev in kept:
+                cut = _overlap_len(prev, text)
+                if cut:
+                    text = text[cut:]
+                cut = _overlap_len(text, prev)
+                if cut:
+                    text = text[:-cut]
+            shingles = _shingles(text)
+            duplicate = any(
+                len(shingles & seen) / max(len(shingles | seen), 1) >= self.duplicate_threshold
+                for seen in kept_shingles
+            )
+            cost = self.count(text)
+            if duplicate or not text.strip() or (budget is not None and used + cost > budget):
+                dropped += 1
+                continue
+            kept.append(text)
+            kept_shingles.append(shingles)
+            used += cost
+        return kept, dropped
+
+    # ── conversation history ──
+    def compact_history(self, history, budget, summary_budget):
+        """Split history lines into (summary of older turns, recent lines verbatim)."""
+        recent, used = [], 0
+        for line in reversed(history):
+            cost = self.count(line)
+            if used + cost > budget:
+                break
+            recent.insert(0, line)
+            used += cost
+        older = history[:len(history) - len(recent)]
+        if not older:
+            return "", recent
+        summary = summarize_turns(older)
+        # Keep the newest part of the summary if it is still too long
+        while summary and self.count(summary) > summary_budget:
+            summary = summary.partition("; ")[2]
+        return summary, recent
+
+    # ── assembly ──
+    def build(self, query, chunks, history=(), scores=None, include_system=True, budget=None):
+        history = list(history)
+        budget = self.context_budget if budget is None else budget
+        system = self.system if include_system else ""
+        fixed = self.count(system) + self.count(f"User: {query}\nAssistant:") + 16
+        summary, recent = self.compact_history(
+            history,
+            int(budget * self.history_budget),
+            int(budget * self.summary_budget),
+        )
+        history_tokens = self.count(summary) + sum(self.count(line) for line in recent)
+        context_budget = max(budget - fixed - history_tokens, 0)
+        kept, dropped = self.select_chunks(list(chunks), scores, budget=context_budget)
+
+        sections = [system, ""] if system else [""]
+        sections += ["Context:", self.separator.join(kept), ""]
+        if summary or recent:
+            sections.append("Conversation so far:")
+            if summary:
+                sections.append(f"(Earlier: {summary})")
+            sections.extend(recent)
+        sections += [f"User: {query}", "Assistant:"]
+        prompt = "\n".join(sections)
+
+        self.last_report = {
+            "prompt_tokens": self.count(prompt),
+            "budget": budget,
+            "context_tokens": sum(self.count(c) for c in kept),
+            "chunks_kept": len(kept),
+            "chunks_dropped": dropped,
+            "history_tokens": history_tokens,
+            "turns_summarized": len(history) - len(recent),
+        }
+        logger.info(
+            "prompt %(prompt_tokens)d/%(budget)d tokens | context %(context_tokens)d tokens, "
+            "%(chunks_kept)d chunks kept, %(chunks_dropped)d dropped | history %(history_tokens)d tokens, "
+            "%(turns_summarized)d lines summarized", self.last_report
+        )
+        return prompt
+
+    def build_turn(self, query, chunks, scores=None, budget=None):
+        """
+        Prompt for a single new turn (context + question, no system text or
+        history), for sessions that already hold the conversation as KV context.
+        `budget` is the room left in that context (ChatSession.remaining_tokens()).
+        Returns None when no retrieved chunk fits, so the caller starts a fresh
+        context from the full prompt rather than answering without context.
+        """
+        prompt = self.build(query, chunks, scores=scores, include_system=False, budget=budget)
+        if chunks and not self.last_report["chunks_kept"]:
+            return None
+        return prompt
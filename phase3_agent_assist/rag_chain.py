@@ -1,19 +1,55 @@
 import os
-from typing import List
-import chromadb
-from sentence_transformers import SentenceTransformer
-import subprocess
+from typing import List, Optional
+from vector_store import open_store
+from embedding_cache import CachedEmbedder
+from retrieval_client import RetrievalClient, RETRIEVAL_URL
+from answer_cache import AnswerCache, collection_fingerprint
+from prompt_builder import PromptBuilder, approx_tokens
+from batch_retrieval import search_batch, as_triples
+import logging
 import threading
 import itertools
 import sys
 import time
 
-# === Initialize ChromaDB client ===
-client = chromadb.PersistentClient(path="./chroma_store")
-collection = client.get_collection(name="agent_assist_docs")
-
-# === Initialize embedding model ===
-embedder = SentenceTransformer("all-MiniLM-L6-v2")
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "phase1_llm_core"))
+from ollama_client import make_backend, ChatSession
+import tracing
+
+# === Open the vector store (VECTOR_STORE=chroma | numpy), or use the shared
+# retrieval service when RETRIEVAL_URL is set (no local model or store then) ===
+retriever = RetrievalClient(RETRIEVAL_URL) if RETRIEVAL_URL else None
+store = retriever or open_store()
+
+# === Initialize embedding model (query embeddings are cached on disk) ===
+embedder = CachedEmbedder("all-MiniLM-L6-v2")
+
+# === LLM backend (pooled keep-alive HTTP session to Ollama) ===
+LLM_MODEL = "tinyllama"
+LLM_OPTIONS = {
+    "num_predict": int(os.getenv("RAG_NUM_PREDICT", "256")),
+    "num_ctx": int(os.getenv("RAG_NUM_CTX", "2048")),
+}
+llm = make_backend(
+    model=LLM_MODEL,
+    options=LLM_OPTIONS,
+    keep_alive=os.getenv("OLLAMA_KEEP_ALIVE", "10m"),
+    read_timeout=float(os.getenv("RAG_LLM_TIMEOUT", "120")),
+    retries=int(os.getenv("RAG_LLM_RETRIES", "2")),
+)
+
+# Conversation session: reuses Ollama's KV context so each turn sends only the new text
+session = ChatSession(llm, token_counter=approx_tokens)
+
+# === Prompt builder (token budget = context window minus answer length) ===
+prompt_builder = PromptBuilder(context_budget=LLM_OPTIONS["num_ctx"] - LLM_OPTIONS["num_predict"])
+
+# === Answer cache (exact prompt + semantic near-duplicate) ===
+answer_cache = AnswerCache(
+    ttl=float(os.getenv("ANSWER_CACHE_TTL", "3600")),
+    max_entries=int(os.getenv("ANSWER_CACHE_SIZE", "1000")),
+    similarity_threshold=float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95")),
+)
 
 # === Spinner while LLM is generating ===
 class Spinner:
@@ -42,41 +78,61 @@ class Spinner:
         sys.stdout.flush()
 
 # === Retrieve context from vector DB ===
+def search_similar(query: str, top_k: int = 5):
+    """Return (documents, chunk ids, query embedding) for the top_k matches."""
+    if retriever is not None:
+        with tracing.span("retrieval_service.search", top_k=top_k):
+            return retriever.retrieve(query, top_k)
+    query_embedding = embedder.encode([query])
+    with tracing.span("vector_store.query", top_k=top_k) as span:
+        results = store.query(
+            query_embedding,
+            n_results=top_k,
+            include=["documents", "metadatas"]
+        )
+        span.set(chunks=len(results['ids'][0]))
+    return results['documents'][0], results['ids'][0], query_embedding[0]
+
+@tracing.traced("rag.search_similar_docs")
 def search_similar_docs(query: str, top_k: int = 5) -> List[str]:
-    query_embedding = embedder.encode([query]).tolist()
-    results = collection.query(
-        query_embeddings=query_embedding,
-        n_results=top_k,
-        include=["documents", "metadatas"]
-    )
-    docs = results['documents'][0]
+    docs, _, _ = search_similar(query, top_k)
     return docs
 
-# === Build prompt from context + chat history ===
-def generate_answer_with_ollama(context: List[str], chat_history: List[str], query: str) -> str:
-    context_text = "\n---\n".join(context)
-    history_text = "\n".join(chat_history[-6:])  # Keep last 6 turns to stay in context window
-    prompt = f"""You are a helpful contact center assistant.
-
-Context:
-{context_text}
-
-Conversation so far:
-{history_text}
-User: {query}
-Assistant:"""
-
-    cmd = ["ollama", "run", "tinyllama"]
-    proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-    stdout, stderr = proc.communicate(input=prompt)
+def search_similar_batch(queries: List[str], top_k: int = 5, batch_size: int = 256):
+    """search_similar for many queries: batched encodes and multi-embedding store queries."""
+    if retriever is not None:
+        return retriever.retrieve_batch(queries, top_k, batch_size)
+    return as_triples(search_batch(store, embedder, queries, top_k, batch_size, include=("documents",)))
 
-    if proc.returncode != 0:
-        raise RuntimeError(f"Ollama CLI error: {stderr.strip()}")
+def search_similar_docs_batch(queries: List[str], top_k: int = 5, batch_size: int = 256) -> List[List[str]]:
+    return [docs for docs, _, _ in search_similar_batch(queries, top_k, batch_size)]
 
-    return stdout.strip()
+# === Build prompt from context + chat history ===
+def build_prompt(context: List[str], chat_history: List[str], query: str) -> str:
+    # Deduplicates chunks, fits them to the token budget and summarizes older turns
+    with tracing.span("prompt.build") as span:
+        prompt = prompt_builder.build(query, context, chat_history)
+        span.set(**prompt_builder.last_report)
+    return prompt
+
+@tracing.traced("rag.generate_answer_with_ollama")
+def generate_answer_with_ollama(context: List[str], chat_history: List[str], query: str,
+                                full_prompt: Optional[str] = None) -> str:
+    # The full prompt is only sent when the session has to start a fresh KV context;
+    # callers that already built it (for the answer cache key) pass it in
+    turn_prompt = prompt_builder.build_turn(query, context, budget=session.remaining_tokens())
+    if full_prompt is None:
+        full_prompt = build_prompt(context, chat_history, query)
+    return session.generate(turn_prompt, full_prompt=full_prompt).strip()
+
+def format_trace(span):
+    """One-line per-stage breakdown of a finished turn span."""
+    parts = [f"{child.name} {child.duration * 1000:.0f}ms" for _, child in span.flatten()[1:]]
+    return f"total {span.duration * 1000:.0f}ms | " + ", ".join(parts)
 
 # === CLI Loop ===
 def main():
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"), format="[%(name)s] %(message)s")
     print("🧠 Agent Assist Chat (RAG + Memory Enabled)\n")
     chat_history = []
 
@@ -85,17 +141,32 @@ def main():
         if query.lower() in ("exit", "quit"):
             break
         try:
-            docs = search_similar_docs(query)
-            if not docs:
-                print("No relevant documents found.")
-                continue
-
-            spinner = Spinner("🤖 Thinking... ")
-            spinner.start()
-            answer = generate_answer_with_ollama(docs, chat_history, query)
-            spinner.stop()
-
-            print(f"\nLLM: {answer}\n")
+            with tracing.span("rag.turn") as turn:
+                docs, chunk_ids, query_embedding = search_similar(query)
+                if not docs:
+                    print("No relevant documents found.")
+                    continue
+
+                answer_cache.sync_version(collection_fingerprint(store))
+                prompt = build_prompt(docs, chat_history, query)
+                answer = answer_cache.lookup(LLM_MODEL, prompt, query_embedding, chunk_ids)
+                turn.set(chunks=len(docs), cache_hit=answer is not None)
+                if answer is not None:
+                    # The model never saw this turn; re-prompt with full history next time
+                    session.reset()
+                    print(f"\nLLM (cached): {answer}\n")
+                else:
+                    spinner = Spinner("🤖 Thinking... ")
+                    spinner.start()
+                    try:
+                        answer = generate_answer_with_ollama(docs, chat_history, query, full_prompt=prompt)
+                    finally:
+                        spinner.stop()
+                    answer_cache.store(LLM_MODEL, prompt, answer, query_embedding, chunk_ids)
+
+                    print(f"\nLLM: {answer}\n")
+            if tracing.is_enabled():
+                print(f"[trace] {format_trace(turn)}")
 
             # Update chat history
             chat_history.append(f"User: {query}")
@@ -104,5 +175,9 @@ def main():
         except Exception as e:
             print(f"[Error] {e}")
 
+    print(f"[i] Answer cache: {answer_cache.stats()}")
+    if tracing.is_enabled():
+        print(tracing.registry.to_prometheus())
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,89 @@
+# phase3_agent_assist/retrieval_client.py
+#
+# Thin client for retrieval_service.py.
+#
+# Frontends use it when RETRIEVAL_URL is set, instead of loading their own
+# embedding model and opening the vector store. It exposes the same
+# retrieve(query, n_results) -> (documents, chunk ids, query embedding) call as
+# LiteMind's RetrievalEngine, plus count() so collection_fingerprint() works
+# with it in place of a store.
+
+import os
+import time
+import threading
+
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+
+RETRIEVAL_URL = os.getenv("RETRIEVAL_URL")
+
+
+class RetrievalClient:
+    def __init__(self, base_url=None, timeout=30, pool_size=8):
+        self.base_url = (base_url or RETRIEVAL_URL or "http://127.0.0.1:8765").rstrip("/")
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.mount("http://", HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size))
+        # Same readiness surface as RetrievalEngine, so the UI code does not care
+        self.ready = threading.Event()
+        self.warmup_error = None
+        self.warmup_thread = None
+        self.timings = {}
+
+    @property
+    def store(self):
+        return self
+
+    def health(self):
+        response = self.session.get(f"{self.base_url}/health", timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def count(self):
+        return self.health()["count"]
+
+    def warm_up(self):
+        try:
+            t0 = time.perf_counter()
+            self.health()
+            self.timings["service_ping_s"] = time.perf_counter() - t0
+        except Exception as e:
+            self.warmup_error = e
+        finally:
+            self.ready.set()
+
+    def warm_up_async(self):
+        if self.warmup_thread is None:
+            self.warmup_thread = threading.Thread(target=self.warm_up, daemon=True)
+            self.warmup_thread.start()
+        return self.warmup_thread
+
+    def search(self, queries, top_k=5, where=None):
+        """Batch search: {"ids": [[...]], "documents": [[...]], "distances": [[...]], "embeddings": [[...]]}."""
+        response = self.session.post(
+            f"{self.base_url}/search",
+            json={"queries": list(queries), "top_k": top_k, "where": where, "include_embeddings": True},
+            timeout=self.timeout,
+        )
+        response.raise_for_status()
+        return response.json()
+
+    def retrieve(self, query, n_results=5):
+        """Return (documents, chunk ids, query embedding)."""
+        t0 = time.perf_counter()
+        result = self.search([query], n_results)
+        self.timings["last_search_s"] = time.perf_counter() - t0
+        return result["documents"][0], result["ids"][0], np.asarray(result["embeddings"][0], dtype=np.float32)
+
+    def retrieve_batch(self, queries, n_results=5, batch_size=256):
+        """[(documents, chunk ids, query embedding)] per query, `batch_size` queries per request."""
+        out = []
+        for start in range(0, len(queries), batch_size):
+            result = self.search(queries[start:start + batch_size], n_results)
+            out.extend((docs, ids, np.asarray(emb, dtype=np.float32))
+                       for docs, ids, emb in zip(result["documents"], result["ids"], result["embeddings"]))
+        return out
+
+    def close(self):
+        self.session.close()
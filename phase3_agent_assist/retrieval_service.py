@@ -0,0 +1,216 @@
+# phase3_agent_assist/retrieval_service.py
+#
+# Shared retrieval service: one embedding model and one vector store for every
+# chat frontend on the machine.
+#
+#   python retrieval_service.py --port 8765 --max-batch 32 --max-wait-ms 5
+#   RETRIEVAL_URL=http://127.0.0.1:8765 python rag_chain.py
+#   RETRIEVAL_URL=http://127.0.0.1:8765 streamlit run ../phase4_litemind_chat/app.py
+#
+# Search requests from all clients go into a single queue. The batcher takes
+# the first waiting request, then waits up to `max_wait_ms` for more (at most
+# `max_batch`). The whole group is embedded in one encode() call and searched in
+# one store.query() per distinct filter. When one agent is online that costs a
+# few milliseconds of waiting. With a floor of agents, N queries share one
+# forward pass.
+#
+# API (JSON over HTTP):
+#   POST /search  {"queries": [...], "top_k": 5, "where": {...}, "include_embeddings": true}
+#              -> {"ids": [[...]], "documents": [[...]], "distances": [[...]], "embeddings": [[...]]}
+#   GET  /health  -> {"status": "ok", "count": N, "batches": ..., "mean_batch": ..., ...}
+
+import json
+import time
+import queue
+import argparse
+import threading
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from embedding_cache import CachedEmbedder
+from vector_store import open_store
+
+EMBED_MODEL_NAME = "all-MiniLM-L6-v2"
+DEFAULT_PORT = 8765
+
+
+class MicroBatcher:
+    """Collects concurrent searches and runs them as batched encode + query calls."""
+
+    def __init__(self, embedder, store, max_batch=32, max_wait_ms=5):
+        self.embedder = embedder
+        self.store = store
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.pending = queue.Queue()
+        self.lock = threading.Lock()
+        self.batches = 0
+        self.queries = 0
+        self.largest_batch = 0
+        self.busy_s = 0.0
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def submit(self, query, top_k=5, where=None):
+        """Future resolving to (document list, id list, distance list, query embedding)."""
+        future = Future()
+        self.pending.put((query, top_k, where, future))
+        return future
+
+    def search(self, queries, top_k=5, where=None):
+        futures = [self.submit(q, top_k, where) for q in queries]
+        return [f.result() for f in futures]
+
+    def _collect(self):
+        batch = [self.pending.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            try:
+                batch.append(self.pending.get(timeout=max(remaining, 0)) if remaining > 0
+                             else self.pending.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            t0 = time.perf_counter()
+            try:
+                self._process(batch)
+            except Exception as e:
+                for *_, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            with self.lock:
+                self.batches += 1
+                self.queries += len(batch)
+                self.largest_batch = max(self.largest_batch, len(batch))
+                self.busy_s += time.perf_counter() - t0
+
+    def _process(self, batch):
+        embeddings = self.embedder.encode([query for query, *_ in batch])
+        # One store query per distinct filter; each asks for the largest top_k in its group
+        groups = {}
+        for i, (_, top_k, where, _) in enumerate(batch):
+            groups.setdefault(json.dumps(where, sort_keys=True), []).append(i)
+        for key, rows in groups.items():
+            # A bad filter fails only the requests that sent it, not the rest of the batch
+            try:
+                k = max(batch[i][1] for i in rows)
+                result = self.store.query(embeddings[rows], n_results=k, where=json.loads(key),
+                                          include=["documents", "distances"])
+            except Exception as e:
+                for i in rows:
+                    batch[i][3].set_exception(e)
+                continue
+            for j, i in enumerate(rows):
+                top_k, future = batch[i][1], batch[i][3]
+                future.set_result((result["documents"][j][:top_k], result["ids"][j][:top_k],
+                                   result["distances"][j][:top_k], embeddings[i]))
+
+    def stats(self):
+        with self.lock:
+            return {
+                "batches": self.batches,
+                "queries": self.queries,
+                "mean_batch": round(self.queries / self.batches, 2) if self.batches else 0,
+                "largest_batch": self.largest_batch,
+                "busy_s": round(self.busy_s, 3),
+                "queued": self.pending.qsize(),
+            }
+
+
+class RetrievalHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == "/health":
+            service = self.server.service
+            self._send_json(200, {"status": "ok", "count": service.store.count(),
+                                  "model": service.model_name, **service.batcher.stats()})
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        if self.path != "/search":
+            self._send_json(404, {"error": "not found"})
+            return
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            queries = body.get("queries") or [body["query"]]
+            results = self.server.service.batcher.search(queries, int(body.get("top_k", 5)), body.get("where"))
+        except (KeyError, ValueError, TypeError) as e:
+            self._send_json(400, {"error": f"bad request: {e}"})
+            return
+        except Exception as e:
+            self._send_json(500, {"error": str(e)})
+            return
+        reply = {
+            "documents": [docs for docs, _, _, _ in results],
+            "ids": [ids for _, ids, _, _ in results],
+            "distances": [dists for _, _, dists, _ in results],
+        }
+        if body.get("include_embeddings"):
+            reply["embeddings"] = [np.asarray(emb, dtype=np.float32).tolist() for *_, emb in results]
+        self._send_json(200, reply)
+
+
+class RetrievalService:
+    def __init__(self, model_name=EMBED_MODEL_NAME, backend=None, max_batch=32, max_wait_ms=5):
+        self.model_name = model_name
+        self.embedder = CachedEmbedder(model_name)
+        self.store = open_store(backend)
+        self.batcher = MicroBatcher(self.embedder, self.store, max_batch, max_wait_ms)
+
+    def warm_up(self):
+        self.embedder._get_model().encode(["warm up"])
+
+    def serve(self, host="127.0.0.1", port=DEFAULT_PORT):
+        server = ThreadingHTTPServer((host, port), RetrievalHandler)
+        server.daemon_threads = True
+        server.service = self
+        return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shared micro-batching retrieval service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--backend", choices=["chroma", "numpy"], default=None,
+                        help="Vector store backend (default: VECTOR_STORE env var)")
+    parser.add_argument("--max-batch", type=int, default=32)
+    parser.add_argument("--max-wait-ms", type=float, default=5)
+    args = parser.parse_args()
+
+    service = RetrievalService(backend=args.backend, max_batch=args.max_batch, max_wait_ms=args.max_wait_ms)
+    print("[+] Loading embedding model...")
+    service.warm_up()
+    server = service.serve(args.host, args.port)
+    print(f"[✓] Retrieval service on http://{args.host}:{args.port} "
+          f"({service.store.count()} chunks, batch<= {args.max_batch}, wait<= {args.max_wait_ms}ms)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n🛑 Stopped.")
+    finally:
+        service.embedder.flush()
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,454 @@
+# phase3_agent_assist/vector_store.py
+#
+# Pluggable vector store used by ingestion and retrieval.
+#
+#   ChromaStore — the existing Chroma collection in ./chroma_store
+#   NumpyStore  — a local flat index: float16 or int8-quantized rows in .npy files
+#                 (memory-mapped), precomputed norms, exact top-k via matmul +
+#                 argpartition. For tens of thousands of MiniLM chunks this beats
+#                 the Chroma round trip while returning exact results.
+#
+# Both return query results in Chroma's shape ({"ids": [[...]], "documents": ...})
+# so callers do not care which backend is active. Pick one with VECTOR_STORE
+# (chroma | numpy) and VECTOR_STORE_DTYPE (float16 | int8).
+#
+# Chroma's HNSW index is tuned with CHROMA_HNSW_SPACE (l2 | cosine | ip),
+# CHROMA_HNSW_M, CHROMA_HNSW_CONSTRUCTION_EF and CHROMA_HNSW_SEARCH_EF. Unset
+# values keep Chroma's defaults. Space, M and construction_ef are fixed when the
+# collection is created, so changing them needs a fresh store and a full ingest.
+# search_ef is applied whenever the store is opened. bench_hnsw.py sweeps them.
+
+import os
+import json
+import threading
+
+import numpy as np
+
+CHROMA_PATH = "./chroma_store"
+COLLECTION_NAME = "agent_assist_docs"
+NUMPY_INDEX_PATH = "./numpy_index"
+VECTOR_STORE = os.getenv("VECTOR_STORE", "chroma")
+VECTOR_STORE_DTYPE = os.getenv("VECTOR_STORE_DTYPE", "float16")
+HNSW_SPACES = ("l2", "cosine", "ip")
+
+
+def store_path(backend=None):
+    return NUMPY_INDEX_PATH if (backend or VECTOR_STORE) == "numpy" else CHROMA_PATH
+
+
+def manifest_path(backend=None):
+    """The ingest manifest lives next to the store it describes."""
+    return os.path.join(store_path(backend), "ingest_manifest.json")
+
+
+STORE_PATH = store_path()
+MANIFEST_PATH = manifest_path()
+
+
+def hnsw_config(space=None, m=None, construction_ef=None, search_ef=None):
+    """Chroma HNSW settings from the arguments or CHROMA_HNSW_* env vars; omitted keys keep Chroma's defaults."""
+    space = space or os.getenv("CHROMA_HNSW_SPACE")
+    if space and space not in HNSW_SPACES:
+        raise ValueError(f"Unsupported HNSW space: {space} (expected one of {', '.join(HNSW_SPACES)})")
+    values = {
+        "space": space,
+        "max_neighbors": m or os.getenv("CHROMA_HNSW_M"),
+        "ef_construction": construction_ef or os.getenv("CHROMA_HNSW_CONSTRUCTION_EF"),
+        "ef_search": search_ef or os.getenv("CHROMA_HNSW_SEARCH_EF"),
+    }
+    return {key: value if key == "space" else int(value) for key, value in values.items() if value}
+
+
+def source_filter(where):
+    """Accepts {"source": name} or {"source": {"$in": [names]}}; returns a set or None."""
+    if not where:
+        return None
+    if set(where) != {"source"}:
+        raise ValueError(f"Only 'source' filters are supported, got: {where}")
+    cond = where["source"]
+    if isinstance(cond, dict):
+        if "$eq" in cond:
+            return {cond["$eq"]}
+        if "$in" in cond:
+            return set(cond["$in"])
+        raise ValueError(f"Unsupported source filter: {cond}")
+    return {cond}
+
+
+class VectorStore:
+    """Interface shared by the backends."""
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        raise NotImplementedError
+
+    def delete(self, ids):
+        raise NotImplementedError
+
+    def ids_for_source(self, source):
+        raise NotImplementedError
+
+    def query(self, query_embeddings, n_results=5, where=None, include=("documents", "metadatas", "distances")):
+        raise NotImplementedError
+
+    def count(self):
+        raise NotImplementedError
+
+    def get(self, limit=None, offset=0, where=None, include=("documents", "metadatas")):
+        """One page of stored chunks, shaped like Chroma's get(): {"ids": [...], "documents": [...], ...}."""
+        raise NotImplementedError
+
+    def iter_batches(self, batch_size=1000, where=None, include=("documents", "metadatas")):
+        """Yield get() pages of up to `batch_size` chunks; only one page is in memory at a time."""
+        offset = 0
+        while True:
+            page = self.get(limit=batch_size, offset=offset, where=where, include=include)
+            if not page["ids"]:
+                return
+            yield page
+            offset += len(page["ids"])
+
+    def flush(self):
+        pass
+
+
+# ─── Chroma ─────────────────────────────────────────────────────────────────────
+class ChromaStore(VectorStore):
+    def __init__(self, path=CHROMA_PATH, name=COLLECTION_NAME, create=False, hnsw=None):
+        import chromadb
+        self.path = path
+        self.hnsw = hnsw_config() if hnsw is None else dict(hnsw)
+        client = chromadb.PersistentClient(path=path)
+        if create and self.hnsw:
+            self.collection = client.get_or_create_collection(name=name, configuration={"hnsw": self.hnsw})
+        elif create:
+            self.collection = client.get_or_create_collection(name=name)
+        else:
+            self.collection = client.get_collection(name=name)
+        if self.hnsw:
+            self._apply_hnsw()
+
+    def index_config(self):
+        """The collection's HNSW settings as stored by Chroma ({} if it does not expose them)."""
+        configuration = getattr(self.collection, "configuration", None)
+        if configuration is None:
+            # Older Chroma keeps them under configuration_json["hnsw_configuration"]
+            legacy = getattr(self.collection, "configuration_json", None) or {}
+            configuration = {"hnsw": legacy.get("hnsw_configuration")}
+        hnsw = configuration.get("hnsw") if hasattr(configuration, "get") else None
+        return dict(hnsw or {})
+
+    def _apply_hnsw(self):
+        # Runs on every open, including read-only consumers, so it only writes when
+        # the stored ef_search is known and differs from the requested one
+        current = self.index_config()
+        if not current:
+            return
+        fixed = {key: value for key, value in self.hnsw.items()
+                 if key != "ef_search" and key in current and current[key] != value}
+        if fixed:
+            built = {key: current[key] for key in fixed}
+            print(f"[!] Collection was built with {built}; {fixed} only applies to a new store "
+                  f"(re-ingest with --full into an empty store)")
+        ef_search = self.hnsw.get("ef_search")
+        if ef_search and current.get("ef_search") != ef_search:
+            self.set_search_ef(ef_search)
+
+    def set_search_ef(self, ef_search):
+        """Change the HNSW search breadth; larger = better recall, slower queries."""
+        self.collection.modify(configuration={"hnsw": {"ef_search": int(ef_search)}})
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        self.collection.upsert(ids=list(ids), embeddings=np.asarray(embeddings).tolist(),
+                               documents=list(documents), metadatas=list(metadatas))
+
+    def delete(self, ids):
+        if ids:
+            self.collection.delete(ids=list(ids))
+
+    def ids_for_source(self, source):
+        return self.collection.get(where={"source": source}, include=[])["ids"]
+
+    def query(self, query_embeddings, n_results=5, where=None, include=("documents", "metadatas", "distances")):
+        return self.collection.query(
+            query_embeddings=np.asarray(query_embeddings).tolist(),
+            n_results=n_results,
+            where=where,
+            include=list(include),
+        )
+
+    def count(self):
+        return self.collection.count()
+
+    def get(self, limit=None, offset=0, where=None, include=("documents", "metadatas")):
+        page = self.collection.get(limit=limit, offset=offset or None, where=where, include=list(include))
+        return {"ids": page["ids"], **{key: page[key] for key in include}}
+
+
+# ─── NumPy flat index ───────────────────────────────────────────────────────────
+class NumpyStore(VectorStore):
+    """
+    Exact cosine search over a flat matrix.
+
+    On disk (in `path`):
+        vectors.npy  float16 rows, or int8 rows + scales.npy (per-row scale)
+        norms.npy    float32 norm of each stored (dequantized) row
+        meta.json    ids, documents, metadatas, dtype
+
+    Reads are memory-mapped; writes are staged in memory and written by flush().
+    Distances are cosine distances (1 - cosine similarity).
+
+    With cache_dense=True (default) the first query dequantizes the matrix once
+    into a normalized float32 copy so every search is a single BLAS matmul; set
+    it to False to keep only the compact memory-mapped rows resident.
+    """
+
+    BLOCK_ROWS = 16384  # rows dequantized per matmul block, bounds temporary memory
+
+    def __init__(self, path=NUMPY_INDEX_PATH, dtype=VECTOR_STORE_DTYPE, create=False, cache_dense=True):
+        if dtype not in ("float16", "int8"):
+            raise ValueError(f"Unsupported dtype: {dtype}")
+        self.path = path
+        self.dtype = dtype
+        self.cache_dense = cache_dense
+        self._dense = None
+        self.lock = threading.RLock()
+        self.dirty = False
+        self.loaded_mtime = None
+        meta_path = os.path.join(path, "meta.json")
+        if not os.path.exists(meta_path) and not create:
+            raise FileNotFoundError(f"No numpy index at {path}; run ingest with VECTOR_STORE=numpy first")
+        self._load()
+
+    # ── persistence ──
+    def _files(self):
+        return {name: os.path.join(self.path, name) for name in ("vectors.npy", "scales.npy", "norms.npy", "meta.json")}
+
+    def _load(self):
+        self._dense = None
+        files = self._files()
+        if not os.path.exists(files["meta.json"]):
+            self.ids, self.documents, self.metadatas = [], [], []
+            self.vectors = self.scales = self.norms = None
+            self.row_of = {}
+            self.sources = np.array([], dtype=object)
+            return
+        with open(files["meta.json"], "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        self.loaded_mtime = os.path.getmtime(files["meta.json"])
+        if meta["dtype"] != self.dtype:
+            print(f"[!] Index at {self.path} is {meta['dtype']}; using it as such")
+            self.dtype = meta["dtype"]
+        self.ids, self.documents, self.metadatas = meta["ids"], meta["documents"], meta["metadatas"]
+        self.row_of = {chunk_id: i for i, chunk_id in enumerate(self.ids)}
+        self.sources = np.array([m.get("source") for m in self.metadatas], dtype=object)
+        if self.ids:
+            self.vectors = np.load(files["vectors.npy"], mmap_mode="r")
+            self.norms = np.load(files["norms.npy"], mmap_mode="r")
+            self.scales = np.load(files["scales.npy"], mmap_mode="r") if self.dtype == "int8" else None
+        else:
+            self.vectors = self.scales = self.norms = None
+
+    def _reload_if_changed(self):
+        meta_path = self._files()["meta.json"]
+        if self.dirty or not os.path.exists(meta_path):
+            return
+        if os.path.getmtime(meta_path) != self.loaded_mtime:
+            self._load()
+
+    def flush(self):
+        with self.lock:
+            if not self.dirty:
+                return
+            os.makedirs(self.path, exist_ok=True)
+            files = self._files()
+            arrays = {"vectors.npy": self.vectors, "norms.npy": self.norms}
+            if self.dtype == "int8":
+                arrays["scales.npy"] = self.scales
+            for name, array in arrays.items():
+                tmp_path = files[name] + ".tmp.npy"
+                np.save(tmp_path, np.asarray(array))
+                os.replace(tmp_path, files[name])
+            tmp_path = files["meta.json"] + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"dtype": self.dtype, "ids": self.ids, "documents": self.documents,
+                           "metadatas": self.metadatas}, f)
+            os.replace(tmp_path, files["meta.json"])
+            self.dirty = False
+            self._load()
+
+    # ── encoding ──
+    def _encode_rows(self, embeddings):
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if self.dtype == "float16":
+            rows = embeddings.astype(np.float16)
+            scales = None
+            dequant = rows.astype(np.float32)
+        else:
+            scales = np.abs(embeddings).max(axis=1) / 127.0
+            scales[scales == 0] = 1.0
+            rows = np.clip(np.rint(embeddings / scales[:, None]), -127, 127).astype(np.int8)
+            dequant = rows.astype(np.float32) * scales[:, None]
+            scales = scales.astype(np.float32)
+        norms = np.linalg.norm(dequant, axis=1).astype(np.float32)
+        return rows, scales, norms
+
+    def _materialize(self):
+        # Switch from read-only memmaps to writable in-memory arrays before mutating
+        self._dense = None
+        if self.vectors is not None and isinstance(self.vectors, np.memmap):
+            self.vectors = np.array(self.vectors)
+            self.norms = np.array(self.norms)
+            if self.scales is not None:
+                self.scales = np.array(self.scales)
+
+    # ── mutations ──
+    def upsert(self, ids, embeddings, documents, metadatas):
+        rows, scales, norms = self._encode_rows(embeddings)
+        with self.lock:
+            self._materialize()
+            new_idx, new_pos = [], []
+            for pos, chunk_id in enumerate(ids):
+                row = self.row_of.get(chunk_id)
+                if row is None:
+                    new_idx.append(pos)
+                    continue
+                self.vectors[row] = rows[pos]
+                self.norms[row] = norms[pos]
+                if scales is not None:
+                    self.scales[row] = scales[pos]
+                self.documents[row] = documents[pos]
+                self.metadatas[row] = metadatas[pos]
+                self.sources[row] = metadatas[pos].get("source")
+            if new_idx:
+                start = len(self.ids)
+                for offset, pos in enumerate(new_idx):
+                    self.row_of[ids[pos]] = start + offset
+                    self.ids.append(ids[pos])
+                    self.documents.append(documents[pos])
+                    self.metadatas.append(metadatas[pos])
+                new_pos = np.asarray(new_idx)
+                self.vectors = rows[new_pos] if self.vectors is None else np.concatenate([self.vectors, rows[new_pos]])
+                self.norms = norms[new_pos] if self.norms is None else np.concatenate([self.norms, norms[new_pos]])
+                if scales is not None:
+                    self.scales = scales[new_pos] if self.scales is None else np.concatenate([self.scales, scales[new_pos]])
+                self.sources = np.concatenate([self.sources, np.array([metadatas[p].get("source") for p in new_idx], dtype=object)])
+            self.dirty = True
+
+    def delete(self, ids):
+        with self.lock:
+            drop = {self.row_of[i] for i in ids if i in self.row_of}
+            if not drop:
+                return
+            self._materialize()
+            keep = np.array([r for r in range(len(self.ids)) if r not in drop], dtype=np.int64)
+            self.ids = [self.ids[r] for r in keep]
+            self.documents = [self.documents[r] for r in keep]
+            self.metadatas = [self.metadatas[r] for r in keep]
+            self.vectors, self.norms, self.sources = self.vectors[keep], self.norms[keep], self.sources[keep]
+            if self.scales is not None:
+                self.scales = self.scales[keep]
+            self.row_of = {chunk_id: i for i, chunk_id in enumerate(self.ids)}
+            self.dirty = True
+
+    def ids_for_source(self, source):
+        with self.lock:
+            self._reload_if_changed()
+            return [self.ids[r] for r in np.flatnonzero(self.sources == source)]
+
+    def count(self):
+        with self.lock:
+            self._reload_if_changed()
+            return len(self.ids)
+
+    def get(self, limit=None, offset=0, where=None, include=("documents", "metadatas")):
+        with self.lock:
+            self._reload_if_changed()
+            wanted = source_filter(where)
+            end = None if limit is None else offset + limit
+            if wanted is None:
+                rows = np.arange(len(self.ids))[offset:end]
+            else:
+                rows = np.flatnonzero(np.isin(self.sources, list(wanted)))[offset:end]
+            page = {"ids": [self.ids[r] for r in rows]}
+            if "documents" in include:
+                page["documents"] = [self.documents[r] for r in rows]
+            if "metadatas" in include:
+                page["metadatas"] = [self.metadatas[r] for r in rows]
+            if "embeddings" in include:
+                if self.vectors is None:
+                    page["embeddings"] = np.zeros((0, 0), dtype=np.float32)
+                else:
+                    # Dequantized but not normalized: the vectors as they were upserted, to storage precision
+                    block = np.asarray(self.vectors[rows], dtype=np.float32)
+                    if self.scales is not None:
+                        block *= np.asarray(self.scales[rows])[:, None]
+                    page["embeddings"] = block
+            return page
+
+    # ── search ──
+    def scores(self, query_embeddings, rows=None):
+        """Cosine similarity of each query against the stored rows (q x n float32)."""
+        queries = np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32))
+        q_norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        queries = queries / np.where(q_norms == 0, 1, q_norms)
+        if self.cache_dense:
+            if self._dense is None:
+                self._dense = self._dequantize(slice(None))
+            return queries @ (self._dense.T if rows is None else self._dense[rows].T)
+        n = len(self.ids) if rows is None else len(rows)
+        out = np.empty((len(queries), n), dtype=np.float32)
+        for start in range(0, n, self.BLOCK_ROWS):
+            sel = slice(start, start + self.BLOCK_ROWS) if rows is None else rows[start:start + self.BLOCK_ROWS]
+            block = self._dequantize(sel)
+            out[:, start:start + block.shape[0]] = queries @ block.T
+        return out
+
+    def _dequantize(self, sel):
+        """float32 rows scaled to unit length using the precomputed norms."""
+        block = np.asarray(self.vectors[sel], dtype=np.float32)
+        if self.scales is not None:
+            block *= np.asarray(self.scales[sel])[:, None]
+        norms = np.asarray(self.norms[sel])
+        block /= np.where(norms == 0, 1, norms)[:, None]
+        return block
+
+    def query(self, query_embeddings, n_results=5, where=None, include=("documents", "metadatas", "distances")):
+        with self.lock:
+            self._reload_if_changed()
+            wanted = source_filter(where)
+            rows = None
+            if wanted is not None:
+                rows = np.flatnonzero(np.isin(self.sources, list(wanted)))
+            n_rows = len(self.ids) if rows is None else len(rows)
+            result = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+            queries = np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32))
+            if n_rows == 0:
+                for key in result:
+                    result[key] = [[] for _ in queries]
+                return result
+
+            k = min(n_results, n_rows)
+            scores = self.scores(queries, rows)
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            for qi in range(len(queries)):
+                order = top[qi][np.argsort(-scores[qi, top[qi]])]
+                picked = order if rows is None else rows[order]
+                result["ids"].append([self.ids[r] for r in picked])
+                result["documents"].append([self.documents[r] for r in picked])
+                result["metadatas"].append([self.metadatas[r] for r in picked])
+                result["distances"].append((1.0 - scores[qi, order]).tolist())
+            for key in ("documents", "metadatas", "distances"):
+                if key not in include:
+                    result[key] = None
+            return result
+
+
+# ─── Factory ────────────────────────────────────────────────────────────────────
+def open_store(backend=None, create=False):
+    """Open the configured backend (VECTOR_STORE env var unless `backend` is given)."""
+    backend = backend or VECTOR_STORE
+    if backend == "chroma":
+        return ChromaStore(create=create)
+    if backend == "numpy":
+        return NumpyStore(create=create)
+    raise ValueError(f"Unknown vector store backend: {backend}")
@@ -1,42 +1,70 @@
 # phase4_litemind_chat/app.py
 
+import os
+import sys
 import streamlit as st
-import time
-import requests
-import json
-import chromadb
-from chromadb.config import Settings
-from sentence_transformers import SentenceTransformer
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "phase3_agent_assist"))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "phase1_llm_core"))
+from retrieval_engine import get_engine
+from answer_cache import AnswerCache, collection_fingerprint
+from prompt_builder import PromptBuilder, approx_tokens
+from ollama_client import GenerationStats, make_backend, ChatSession, record_stats
+import tracing
 
 # ------------------ LLM + Chroma Setup ------------------ #
 
-OLLAMA_API_URL = "http://localhost:11434"
-embedder = SentenceTransformer("all-MiniLM-L6-v2")
-
-client = chromadb.PersistentClient(path="./chroma_store")
-collection = client.get_collection("agent_assist_docs")
-
-def retrieve_docs(query, n_results=5):
-    query_embedding = embedder.encode([query])[0].tolist()
-    results = collection.query(
-        query_embeddings=[query_embedding],
-        n_results=n_results,
-        include=["documents"]
-    )
-    return results['documents'][0] if results and 'documents' in results else []
-
-def ask_ollama(prompt):
-    try:
-        response = requests.post(
-            f"{OLLAMA_API_URL}/api/generate",
-            headers={"Content-Type": "application/json"},
-            json={"model": "tinyllama", "prompt": prompt, "stream": False},
-            timeout=60
-        )
-        response.raise_for_status()
-        return response.json()["response"]
-    except Exception as e:
-        return f"[Error] Ollama API: {e}"
+MODEL_NAME = "tinyllama"
+
+# Built once per server process and warmed up in the background; reruns reuse it
+engine = get_engine()
+
+@st.cache_resource
+def get_answer_cache():
+    # One cache per server process, shared by every session and rerun
+    return AnswerCache(ttl=3600, max_entries=1000, similarity_threshold=0.95)
+
+answer_cache = get_answer_cache()
+
+# TinyLLaMA's default 2048-token window, leaving room for the answer
+prompt_builder = PromptBuilder(context_budget=2048 - 256, system="", separator="\n\n")
+
+@tracing.traced("litemind.retrieve_docs")
+def retrieve_docs_with_ids(query, n_results=5):
+    """Return (documents, chunk ids, query embedding)."""
+    return engine.retrieve(query, n_results)
+
+@st.cache_resource
+def get_llm_backend():
+    # Shared keep-alive connection; keep_alive stops Ollama unloading the model between questions.
+    # Endpoints come from OLLAMA_URLS / OLLAMA_URL like the other entry points
+    return make_backend(model=MODEL_NAME, keep_alive="30m")
+
+def ask_ollama_stream(prompt, session, stats=None, full_prompt=None, errors=None):
+    """Stream the reply; a failure is shown inline and appended to `errors`, even after partial text."""
+    if stats is None:
+        stats = GenerationStats()
+    with tracing.span("litemind.ask_ollama", model=MODEL_NAME) as span:
+        try:
+            yield from session.stream(prompt, full_prompt=full_prompt, stats=stats)
+        except Exception as e:
+            span.set(error=True)
+            if errors is not None:
+                errors.append(e)
+            yield f"[Error] Ollama API: {e}"
+        record_stats(span, stats)
+
+def render_trace(span):
+    """Per-stage table for one finished turn span."""
+    rows = []
+    for depth, child in span.flatten():
+        attrs = {k: round(v, 4) if isinstance(v, float) else v for k, v in child.attrs.items()}
+        rows.append({
+            "stage": "\u2003" * depth + child.name,
+            "ms": round(child.duration * 1000, 1),
+            "details": ", ".join(f"{k}={v}" for k, v in attrs.items()),
+        })
+    st.dataframe(rows, hide_index=True, use_container_width=True)
 
 # ------------------ Streamlit Setup ------------------ #
 
@@ -45,6 +73,8 @@ st.set_page_config(page_title="LiteMind Chat", layout="centered", initial_sideba
 # Session state init
 if "history" not in st.session_state:
     st.session_state.history = []
+if "llm_session" not in st.session_state:
+    st.session_state.llm_session = ChatSession(get_llm_backend(), token_counter=approx_tokens)
 if "dark_mode" not in st.session_state:
     st.session_state.dark_mode = False
 
@@ -66,8 +96,24 @@ with st.sidebar:
     st.title("⚙️ Settings")
     if st.button("🧹 Clear Chat"):
         st.session_state.history = []
+        st.session_state.llm_session.reset()
     st.session_state.dark_mode = st.checkbox("🌙 Dark Mode", value=st.session_state.dark_mode)
     st.session_state.debug = st.checkbox("🔍 Show Retrieved Context", value=False)
+    if not engine.ready.is_set():
+        st.caption("⏳ Loading retrieval model...")
+    elif engine.warmup_error:
+        st.caption(f"⚠️ Warm-up failed: {engine.warmup_error}")
+    if st.session_state.debug:
+        st.caption(f"Answer cache: {answer_cache.stats()}")
+        st.caption("Retrieval engine: " + ", ".join(f"{k}={v:.3f}" for k, v in engine.timings.items()))
+        # Tracing is process-wide, so it is set by the TRACING env var rather than toggled per session
+        st.caption(f"📈 Stage tracing: {'on' if tracing.is_enabled() else 'off (start with TRACING=1)'}")
+        if st.session_state.get("last_trace") is not None:
+            with st.expander("⏱️ Last turn breakdown"):
+                render_trace(st.session_state.last_trace)
+        if tracing.is_enabled():
+            with st.expander("📊 Metrics (Prometheus)"):
+                st.code(tracing.registry.to_prometheus(), language="text")
 
 # Main Title
 st.title("🤖 LiteMind Chat — Agent Assist RAG")
@@ -91,23 +137,57 @@ with input_container:
             st.markdown(user_input)
 
         with st.chat_message("assistant"):
-            with st.spinner("Thinking..."):
-                context_docs = retrieve_docs(user_input)
+            errors = []
+            with tracing.span("litemind.turn") as turn:
+                with st.spinner("Thinking..."):
+                    context_docs, chunk_ids, query_embedding = retrieve_docs_with_ids(user_input)
 
                 if st.session_state.debug:
                     st.markdown("**🔍 Retrieved Context:**")
                     for doc in context_docs:
                         st.markdown(f"> {doc[:300]}...")
 
-                context = "\n\n".join(context_docs)
-                prompt = f"""
-Context:
-{context}
-
-User: {user_input}
-Assistant:"""
-                reply = ask_ollama(prompt)
-                st.markdown(reply)
+                # Earlier turns (without the message just added) feed the compacted history
+                history_lines = [f"{'User' if role == 'user' else 'Assistant'}: {msg}"
+                                 for role, msg in st.session_state.history[:-1]]
+                llm_session = st.session_state.llm_session
+                with tracing.span("prompt.build") as span:
+                    prompt = prompt_builder.build(user_input, context_docs, history_lines)
+                    prompt_report = {f"full_{k}": v for k, v in prompt_builder.last_report.items()}
+                    # The turn prompt is only sent when the session holds a context to extend
+                    turn_prompt = None
+                    if llm_session.context is not None:
+                        turn_prompt = prompt_builder.build_turn(
+                            user_input, context_docs, budget=llm_session.remaining_tokens())
+                        prompt_report.update({f"turn_{k}": v for k, v in prompt_builder.last_report.items()})
+                    span.set(**prompt_report)
+                if st.session_state.debug:
+                    st.caption(f"🧮 Prompt: {prompt_report}")
+                answer_cache.sync_version(collection_fingerprint(engine.store))
+                reply = answer_cache.lookup(MODEL_NAME, prompt, query_embedding, chunk_ids)
+                turn.set(chunks=len(context_docs), cache_hit=reply is not None)
+                if reply is not None:
+                    # The model never saw this turn; rebuild its context from text next time
+                    llm_session.reset()
+                    st.markdown(reply)
+                    if st.session_state.debug:
+                        st.caption("⚡ Served from answer cache")
+                else:
+                    stats = GenerationStats()
+                    reply = st.write_stream(ask_ollama_stream(
+                        turn_prompt, llm_session, stats=stats, full_prompt=prompt,
+                        errors=errors))
+                    if not errors:
+                        answer_cache.store(MODEL_NAME, prompt, reply, query_embedding, chunk_ids)
+                    if st.session_state.debug:
+                        st.caption(f"⏱️ {stats.summary()}")
+            if turn is not tracing.NULL_SPAN:
+                st.session_state.last_trace = turn
+                if st.session_state.debug:
+                    with st.expander("⏱️ Stage breakdown"):
+                        render_trace(turn)
+            # A failed or truncated reply is neither cached nor kept as conversation history
+            if not errors:
                 st.session_state.history.append(("assistant", reply))
 
 # Auto Scroll to Bottom
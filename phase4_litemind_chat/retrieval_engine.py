@@ -0,0 +1,113 @@
+# phase4_litemind_chat/retrieval_engine.py
+#
+# Process-wide retrieval engine for the Streamlit apps.
+#
+# Streamlit re-executes app.py on every interaction, but imported modules stay
+# in sys.modules, so the engine returned by get_engine() is built once per server
+# process and shared by every rerun and session. The vector store backend and the
+# embedding model are imported lazily, so the UI renders while warm_up() runs in
+# the background.
+
+import os
+import sys
+import time
+import threading
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "phase3_agent_assist"))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "phase1_llm_core"))
+from embedding_cache import CachedEmbedder
+from retrieval_client import RetrievalClient, RETRIEVAL_URL
+from batch_retrieval import search_batch, as_triples
+import tracing
+
+EMBED_MODEL_NAME = "all-MiniLM-L6-v2"
+
+
+class RetrievalEngine:
+    def __init__(self, backend=None, model_name=EMBED_MODEL_NAME):
+        self.backend = backend
+        self.embedder = CachedEmbedder(model_name)
+        self.lock = threading.Lock()
+        self.ready = threading.Event()
+        self.warmup_thread = None
+        self.warmup_error = None
+        self._store = None
+        self.created = time.perf_counter()
+        self.timings = {}
+
+    @property
+    def store(self):
+        with self.lock:
+            if self._store is None:
+                t0 = time.perf_counter()
+                from vector_store import open_store
+                self._store = open_store(self.backend)
+                self.timings["store_open_s"] = time.perf_counter() - t0
+            return self._store
+
+    def warm_up(self):
+        """Open the vector store, load the model and run one throwaway encode."""
+        try:
+            t0 = time.perf_counter()
+            self.store
+            t1 = time.perf_counter()
+            self.embedder._get_model()
+            t2 = time.perf_counter()
+            self.embedder.model.encode(["warm up"])
+            t3 = time.perf_counter()
+            self.timings.update(model_load_s=t2 - t1, first_encode_s=t3 - t2, warm_up_s=t3 - t0,
+                                ready_after_s=t3 - self.created)
+        except Exception as e:
+            self.warmup_error = e
+        finally:
+            self.ready.set()
+
+    def warm_up_async(self):
+        with self.lock:
+            if self.warmup_thread is None:
+                self.warmup_thread = threading.Thread(target=self.warm_up, daemon=True)
+                self.warmup_thread.start()
+        return self.warmup_thread
+
+    def retrieve(self, query, n_results=5):
+        """Return (documents, chunk ids, query embedding)."""
+        t0 = time.perf_counter()
+        query_embedding = self.embedder.encode([query])[0]
+        t1 = time.perf_counter()
+        with tracing.span("vector_store.query", top_k=n_results) as span:
+            results = self.store.query(
+                [query_embedding],
+                n_results=n_results,
+                include=["documents"]
+            )
+            span.set(chunks=len(results['ids'][0]) if results else 0)
+        t2 = time.perf_counter()
+        self.timings.update(last_embed_s=t1 - t0, last_query_s=t2 - t1)
+        if not results or 'documents' not in results:
+            return [], [], query_embedding
+        return results['documents'][0], results['ids'][0], query_embedding
+
+    def retrieve_batch(self, queries, n_results=5, batch_size=256):
+        """retrieve() for many queries: [(documents, chunk ids, query embedding)] per query."""
+        t0 = time.perf_counter()
+        results = as_triples(search_batch(self.store, self.embedder, queries, n_results, batch_size,
+                                          include=("documents",)))
+        self.timings["last_batch_s"] = time.perf_counter() - t0
+        return results
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+def get_engine(warm=True):
+    """
+    Return the shared engine, creating it (and starting warm-up) on first use.
+    With RETRIEVAL_URL set this is a client of retrieval_service.py instead.
+    """
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = RetrievalClient(RETRIEVAL_URL) if RETRIEVAL_URL else RetrievalEngine()
+            if warm:
+                _engine.warm_up_async()
+        return _engine
@@ -0,0 +1,118 @@
+# phase5_speech_io/audio_ingest.py
+#
+# One decode path for every phase5 script.
+#
+# Any supported file is decoded once into a 16 kHz mono float32 numpy array,
+# the format faster-whisper takes directly. Stdlib `wave` reads WAV files and
+# pydub/ffmpeg reads everything else. Resampling uses scipy's polyphase filter
+# on the whole array. The speech_recognition backends get the same buffer wrapped
+# as AudioData, so no intermediate .wav is written. An optional PCM cache
+# keyed by the audio content hash skips decoding entirely on reruns.
+
+import os
+import wave
+import hashlib
+from math import gcd
+
+import numpy as np
+
+from whisper_registry import SAMPLE_RATE
+
+PCM_CACHE_DIR = os.getenv("PCM_CACHE_DIR", "./pcm_cache")
+_INT_DTYPES = {1: np.uint8, 2: np.int16, 4: np.int32}
+
+
+def content_hash(path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def pcm_to_float(raw, sample_width, channels):
+    """Interleaved integer PCM bytes -> mono float32 in [-1, 1]."""
+    dtype = _INT_DTYPES[sample_width]
+    audio = np.frombuffer(raw, dtype=dtype).astype(np.float32)
+    if sample_width == 1:
+        audio = (audio - 128) / 128  # 8-bit WAV is unsigned
+    else:
+        audio /= -float(np.iinfo(dtype).min)
+    if channels > 1:
+        audio = audio.reshape(-1, channels).mean(axis=1)
+    return audio
+
+
+def resample(audio, orig_sr, target_sr=SAMPLE_RATE):
+    if orig_sr == target_sr:
+        return audio
+    from scipy.signal import resample_poly
+    g = gcd(orig_sr, target_sr)
+    return resample_poly(audio, target_sr // g, orig_sr // g).astype(np.float32)
+
+
+def decode_audio(path, sample_rate=SAMPLE_RATE):
+    """Decode `path` into a mono float32 array at `sample_rate`."""
+    if path.lower().endswith(".wav"):
+        try:
+            with wave.open(path, "rb") as wav:
+                width, channels, rate = wav.getsampwidth(), wav.getnchannels(), wav.getframerate()
+                raw = wav.readframes(wav.getnframes())
+            if width in _INT_DTYPES:
+                return resample(pcm_to_float(raw, width, channels), rate, sample_rate)
+        except wave.Error:
+            pass  # float or compressed WAV: let ffmpeg handle it
+    from pydub import AudioSegment
+    segment = AudioSegment.from_file(path)
+    if segment.sample_width not in _INT_DTYPES:
+        segment = segment.set_sample_width(2)
+    audio = pcm_to_float(segment.raw_data, segment.sample_width, segment.channels)
+    return resample(audio, segment.frame_rate, sample_rate)
+
+
+class PCMCache:
+    """Decoded audio as .npy files named by the source file's content hash."""
+
+    def __init__(self, path=PCM_CACHE_DIR):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    def _file(self, key):
+        return os.path.join(self.path, f"{key}.npy")
+
+    def get(self, key):
+        try:
+            return np.load(self._file(key), mmap_mode="r")
+        except (OSError, ValueError):
+            return None
+
+    def put(self, key, audio):
+        tmp_path = self._file(key) + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, audio)
+        os.replace(tmp_path, self._file(key))
+
+
+def load_audio(path, cache=None, key=None, sample_rate=SAMPLE_RATE):
+    """
+    16 kHz mono float32 audio for `path`, via `cache` (a PCMCache) when given.
+    `key` is the file's content hash, if the caller already computed it.
+    """
+    if cache is None or sample_rate != SAMPLE_RATE:
+        return decode_audio(path, sample_rate)
+    key = key or content_hash(path)
+    audio = cache.get(key)
+    if audio is None:
+        audio = decode_audio(path, sample_rate)
+        cache.put(key, audio)
+    return audio
+
+
+def to_int16(audio):
+    return (np.clip(audio, -1.0, 1.0) * 32767).astype(np.int16)
+
+
+def to_audio_data(audio, sample_rate=SAMPLE_RATE):
+    """Wrap a float32 buffer as speech_recognition AudioData (16-bit PCM)."""
+    import speech_recognition as sr
+    return sr.AudioData(to_int16(audio).tobytes(), sample_rate, 2)
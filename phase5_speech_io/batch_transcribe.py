@@ -0,0 +1,157 @@
+# phase5_speech_io/batch_transcribe.py
+#
+# Bulk transcription of call recordings.
+#
+#   python phase5_speech_io/batch_transcribe.py recordings/ --workers 4 --out transcripts.jsonl
+#
+# Every audio file under the directory tree is decoded by a pool of worker
+# threads sharing one faster-whisper model (loaded with num_workers=workers so
+# CTranslate2 runs the decodes in parallel). Results are cached by the SHA-256 of
+# the audio bytes and reused only for the same model size, compute type and beam
+# size, so reruns only transcribe new recordings; --pcm-cache also keeps
+# the decoded 16 kHz audio so a rerun with another model skips decoding.
+
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from whisper_registry import get_whisper_model, SAMPLE_RATE
+from audio_ingest import content_hash, load_audio, PCMCache, PCM_CACHE_DIR
+
+AUDIO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "audio_inputs")
+AUDIO_EXTENSIONS = (".mp3", ".wav", ".m4a", ".flac", ".ogg")
+CACHE_DIR = "./transcript_cache"
+
+
+def find_audio_files(root):
+    for dirpath, _, filenames in os.walk(root):
+        for fname in sorted(filenames):
+            if ":" in fname or not fname.lower().endswith(AUDIO_EXTENSIONS):
+                continue
+            yield os.path.join(dirpath, fname)
+
+
+class TranscriptCache:
+    """One JSON file per audio content hash."""
+
+    def __init__(self, path=CACHE_DIR):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    def _file(self, key):
+        return os.path.join(self.path, f"{key}.json")
+
+    def get(self, key):
+        try:
+            with open(self._file(key), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, key, result):
+        tmp_path = self._file(key) + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(result, f)
+        os.replace(tmp_path, self._file(key))
+
+
+def transcribe_file(model, audio, beam_size=5):
+    """Transcribe a 16 kHz mono float32 array."""
+    t0 = time.perf_counter()
+    segments, info = model.transcribe(audio, beam_size=beam_size)
+    segments = [
+        {"start": round(seg.start, 2), "end": round(seg.end, 2), "text": seg.text.strip()}
+        for seg in segments  # the generator is lazy: decoding happens here
+    ]
+    decode_s = time.perf_counter() - t0
+    duration = len(audio) / SAMPLE_RATE
+    return {
+        "language": info.language,
+        "duration": round(duration, 2),
+        "segments": segments,
+        "text": " ".join(seg["text"] for seg in segments),
+        "decode_s": round(decode_s, 3),
+        "rtf": round(decode_s / duration, 4) if duration else None,
+    }
+
+
+def run_batch(root, out_path, model_size="tiny", compute_type="int8", workers=2,
+              cache_dir=CACHE_DIR, beam_size=5, pcm_cache_dir=None):
+    files = list(find_audio_files(root))
+    if not files:
+        print(f"No audio files found under {root}/")
+        return []
+    print(f"[+] {len(files)} audio files | model={model_size} workers={workers}")
+
+    cache = TranscriptCache(cache_dir)
+    pcm_cache = PCMCache(pcm_cache_dir) if pcm_cache_dir else None
+    model = get_whisper_model(model_size, device="cpu", compute_type=compute_type, num_workers=workers)
+    out_lock = threading.Lock()
+    results = []
+    started = time.perf_counter()
+
+    settings = {"model": model_size, "compute_type": compute_type, "beam_size": beam_size}
+
+    def work(path):
+        key = content_hash(path)
+        result = cache.get(key)
+        cached = result is not None and all(result.get(name) == value for name, value in settings.items())
+        if not cached:
+            t0 = time.perf_counter()
+            audio = load_audio(path, cache=pcm_cache, key=key)
+            load_s = round(time.perf_counter() - t0, 3)
+            result = {**settings, "load_s": load_s, **transcribe_file(model, audio, beam_size)}
+            cache.put(key, result)
+        return {"file": os.path.relpath(path, root), "sha256": key, "cached": cached, **result}
+
+    with open(out_path, "w", encoding="utf-8") as out, ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(work, path): path for path in files}
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                row = future.result()
+            except Exception as e:
+                print(f"[!] Failed: {path} | Error: {e}")
+                continue
+            with out_lock:
+                out.write(json.dumps(row) + "\n")
+            results.append(row)
+            status = "cached" if row["cached"] else f"rtf {row['rtf']}"
+            print(f"[✓] {row['file']}: {row['duration']:.1f}s audio, {status}")
+
+    wall_s = time.perf_counter() - started
+    audio_s = sum(r["duration"] or 0 for r in results)
+    fresh = [r for r in results if not r["cached"]]
+    # Cached files cost no decoding, so the RTF only covers what was transcribed in this run
+    fresh_audio_s = sum(r["duration"] or 0 for r in fresh)
+    fresh_decode_s = sum(r["decode_s"] for r in fresh)
+    rtf = f"{fresh_decode_s / fresh_audio_s:.3f}" if fresh_audio_s else "n/a"
+    print(
+        f"\n[✓] {len(results)}/{len(files)} files ({len(fresh)} transcribed, {len(results) - len(fresh)} cached) "
+        f"| {audio_s:.1f}s audio in {wall_s:.1f}s wall | decode RTF {rtf} over {fresh_audio_s:.1f}s transcribed"
+    )
+    print(f"[i] Transcripts written to {out_path}")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Transcribe every audio file in a directory tree")
+    parser.add_argument("directory", nargs="?", default=AUDIO_DIR)
+    parser.add_argument("--out", default="transcripts.jsonl")
+    parser.add_argument("--model", default="tiny", help="faster-whisper model size")
+    parser.add_argument("--compute-type", default="int8")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--beam-size", type=int, default=5)
+    parser.add_argument("--cache-dir", default=CACHE_DIR)
+    parser.add_argument("--pcm-cache", nargs="?", const=PCM_CACHE_DIR, default=None,
+                        help=f"Also cache decoded 16 kHz PCM (default dir: {PCM_CACHE_DIR})")
+    args = parser.parse_args()
+    if not os.path.isdir(args.directory):
+        sys.exit(f"Not a directory: {args.directory}")
+    run_batch(args.directory, args.out, model_size=args.model, compute_type=args.compute_type,
+              workers=args.workers, cache_dir=args.cache_dir, beam_size=args.beam_size,
+              pcm_cache_dir=args.pcm_cache)
@@ -1,69 +1,87 @@
 # phase5_speech_io/mic_speech_chat.py
 
 import os
-import tempfile
-import time
-import requests
+import sys
+import argparse
 import sounddevice as sd
-import numpy as np
-import scipy.io.wavfile as wavfile
-from faster_whisper import WhisperModel
+from whisper_registry import get_whisper_model
+from stream_transcribe import StreamingTranscriber, MicSource, WavSource, print_events
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "phase1_llm_core"))
+from ollama_client import stream_ollama, GenerationStats
+import tracing
 
 # --- Settings ---
-OLLAMA_URL = "http://localhost:11434"
 MODEL_NAME = "tinyllama"
 RECORD_SECONDS = 5  # Duration to record from mic
 SAMPLE_RATE = 16000  # Whisper recommended sample rate
 
 def record_audio(duration=RECORD_SECONDS, fs=SAMPLE_RATE):
     print(f"🎙️ Recording for {duration} seconds...")
-    recording = sd.rec(int(duration * fs), samplerate=fs, channels=1, dtype='int16')
+    recording = sd.rec(int(duration * fs), samplerate=fs, channels=1, dtype='float32')
     sd.wait()  # Wait until recording is finished
     print("🛑 Recording complete.")
     return recording.flatten()
 
-def save_wav(audio_data, fs=SAMPLE_RATE):
-    tmp_file = tempfile.NamedTemporaryFile(suffix=".wav", delete=False)
-    wavfile.write(tmp_file.name, fs, audio_data)
-    return tmp_file.name
-
-def transcribe_audio(audio_path):
+def transcribe_audio(audio):
+    """Transcribe a 16 kHz mono float32 array (or a file path) without writing temp files."""
     print("🔎 Transcribing...")
-    model = WhisperModel("small", device="cpu", compute_type="int8")  # Adjust model size if needed
-    segments, info = model.transcribe(audio_path)
-    transcript = ""
-    for segment in segments:
-        transcript += segment.text + " "
+    model = get_whisper_model("small", device="cpu", compute_type="int8")  # Adjust model size if needed; loaded once
+    with tracing.span("whisper.transcribe", counters=("audio_s",), model="small") as span:
+        segments, info = model.transcribe(audio)
+        transcript = ""
+        for segment in segments:
+            transcript += segment.text + " "
+        span.set(audio_s=info.duration, chars=len(transcript))
     return transcript.strip()
 
 def ask_llm(prompt):
+    """Stream the LLM reply to stdout as it is generated and return the full text."""
     print("🤖 Asking LLM...")
+    print("\n🤖 LLM Response:")
+    print("----------------")
+    stats = GenerationStats()
+    pieces = []
     try:
-        res = requests.post(
-            f"{OLLAMA_URL}/api/generate",
-            json={"model": MODEL_NAME, "prompt": prompt, "stream": False},
-            timeout=60,
-        )
-        res.raise_for_status()
-        return res.json().get("response", "[No response]")
+        for piece in stream_ollama(prompt, model=MODEL_NAME, stats=stats, timeout=60):
+            pieces.append(piece)
+            sys.stdout.write(piece)
+            sys.stdout.flush()
     except Exception as e:
-        return f"[LLM Error] {e}"
+        pieces.append(f"[LLM Error] {e}")
+        print(pieces[-1])
+    print(f"\n⏱️ {stats.summary()}")
+    return "".join(pieces) or "[No response]"
+
+def stream_main(wav_path=None):
+    """Transcribe continuously and send each finished utterance to the LLM."""
+    model = get_whisper_model("small", device="cpu", compute_type="int8")
+    transcriber = StreamingTranscriber(model)
+    source = WavSource(wav_path) if wav_path else MicSource()
+    print("🎙️ Listening... (Ctrl+C to stop)")
+    try:
+        with source:
+            for event in print_events(transcriber.events(source)):
+                ask_llm(event.text)
+    except KeyboardInterrupt:
+        print("\n🛑 Stopped.")
 
 def main():
     audio_data = record_audio()
-    wav_path = save_wav(audio_data)
-    try:
-        transcript = transcribe_audio(wav_path)
-        print("\n📝 Transcription:")
-        print("----------------")
-        print(transcript)
+    transcript = transcribe_audio(audio_data)
+    print("\n📝 Transcription:")
+    print("----------------")
+    print(transcript)
 
-        response = ask_llm(transcript)
-        print("\n🤖 LLM Response:")
-        print("----------------")
-        print(response)
-    finally:
-        os.remove(wav_path)  # Cleanup temp file
+    ask_llm(transcript)
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Talk to the LLM through the microphone")
+    parser.add_argument("--stream", action="store_true",
+                        help="Stream audio with VAD instead of recording a fixed window")
+    parser.add_argument("--wav", help="With --stream, read audio from a WAV file instead of the mic")
+    args = parser.parse_args()
+    if args.stream:
+        stream_main(args.wav)
+    else:
+        main()
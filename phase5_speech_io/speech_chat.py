@@ -1,11 +1,15 @@
 # phase5_speech_io/speech_chat.py
 
 import os
-import requests
-from faster_whisper import WhisperModel
+import sys
+from whisper_registry import get_whisper_model
+from audio_ingest import load_audio
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "phase1_llm_core"))
+from ollama_client import stream_ollama, GenerationStats
+import tracing
 
 # --- Settings ---
-OLLAMA_URL = "http://localhost:11434"
 MODEL_NAME = "tinyllama"
 AUDIO_DIR = "phase5_speech_io/audio_inputs"
 
@@ -14,26 +18,35 @@ def list_audio_files():
 
 def transcribe_audio(audio_path):
     print("🔎 Transcribing with Faster Whisper...")
-    model = WhisperModel("tiny", device="cpu", compute_type="int8")  # lightweight on CPU
+    model = get_whisper_model("tiny", device="cpu", compute_type="int8")  # lightweight on CPU, loaded once
 
-    segments, _ = model.transcribe(audio_path)
-    transcript = ""
-    for segment in segments:
-        transcript += segment.text.strip() + " "
+    with tracing.span("whisper.transcribe", counters=("audio_s",), model="tiny") as span:
+        audio = load_audio(audio_path)
+        segments, _ = model.transcribe(audio)
+        transcript = ""
+        for segment in segments:
+            transcript += segment.text.strip() + " "
+        span.set(audio_s=len(audio) / 16000, chars=len(transcript))
 
     return transcript.strip()
 
 def ask_llm(prompt):
+    """Stream the LLM reply to stdout as it is generated and return the full text."""
     print("🤖 Asking LLM...")
+    print("\n🤖 LLM Response:")
+    print("----------------")
+    stats = GenerationStats()
+    pieces = []
     try:
-        res = requests.post(
-            f"{OLLAMA_URL}/api/generate",
-            json={"model": MODEL_NAME, "prompt": prompt, "stream": False}
-        )
-        res.raise_for_status()
-        return res.json().get("response", "[No response]")
+        for piece in stream_ollama(prompt, model=MODEL_NAME, stats=stats):
+            pieces.append(piece)
+            sys.stdout.write(piece)
+            sys.stdout.flush()
     except Exception as e:
-        return f"[LLM Error] {e}"
+        pieces.append(f"[LLM Error] {e}")
+        print(pieces[-1])
+    print(f"\n⏱️ {stats.summary()}")
+    return "".join(pieces) or "[No response]"
 
 def main():
     print("🎙️  Speech-to-LLM Chat")
@@ -63,10 +76,7 @@ def main():
     print("----------------")
     print(transcript)
 
-    response = ask_llm(transcript)
-    print("\n🤖 LLM Response:")
-    print("----------------")
-    print(response)
+    ask_llm(transcript)
 
 if __name__ == "__main__":
     main()
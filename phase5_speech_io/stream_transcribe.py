@@ -0,0 +1,273 @@
+# phase5_speech_io/stream_transcribe.py
+#
+# Streaming transcription with energy-based voice activity detection.
+#
+#   python phase5_speech_io/stream_transcribe.py                  # microphone
+#   python phase5_speech_io/stream_transcribe.py --wav call.wav   # WAV file as the "mic"
+#
+# Audio arrives in short blocks from a pluggable source and is appended to a ring
+# buffer. The VAD marks where an utterance starts and ends. While someone is
+# talking, the utterance so far is re-decoded every `partial_interval` seconds
+# (greedy, for speed). When they stop, it is decoded once more with beam search
+# to give the final text. faster-whisper receives float32 numpy arrays directly,
+# so nothing is written to disk.
+
+import sys
+import time
+import queue
+import argparse
+from dataclasses import dataclass
+
+import numpy as np
+
+from whisper_registry import get_whisper_model, SAMPLE_RATE
+from audio_ingest import decode_audio
+
+BLOCK_MS = 30
+
+
+# --- Audio sources: iterables of float32 mono blocks at SAMPLE_RATE ---
+
+class MicSource:
+    """Microphone capture via a sounddevice.InputStream callback."""
+
+    def __init__(self, sample_rate=SAMPLE_RATE, block_ms=BLOCK_MS, device=None):
+        self.sample_rate = sample_rate
+        self.blocksize = int(sample_rate * block_ms / 1000)
+        self.device = device
+        self.blocks = queue.Queue()
+        self.stream = None
+
+    def _callback(self, indata, frames, time_info, status):
+        if status:
+            print(f"[!] Audio input: {status}", file=sys.stderr)
+        self.blocks.put(indata[:, 0].copy())
+
+    def __enter__(self):
+        import sounddevice as sd
+        self.stream = sd.InputStream(samplerate=self.sample_rate, blocksize=self.blocksize,
+                                     channels=1, dtype="float32", device=self.device,
+                                     callback=self._callback)
+        self.stream.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stream.stop()
+        self.stream.close()
+
+    def __iter__(self):
+        while True:
+            yield self.blocks.get()
+
+
+class WavSource:
+    """Stand-in for the microphone: yields an audio file (WAV or anything ffmpeg reads) in mic-sized blocks."""
+
+    def __init__(self, path, sample_rate=SAMPLE_RATE, block_ms=BLOCK_MS, realtime=False):
+        self.path = path
+        self.sample_rate = sample_rate
+        self.blocksize = int(sample_rate * block_ms / 1000)
+        self.realtime = realtime
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def read(self):
+        return decode_audio(self.path, self.sample_rate)
+
+    def __iter__(self):
+        audio = self.read()
+        for start in range(0, len(audio), self.blocksize):
+            if self.realtime:
+                time.sleep(self.blocksize / self.sample_rate)
+            yield audio[start:start + self.blocksize]
+
+
+# --- Buffering and segmentation ---
+
+class RingBuffer:
+    """Fixed-size float32 buffer addressed by absolute sample index."""
+
+    def __init__(self, capacity):
+        self.data = np.zeros(capacity, dtype=np.float32)
+        self.capacity = capacity
+        self.total = 0  # samples written since the start
+
+    def append(self, block):
+        # A block longer than the buffer keeps only its tail, but still advances
+        # `total` by its full length so absolute indices stay aligned with the stream
+        n = len(block)
+        block = block[-self.capacity:]
+        pos = (self.total + n - len(block)) % self.capacity
+        first = min(len(block), self.capacity - pos)
+        self.data[pos:pos + first] = block[:first]
+        self.data[:len(block) - first] = block[first:]
+        self.total += n
+
+    def since(self, start):
+        """Samples from absolute index `start` to now (clamped to what is still buffered)."""
+        start = max(start, self.total - self.capacity)
+        a, b = start % self.capacity, self.total % self.capacity
+        if self.total - start == self.capacity:
+            return np.concatenate([self.data[b:], self.data[:b]])
+        if a <= b:
+            return self.data[a:b].copy()
+        return np.concatenate([self.data[a:], self.data[:b]])
+
+
+class EnergyVAD:
+    """
+    RMS-energy voice activity detector with an adaptive noise floor.
+
+    A block counts as speech when its RMS exceeds both `min_rms` and
+    `ratio` x the running noise floor. An utterance starts after `min_speech_ms`
+    of speech and ends after `min_silence_ms` of non-speech.
+    """
+
+    def __init__(self, sample_rate=SAMPLE_RATE, min_rms=0.01, ratio=3.0,
+                 min_speech_ms=150, min_silence_ms=600, noise_alpha=0.05):
+        self.sample_rate = sample_rate
+        self.min_rms = min_rms
+        self.ratio = ratio
+        self.min_speech = min_speech_ms / 1000
+        self.min_silence = min_silence_ms / 1000
+        self.noise_alpha = noise_alpha
+        self.noise_floor = min_rms / ratio
+        self.in_speech = False
+        self.speech_s = 0.0
+        self.silence_s = 0.0
+
+    def is_speech(self, block):
+        rms = float(np.sqrt(np.mean(block * block))) if len(block) else 0.0
+        speech = rms > max(self.min_rms, self.ratio * self.noise_floor)
+        if not speech:
+            self.noise_floor += self.noise_alpha * (rms - self.noise_floor)
+        return speech
+
+    def update(self, block):
+        """Feed one block; return "start", "end" or None."""
+        seconds = len(block) / self.sample_rate
+        speech = self.is_speech(block)
+        if not self.in_speech:
+            self.speech_s = self.speech_s + seconds if speech else 0.0
+            if self.speech_s >= self.min_speech:
+                self.in_speech, self.silence_s = True, 0.0
+                return "start"
+        else:
+            self.silence_s = 0.0 if speech else self.silence_s + seconds
+            if self.silence_s >= self.min_silence:
+                self.in_speech, self.speech_s = False, 0.0
+                return "end"
+        return None
+
+
+@dataclass
+class TranscriptEvent:
+    kind: str          # "partial" or "final"
+    text: str
+    start: float       # utterance start/end, seconds into the stream
+    end: float
+    decode_s: float
+
+
+# --- Transcriber ---
+
+class StreamingTranscriber:
+    def __init__(self, model=None, vad=None, sample_rate=SAMPLE_RATE, partial_interval=1.0,
+                 max_utterance_s=20.0, pre_roll_ms=300, language=None):
+        self.model = model or get_whisper_model("tiny", device="cpu", compute_type="int8")
+        self.vad = vad or EnergyVAD(sample_rate)
+        self.sample_rate = sample_rate
+        self.partial_interval = partial_interval
+        self.max_utterance = int(max_utterance_s * sample_rate)
+        self.pre_roll = int(pre_roll_ms * sample_rate / 1000)
+        self.language = language
+        # Room for the longest utterance plus the pre-roll and the speech needed to trigger the VAD
+        self.ring = RingBuffer(self.max_utterance + self.pre_roll + sample_rate)
+
+    def _decode(self, audio, beam_size):
+        t0 = time.perf_counter()
+        segments, _ = self.model.transcribe(audio, beam_size=beam_size, language=self.language,
+                                            condition_on_previous_text=False)
+        text = " ".join(seg.text.strip() for seg in segments).strip()
+        return text, time.perf_counter() - t0
+
+    def _event(self, kind, start, beam_size):
+        audio = self.ring.since(start)
+        text, decode_s = self._decode(audio, beam_size)
+        return TranscriptEvent(kind, text, start / self.sample_rate,
+                               self.ring.total / self.sample_rate, decode_s)
+
+    def events(self, source):
+        """Consume audio blocks from `source` and yield TranscriptEvents."""
+        start = None
+        last_partial = 0
+        for block in source:
+            self.ring.append(block)
+            state = self.vad.update(block)
+            if state == "start":
+                # Back-date the start to include the speech that triggered the VAD plus some pre-roll
+                trigger = int(self.vad.speech_s * self.sample_rate)
+                start = max(self.ring.total - trigger - self.pre_roll, 0)
+                last_partial = self.ring.total
+            elif start is None:
+                continue
+            elif state == "end" or self.ring.total - start >= self.max_utterance:
+                event = self._event("final", start, beam_size=5)
+                start = None
+                if state != "end":
+                    # Forced cut of a very long utterance: keep listening for its continuation
+                    start = self.ring.total
+                if event.text:
+                    yield event
+            elif self.ring.total - last_partial >= self.partial_interval * self.sample_rate:
+                last_partial = self.ring.total
+                event = self._event("partial", start, beam_size=1)
+                if event.text:
+                    yield event
+        if start is not None:
+            event = self._event("final", start, beam_size=5)
+            if event.text:
+                yield event
+
+
+def print_events(events):
+    """Show partials on one updating line and finals on their own line; yield finals."""
+    for event in events:
+        if event.kind == "partial":
+            sys.stdout.write(f"\r… {event.text}")
+            sys.stdout.flush()
+        else:
+            sys.stdout.write(f"\r📝 [{event.start:.1f}s–{event.end:.1f}s] {event.text} "
+                             f"(decoded in {event.decode_s:.2f}s)\n")
+            sys.stdout.flush()
+            yield event
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Streaming transcription with VAD segmentation")
+    parser.add_argument("--wav", help="Read audio from a WAV file instead of the microphone")
+    parser.add_argument("--realtime", action="store_true", help="Pace --wav input at real-time speed")
+    parser.add_argument("--model", default="tiny", help="faster-whisper model size")
+    parser.add_argument("--partial-interval", type=float, default=1.0)
+    parser.add_argument("--min-silence-ms", type=int, default=600)
+    args = parser.parse_args()
+
+    model = get_whisper_model(args.model, device="cpu", compute_type="int8")
+    transcriber = StreamingTranscriber(model, vad=EnergyVAD(min_silence_ms=args.min_silence_ms),
+                                       partial_interval=args.partial_interval)
+    source = WavSource(args.wav, realtime=args.realtime) if args.wav else MicSource()
+    print("🎙️ Listening... (Ctrl+C to stop)" if not args.wav else f"🎧 Streaming {args.wav}")
+    try:
+        with source:
+            for _ in print_events(transcriber.events(source)):
+                pass
+    except KeyboardInterrupt:
+        print("\n🛑 Stopped.")
+
+
+if __name__ == "__main__":
+    main()
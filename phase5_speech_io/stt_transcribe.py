@@ -1,6 +1,10 @@
 import os
-from pydub import AudioSegment
+import sys
 import speech_recognition as sr
+from audio_ingest import load_audio, to_audio_data
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "phase1_llm_core"))
+import tracing
 
 # Set your input directory
 AUDIO_DIR = os.path.join(os.path.dirname(__file__), "audio_inputs")
@@ -11,27 +15,25 @@ def find_audio_file(extension=".mp3"):
             return os.path.join(AUDIO_DIR, fname)
     raise FileNotFoundError(f"No {extension} file found in {AUDIO_DIR}")
 
-def convert_to_wav(file_path):
-    audio = AudioSegment.from_file(file_path)
-    wav_path = file_path.replace(".mp3", ".wav")
-    audio.export(wav_path, format="wav")
-    return wav_path
-
-def transcribe_audio(wav_file):
-    recognizer = sr.Recognizer()
-    with sr.AudioFile(wav_file) as source:
-        audio_data = recognizer.record(source)
-    return recognizer.recognize_google(audio_data)
+def transcribe_audio(audio):
+    """Transcribe a file path or a 16 kHz mono float32 array (decoded in memory, no .wav written)."""
+    with tracing.span("stt.transcribe", counters=("audio_s",), engine="google") as span:
+        if isinstance(audio, str):
+            audio = load_audio(audio)
+        recognizer = sr.Recognizer()
+        text = recognizer.recognize_google(to_audio_data(audio))
+        span.set(audio_s=len(audio) / 16000, chars=len(text))
+    return text
 
 if __name__ == "__main__":
     try:
         mp3_file = find_audio_file(".mp3")
         print(f"[+] Found file: {mp3_file}")
 
-        wav_file = convert_to_wav(mp3_file)
-        print(f"[+] Converted to WAV: {wav_file}")
+        audio = load_audio(mp3_file)
+        print(f"[+] Decoded {len(audio) / 16000:.1f}s of audio")
 
-        transcript = transcribe_audio(wav_file)
+        transcript = transcribe_audio(audio)
         print("\n[🗣️  Transcription]")
         print(transcript)
     except Exception as e:
@@ -0,0 +1,246 @@
+# phase5_speech_io/voice_pipeline.py
+#
+# Voice assistant pipeline: speech -> retrieval -> streamed LLM answer.
+#
+#   python phase5_speech_io/voice_pipeline.py                     # microphone, one question per utterance
+#   python phase5_speech_io/voice_pipeline.py --file question.mp3 # recorded question
+#   python phase5_speech_io/voice_pipeline.py --wav question.wav  # WAV file through the streaming VAD path
+#
+# The three stages run concurrently, connected by queues:
+#
+#   transcribe --(segments)--> retrieve --(context)--> answer
+#
+# Transcript text is sent on as soon as it is available: finished segments from
+# a file, or partial transcripts from the microphone. The retrieval stage
+# searches the agent_assist_docs collection with the transcript so far while
+# later audio is still decoding. When the final transcript matches what was
+# already searched, the answer stage can start streaming immediately. Each
+# question records per-stage timings, including the one supervisors watch:
+# speech end -> first answer token.
+
+import os
+import sys
+import time
+import queue
+import argparse
+import threading
+
+from whisper_registry import get_whisper_model
+from audio_ingest import load_audio
+from stream_transcribe import StreamingTranscriber, MicSource, WavSource
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "phase1_llm_core"))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "phase3_agent_assist"))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "phase4_litemind_chat"))
+from ollama_client import make_backend, GenerationStats
+from retrieval_engine import get_engine
+from prompt_builder import PromptBuilder
+
+MODEL_NAME = "tinyllama"
+LLM_OPTIONS = {"num_predict": 256, "num_ctx": 2048}
+_DONE = object()
+
+
+# --- Transcript sources: yield ("segment" | "final", text, speech_end) ---
+# speech_end is the perf_counter time the speaker stopped (None until final)
+
+def file_transcript(model, path, beam_size=5):
+    """Segments of a recorded question as faster-whisper finishes them."""
+    audio = load_audio(path)
+    started = time.perf_counter()
+    segments, _ = model.transcribe(audio, beam_size=beam_size)
+    texts = []
+    for seg in segments:
+        texts.append(seg.text.strip())
+        yield "segment", " ".join(texts), None
+    # The whole recording is already "spoken" when we start
+    yield "final", " ".join(texts), started
+
+
+def stream_transcript(transcriber, events):
+    """Partials of one utterance from a StreamingTranscriber, then its final text."""
+    for event in events:
+        if event.kind == "partial":
+            yield "segment", event.text, None
+        else:
+            # The VAD closes an utterance after min_silence of quiet; the final decode follows
+            speech_end = time.perf_counter() - event.decode_s - transcriber.vad.min_silence
+            yield "final", event.text, speech_end
+            return
+
+
+class VoicePipeline:
+    def __init__(self, engine=None, backend=None, builder=None, top_k=5):
+        self.engine = engine or get_engine()
+        self.backend = backend or make_backend(model=MODEL_NAME, options=LLM_OPTIONS, keep_alive="30m")
+        self.builder = builder or PromptBuilder(
+            context_budget=LLM_OPTIONS["num_ctx"] - LLM_OPTIONS["num_predict"])
+        self.top_k = top_k
+
+    # ── stages ──
+    def _transcribe_stage(self, transcript, segments_q, timings):
+        try:
+            for kind, text, speech_end in transcript:
+                now = time.perf_counter()
+                if kind == "segment":
+                    timings.setdefault("first_segment_at", now)
+                else:
+                    timings["final_transcript_at"] = now
+                    timings["speech_end_at"] = speech_end or now
+                segments_q.put((kind, text))
+        except Exception as e:
+            segments_q.put(("error", e))
+        finally:
+            segments_q.put((_DONE, None))
+
+    def _retrieve_stage(self, segments_q, context_q, timings):
+        searched_text, docs = None, []
+        searches = []
+        try:
+            while True:
+                kind, text = segments_q.get()
+                # Coalesce: if newer transcript text is already waiting, search with that instead
+                while kind == "segment":
+                    try:
+                        kind, text = segments_q.get_nowait()
+                    except queue.Empty:
+                        break
+                if kind is _DONE:
+                    context_q.put(("final", "", []))
+                    return
+                if kind == "error":
+                    context_q.put(("error", text, []))
+                    return
+                if text and text != searched_text:
+                    t0 = time.perf_counter()
+                    docs, _, _ = self.engine.retrieve(text, self.top_k)
+                    searches.append(time.perf_counter() - t0)
+                    searched_text = text
+                if kind == "final":
+                    timings["retrievals"] = len(searches)
+                    timings["retrieval_s"] = sum(searches)
+                    timings["context_ready_at"] = time.perf_counter()
+                    context_q.put(("final", text, docs))
+                    return
+        except Exception as e:
+            context_q.put(("error", e, []))
+
+    def _answer_stage(self, question, docs, timings, on_token):
+        t0 = time.perf_counter()
+        prompt = self.builder.build(question, docs)
+        timings["prompt_build_s"] = time.perf_counter() - t0
+        stats = GenerationStats()
+        pieces = []
+        for piece in self.backend.stream(prompt, stats=stats):
+            if not pieces:
+                timings["first_token_at"] = time.perf_counter()
+            pieces.append(piece)
+            on_token(piece)
+        timings["llm_ttft_s"] = stats.time_to_first_token
+        timings["llm_total_s"] = stats.total_time
+        timings["tokens"] = stats.tokens
+        return "".join(pieces)
+
+    # ── driver ──
+    def ask(self, transcript, on_token=None):
+        """
+        Run one question through the pipeline. `transcript` is a generator from
+        file_transcript() / stream_transcript(). Returns (question, answer, timings).
+        """
+        on_token = on_token or (lambda piece: None)
+        started = time.perf_counter()
+        timings = {}
+        segments_q, context_q = queue.Queue(), queue.Queue(maxsize=1)
+        stages = [
+            threading.Thread(target=self._transcribe_stage, args=(transcript, segments_q, timings), daemon=True),
+            threading.Thread(target=self._retrieve_stage, args=(segments_q, context_q, timings), daemon=True),
+        ]
+        for stage in stages:
+            stage.start()
+        kind, question, docs = context_q.get()
+        for stage in stages:
+            stage.join()
+        if kind == "error":
+            raise question
+        answer = self._answer_stage(question, docs, timings, on_token) if question else ""
+        return question, answer, self._report(started, timings)
+
+    @staticmethod
+    def _report(started, t):
+        def since(key, ref):
+            return t[key] - ref if key in t and ref is not None else None
+
+        speech_end = t.get("speech_end_at")
+        return {
+            "first_segment_s": since("first_segment_at", started),
+            "final_transcript_s": since("final_transcript_at", started),
+            "retrievals": t.get("retrievals", 0),
+            "retrieval_s": t.get("retrieval_s"),
+            # Retrieval time still outstanding after the final transcript (0 when it was overlapped)
+            "retrieval_wait_s": since("context_ready_at", t.get("final_transcript_at")),
+            "prompt_build_s": t.get("prompt_build_s"),
+            "llm_ttft_s": t.get("llm_ttft_s"),
+            "llm_total_s": t.get("llm_total_s"),
+            "tokens": t.get("tokens"),
+            "speech_end_to_first_token_s": since("first_token_at", speech_end),
+        }
+
+
+def print_report(timings):
+    parts = []
+    for key, value in timings.items():
+        if value is None:
+            continue
+        parts.append(f"{key}={value:.2f}" if isinstance(value, float) else f"{key}={value}")
+    print("⏱️ " + " · ".join(parts))
+
+
+def answer_and_print(pipeline, transcript):
+    started = []
+
+    def on_token(piece):
+        if not started:
+            started.append(True)
+            print("\n🤖 LLM Response:")
+            print("----------------")
+        sys.stdout.write(piece)
+        sys.stdout.flush()
+
+    question, _, timings = pipeline.ask(transcript, on_token)
+    print(f"\n📝 Question: {question}")
+    print_report(timings)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Speech -> RAG -> LLM with overlapped stages")
+    parser.add_argument("--file", help="Recorded question (any format ffmpeg reads)")
+    parser.add_argument("--wav", help="Feed a WAV file through the streaming VAD path instead of the mic")
+    parser.add_argument("--model", default="tiny", help="faster-whisper model size")
+    parser.add_argument("--top-k", type=int, default=5)
+    args = parser.parse_args()
+
+    model = get_whisper_model(args.model, device="cpu", compute_type="int8")
+    pipeline = VoicePipeline(top_k=args.top_k)
+    pipeline.engine.warm_up_async()
+
+    if args.file:
+        answer_and_print(pipeline, file_transcript(model, args.file))
+        return
+
+    transcriber = StreamingTranscriber(model)
+    source = WavSource(args.wav, realtime=True) if args.wav else MicSource()
+    print("🎙️ Listening... (Ctrl+C to stop)")
+    try:
+        with source:
+            events = transcriber.events(source)
+            while True:
+                timings = answer_and_print(pipeline, stream_transcript(transcriber, events))
+                if args.wav and timings["final_transcript_s"] is None:
+                    break  # file exhausted
+    except KeyboardInterrupt:
+        print("\n🛑 Stopped.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+# phase5_speech_io/whisper_registry.py
+#
+# Process-wide cache of faster-whisper models.
+#
+# Building a WhisperModel (load + int8 conversion) takes far longer than decoding
+# a short utterance, so models are loaded once per (size, device, compute_type)
+# and reused by every phase5 script and thread.
+
+import os
+import time
+import threading
+
+import numpy as np
+
+SAMPLE_RATE = 16000
+WHISPER_CPU_THREADS = int(os.getenv("WHISPER_CPU_THREADS", "0"))  # 0 = let CTranslate2 decide
+WHISPER_NUM_WORKERS = int(os.getenv("WHISPER_NUM_WORKERS", "1"))
+
+_models = {}
+_load_times = {}
+_registry_lock = threading.Lock()
+_key_locks = {}
+
+
+def get_whisper_model(size="tiny", device="cpu", compute_type="int8",
+                      cpu_threads=None, num_workers=None, warm_up=True):
+    """
+    Return a shared WhisperModel, loading it on first use.
+
+    cpu_threads / num_workers only apply when the model is first loaded
+    (defaults: WHISPER_CPU_THREADS / WHISPER_NUM_WORKERS); asking for other
+    values once it is loaded prints a warning. num_workers > 1 lets several
+    threads call transcribe() on the same model in parallel.
+    """
+    key = (size, device, compute_type)
+    model = _models.get(key)
+    if model is not None:
+        _warn_if_different(key, cpu_threads, num_workers)
+        return model
+
+    with _registry_lock:
+        key_lock = _key_locks.setdefault(key, threading.Lock())
+    # Per-key lock: concurrent callers wait for one load, other models load in parallel
+    with key_lock:
+        model = _models.get(key)
+        if model is not None:
+            _warn_if_different(key, cpu_threads, num_workers)
+            return model
+
+        from faster_whisper import WhisperModel
+        t0 = time.perf_counter()
+        cpu_threads = WHISPER_CPU_THREADS if cpu_threads is None else cpu_threads
+        num_workers = WHISPER_NUM_WORKERS if num_workers is None else num_workers
+        model = WhisperModel(
+            size,
+            device=device,
+            compute_type=compute_type,
+            cpu_threads=cpu_threads,
+            num_workers=num_workers,
+        )
+        t1 = time.perf_counter()
+        if warm_up:
+            # One short decode initializes the remaining lazy state (kernels, caches)
+            segments, _ = model.transcribe(np.zeros(SAMPLE_RATE, dtype=np.float32), beam_size=1)
+            list(segments)
+        _load_times[key] = {"load_s": t1 - t0, "warm_up_s": time.perf_counter() - t1,
+                            "cpu_threads": cpu_threads, "num_workers": num_workers}
+        _models[key] = model
+        return model
+
+
+def _warn_if_different(key, cpu_threads, num_workers):
+    loaded = _load_times.get(key, {})
+    for name, wanted in (("cpu_threads", cpu_threads), ("num_workers", num_workers)):
+        if wanted is not None and loaded.get(name) not in (None, wanted):
+            print(f"[!] Whisper model {key[0]} is already loaded with {name}={loaded[name]}; "
+                  f"ignoring {name}={wanted} (unload() it first to change this)")
+
+
+def loaded_models():
+    """
+    {(size, device, compute_type): {"load_s", "warm_up_s", "cpu_threads", "num_workers"}}
+    for loaded models.
+    """
+    return dict(_load_times)
+
+
+def unload(size="tiny", device="cpu", compute_type="int8"):
+    with _registry_lock:
+        _models.pop((size, device, compute_type), None)
+        _load_times.pop((size, device, compute_type), None)